@@ -0,0 +1,211 @@
+"""
+Video Backends
+Adapters that put the Veo 3, Veo 2 (veo_generator.py) and Stability generators behind the router's VideoBackend interface
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional
+
+from router import BackendRouter, VideoBackend
+from storage import VideoStorage
+
+logger = logging.getLogger(__name__)
+
+# Backends the combined server tries to load, in order
+ENABLED_BACKENDS = [name.strip() for name in os.getenv("VIDEO_BACKENDS", "veo3,veo2,stability").split(",") if name.strip()]
+
+
+def _noop(*args, **kwargs) -> None:
+    pass
+
+
+def _resume_entry(resume: Optional[List[Dict[str, Any]]], variation: int) -> Optional[Dict[str, Any]]:
+    return resume[variation - 1] if resume and variation <= len(resume) else None
+
+
+def _video_entry(variation: int, local_path: str, storage: VideoStorage, video_id: Optional[str] = None, storage_key: Optional[str] = None, **extra) -> Dict[str, Any]:
+    """A video dict in the shape VideoGeneratorVeo3 produces (all backends write to the same video store)."""
+    filename = video_id or Path(local_path).name
+    return {
+        "variation": variation,
+        "video_index": 1,
+        "filename": filename,
+        "local_path": str(local_path),
+        "url": storage.url(filename, storage_key),
+        "storage_key": storage_key,
+        **extra,
+    }
+
+
+def _video_entries(variation: int, result: Dict[str, Any], storage: VideoStorage, **extra) -> List[Dict[str, Any]]:
+    """Video dicts for a single-video generator result: its local_paths with their video_ids, storage keys and previews."""
+
+    def at(field: str, i: int) -> Any:
+        values = result.get(field) or []
+        return values[i] if i < len(values) else None
+
+    return [
+        _video_entry(variation, path, storage, at("video_ids", i), at("storage_keys", i), **extra, **(at("previews", i) or {}))
+        for i, path in enumerate(result.get("local_paths", []))
+    ]
+
+
+class Veo3Backend(VideoBackend):
+    """veo3_11.VideoGeneratorVeo3 (native multi-variation support)"""
+
+    name = "veo3"
+    expected_seconds = float(os.getenv("VEO_EXPECTED_GENERATION_SECONDS", "120"))
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    @property
+    def model(self) -> str:
+        return self.generator.model_name
+
+    def available(self) -> bool:
+        return not self.generator.resilience.breaker.is_open()
+
+    async def generate(self, request, progress=None, resume=None):
+        return await self.generator.generate_video_variations_async(
+            prompt=request["prompt"],
+            n_variations=request.get("n_variations", 1),
+            aspect_ratio=request.get("aspect_ratio", "16:9"),
+            person_generation=request.get("person_generation", "dont_allow"),
+            progress=progress,
+            resume=resume
+        )
+
+
+class SingleVideoBackend(VideoBackend):
+    """
+    Base for generators that produce one video per call (gemini.py, stability.py): variations run as
+    concurrent calls and their `local_paths` results are reshaped into Veo 3 video dicts.
+    """
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    def available(self) -> bool:
+        return not self.generator.resilience.breaker.is_open()
+
+    async def _generate_one(self, request: Dict[str, Any], progress: Callable[..., None], resume: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def generate(self, request, progress=None, resume=None):
+        report = progress or _noop
+        n_variations = request.get("n_variations", 1)
+
+        async def run_variation(variation: int) -> List[Dict[str, Any]]:
+            def variation_progress(_: int, state: str, **info) -> None:
+                if state == "completed":
+                    # Keep the Veo 3 job format: full video dicts (the raw local paths are kept for resume)
+                    info["videos"] = _video_entries(variation, info, self.generator.storage)
+                report(variation, state, **info)
+
+            previous = _resume_entry(resume, variation)
+            result = await self._generate_one(request, variation_progress, [previous] if previous else None)
+            if not result.get("success"):
+                return []
+            return _video_entries(variation, result, self.generator.storage, queue_wait_seconds=result.get("queue_wait_seconds", 0.0))
+
+        results = await asyncio.gather(*(run_variation(i + 1) for i in range(n_variations)))
+        videos = [video for variation_videos in results for video in variation_videos]
+        if not videos:
+            return {
+                "success": False,
+                "error": "Failed to generate any video variations",
+                "prompt": request["prompt"],
+                "timestamp": datetime.now().isoformat()
+            }
+        return {
+            "success": True,
+            "total_videos": len(videos),
+            "variations_requested": n_variations,
+            "videos": videos,
+            "prompt": request["prompt"],
+            "aspect_ratio": request.get("aspect_ratio", "16:9"),
+            "person_generation": request.get("person_generation", "dont_allow"),
+            "model": self.model,
+            "queue_wait_seconds": max(video.get("queue_wait_seconds", 0.0) for video in videos),
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+class Veo2Backend(SingleVideoBackend):
+    """veo_generator.VideoGeneratorGemini: one video per call, so variations run as concurrent calls"""
+
+    name = "veo2"
+    model = "veo-2.0-generate-001"
+    expected_seconds = float(os.getenv("VEO_EXPECTED_GENERATION_SECONDS", "120"))
+
+    def __init__(self, generator=None, **shared):
+        # Built here rather than imported from gemini.py, whose module sets up a whole server (job store,
+        # catalog, retention); `shared` hands the generator this server's ones instead
+        super().__init__(generator or importlib.import_module("veo_generator").VideoGeneratorGemini(**shared))
+
+    async def _generate_one(self, request, progress, resume):
+        return await self.generator.generate_video_async(
+            request["prompt"],
+            aspect_ratio=request.get("aspect_ratio", "16:9"),
+            person_generation=request.get("person_generation", "dont_allow"),
+            progress=progress,
+            resume=resume
+        )
+
+
+class StabilityBackend(SingleVideoBackend):
+    """stability.VideoGenerator: image-to-video only"""
+
+    name = "stability"
+    aspect_ratios = ("16:9", "9:16", "1:1")
+    text_input = False
+    image_input = True
+    model = "stable-video-diffusion"
+    expected_seconds = float(os.getenv("STABILITY_EXPECTED_GENERATION_SECONDS", "90"))
+
+    def __init__(self, generator=None, catalog=None, storage=None, previews=None, **shared):
+        # Built on the server's catalog, storage and previews rather than the module's own generator, so its
+        # ingests share the store's claims and lock with retention and there is one writer on the catalog DB
+        stability = importlib.import_module("stability")
+        super().__init__(generator or stability.VideoGenerator(catalog, storage, previews))
+
+    async def _generate_one(self, request, progress, resume):
+        return await self.generator.generate_video_async(
+            request["prompt"],
+            request.get("image_path"),
+            aspect_ratio=request.get("aspect_ratio", "16:9"),
+            progress=progress,
+            resume=resume
+        )
+
+
+# Name -> factory for the optional backends (called with the server's shared resources); register more here
+BACKEND_FACTORIES: Dict[str, Callable[..., VideoBackend]] = {
+    "veo2": Veo2Backend,
+    "stability": StabilityBackend,
+}
+
+
+def load_backends(router: BackendRouter, names: List[str] = ENABLED_BACKENDS, **shared) -> List[str]:
+    """
+    Register the optional backends listed in `names` that can start here. Backends whose module
+    raises on import (e.g. missing API key) are skipped with a warning instead of taking the server down.
+    `shared` (catalog, storage, previews, job_store) is passed to every factory, so generators built for
+    the server use its single job store, catalog and storage instead of opening their own.
+    """
+    loaded = []
+    for name in names:
+        if name in router.backends or name not in BACKEND_FACTORIES:
+            continue
+        try:
+            router.register(BACKEND_FACTORIES[name](**shared))
+            loaded.append(name)
+        except Exception as e:
+            logger.warning(f"⚠️ Video backend {name} unavailable: {e}")
+    return loaded
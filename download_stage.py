@@ -0,0 +1,361 @@
+"""
+Download Stage
+Finished generations are handed to their own worker pool and retry queue, so a failed download never loses the video
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+
+from google.genai import types
+
+from downloads import DownloadVerificationError
+from resilience import PERMANENT, CircuitOpenError, backoff_delay, classify_error
+
+logger = logging.getLogger(__name__)
+
+# Videos downloaded (and faststarted / ingested / published) at the same time, per generator
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+# Backoff between attempts at a failed download (jittered, doubling up to the max)
+DOWNLOAD_RETRY_BASE_SECONDS = float(os.getenv("DOWNLOAD_RETRY_BASE_SECONDS", "15"))
+DOWNLOAD_RETRY_MAX_SECONDS = float(os.getenv("DOWNLOAD_RETRY_MAX_SECONDS", "600"))
+# How long generated files stay downloadable when the Files API doesn't say (File.expiration_time)
+DOWNLOAD_FILE_TTL = timedelta(hours=float(os.getenv("DOWNLOAD_FILE_TTL_HOURS", "48")))
+
+# Download states
+PENDING = "pending"
+COMPLETED = "completed"
+EXPIRED = "expired"
+FAILED = "failed"
+
+
+class DownloadExpired(Exception):
+    """The provider no longer has the generated file; the download can't succeed any more."""
+
+
+class DownloadFailed(Exception):
+    """The download failed with an error another attempt won't fix (bad request, unreadable video, ...)."""
+
+
+def _retryable(error: Exception) -> bool:
+    """
+    Worth another attempt later: transient, quota and key errors, an open circuit breaker (downloads
+    have their own, so it closes again), a transfer that came out short or corrupt, local disk trouble.
+    """
+    if isinstance(error, (CircuitOpenError, DownloadVerificationError, OSError)):
+        return True
+    return classify_error(error) != PERMANENT
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class DownloadTask:
+    """One generated video waiting to be downloaded, and everything needed to retry it after a restart"""
+
+    def __init__(self, download_id: str, backend: str, operation: str, video_index: int, video, filename: str, api_key: Optional[str] = None, variation: int = 1, metadata: Optional[Dict[str, Any]] = None):
+        self.download_id = download_id
+        self.backend = backend
+        self.operation = operation
+        self.video_index = video_index
+        # The generated types.Video; only its uri / mime_type are persisted
+        self.video = video
+        self.filename = filename
+        self.api_key = api_key
+        self.variation = variation
+        # Whatever the generator needs to record the video (prompt, model, aspect ratio, ...)
+        self.metadata = metadata or {}
+        self.state = PENDING
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.expires_at: Optional[datetime] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.now()
+        self.updated_at = self.created_at
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "DownloadTask":
+        """Rebuild a task from its JobStore row."""
+        task = cls(
+            record["download_id"], record["backend"], record["operation_name"], record["video_index"],
+            types.Video(**record["video"]), record["filename"], record["api_key"], record["variation"], record["metadata"]
+        )
+        task.state = record["state"]
+        task.attempts = record["attempts"]
+        task.error = record["error"]
+        task.expires_at = datetime.fromisoformat(record["expires_at"]) if record["expires_at"] else None
+        task.result = record["result"]
+        task.created_at = datetime.fromisoformat(record["created_at"])
+        task.updated_at = datetime.fromisoformat(record["updated_at"])
+        return task
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "download_id": self.download_id,
+            "backend": self.backend,
+            "operation_name": self.operation,
+            "video_index": self.video_index,
+            "video": {"uri": self.video.uri, "mime_type": self.video.mime_type},
+            "filename": self.filename,
+            "api_key": self.api_key,
+            "variation": self.variation,
+            "metadata": self.metadata,
+            "state": self.state,
+            "attempts": self.attempts,
+            "error": self.error,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "result": self.result,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+    def deadline(self) -> datetime:
+        """When the provider drops the file: File.expiration_time, or the default TTL from hand-off."""
+        if self.expires_at:
+            return self.expires_at
+        return self.created_at.astimezone(timezone.utc) + DOWNLOAD_FILE_TTL
+
+
+class DownloadStage:
+    """
+    Downloads finished generations on a worker pool of its own, separate from generation.
+
+    A generation hands each generated video to `submit` and gets a future for the saved video entry,
+    so it can release its operation slot and move on while the bytes are fetched. `workers` tasks
+    take downloads off a queue and run `process(task)` (download, faststart, ingest, publish,
+    catalog). A failed download goes back on the queue after a jittered, doubling backoff, and keeps
+    being retried until it succeeds or the provider's file expires (`lookup_expiry(task)`, normally
+    File.expiration_time; `DownloadExpired` if the file is already gone). Only then does its future fail.
+    Errors retrying can't fix (`classify_error` says permanent, e.g. a rejected request or a video
+    faststart can't parse) fail the future with `DownloadFailed` right away.
+
+    With a `store` (JobStore), every task and state change is persisted: `resume_pending` puts the
+    downloads that were still pending when the process stopped back on the queue, and `submit` of a
+    download that already completed returns the recorded video without fetching it again.
+    """
+
+    def __init__(self, backend: str, process: Callable[[DownloadTask], Awaitable[Dict[str, Any]]], lookup_expiry: Optional[Callable[[DownloadTask], Awaitable[Optional[datetime]]]] = None, store=None, workers: int = DOWNLOAD_WORKERS, retry_base: float = DOWNLOAD_RETRY_BASE_SECONDS, retry_max: float = DOWNLOAD_RETRY_MAX_SECONDS):
+        self.backend = backend
+        self.process = process
+        self.lookup_expiry = lookup_expiry
+        self.store = store
+        self.workers = max(1, workers)
+        self.retry_base = retry_base
+        self.retry_max = max(retry_base, retry_max)
+
+        self._tasks: Dict[str, DownloadTask] = {}
+        self._futures: Dict[str, asyncio.Future] = {}
+        # asyncio primitives are bound to the loop that created them (see _ensure_running)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retry_handles: Dict[str, asyncio.TimerHandle] = {}
+
+        self.active = 0
+        self.completed = 0
+        self.retries = 0
+        self.expired = 0
+        self.failed = 0
+        self.recovered = 0
+        self.seconds = 0.0
+
+    # Public API
+
+    async def submit(self, task: DownloadTask) -> asyncio.Future:
+        """
+        Queue a download; returns a future resolved with the saved video entry (or failing with
+        DownloadExpired). Submitting a download that is already queued returns its existing future.
+        """
+        self._ensure_running()
+        future = self._futures.get(task.download_id)
+        if future:
+            return future
+
+        recorded = await self._load(task.download_id)
+        future = self._futures.get(task.download_id)
+        if future:
+            return future  # submitted again while the store was read
+        future = self._loop.create_future()
+        if recorded and recorded.state == COMPLETED:
+            future.set_result(recorded.result)
+            return future
+        if recorded and recorded.state == EXPIRED:
+            future.set_exception(DownloadExpired(f"{recorded.filename} expired before it could be downloaded: {recorded.error}"))
+            return future
+        if recorded and recorded.state == FAILED:
+            future.set_exception(DownloadFailed(f"{recorded.filename} could not be downloaded: {recorded.error}"))
+            return future
+        if recorded:
+            # Keep its attempt count and known expiry (and the live video handle)
+            recorded.video = task.video
+            task = recorded
+        self._futures[task.download_id] = future
+        self._tasks[task.download_id] = task
+        self._persist(task)
+        self._queue.put_nowait(task)
+        return future
+
+    async def resume_pending(self) -> int:
+        """Queue the downloads that were still pending when the process last stopped."""
+        if not self.store:
+            return 0
+        self._ensure_running()
+        records = await asyncio.to_thread(self.store.pending_downloads, self.backend)
+        resumed = 0
+        for record in records:
+            task = DownloadTask.from_record(record)
+            if task.download_id in self._futures:
+                continue
+            if not task.video.uri:
+                # Inline video bytes are only held in memory; they went with the process
+                task.state, task.error = EXPIRED, "inline video lost on restart"
+                self._persist(task)
+                continue
+            self._futures[task.download_id] = self._loop.create_future()
+            self._tasks[task.download_id] = task
+            self._queue.put_nowait(task)
+            resumed += 1
+        if resumed:
+            logger.info(f"♻️ Resumed {resumed} pending {self.backend} download(s)")
+        return resumed
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Downloads waiting for (another) attempt, oldest first."""
+        return [
+            {
+                "download_id": task.download_id,
+                "filename": task.filename,
+                "variation": task.variation,
+                "attempts": task.attempts,
+                "error": task.error,
+                "expires_at": task.deadline().isoformat(),
+            }
+            for task in self._tasks.values()
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "waiting_to_retry": len(self._retry_handles),
+            "completed": self.completed,
+            "retries": self.retries,
+            "expired": self.expired,
+            "failed": self.failed,
+            "recovered_after_retry": self.recovered,
+            "avg_seconds": round(self.seconds / self.completed, 2) if self.completed else None,
+        }
+
+    # Internals
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        if self._loop is not None and self._loop is not loop:
+            # Called from a new event loop (e.g. a sync wrapper's asyncio.run): old futures are unusable;
+            # persisted pending downloads are picked up again by resume_pending
+            self._tasks.clear()
+            self._futures.clear()
+            self._retry_handles.clear()
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def _load(self, download_id: str) -> Optional[DownloadTask]:
+        if not self.store:
+            return None
+        record = await asyncio.to_thread(self.store.load_download, download_id)
+        return DownloadTask.from_record(record) if record else None
+
+    def _persist(self, task: DownloadTask) -> None:
+        task.updated_at = datetime.now()
+        if self.store:
+            self.store.save_download(task.to_record())
+
+    async def _work(self) -> None:
+        while True:
+            task = await self._queue.get()
+            self.active += 1
+            try:
+                await self._attempt(task)
+            except Exception as e:
+                logger.error(f"❌ Download worker failed on {task.download_id}: {e}")
+            finally:
+                self.active -= 1
+
+    async def _attempt(self, task: DownloadTask) -> None:
+        future = self._futures.get(task.download_id)
+        if future is None or future.done():
+            return
+        task.attempts += 1
+        started = time.monotonic()
+        try:
+            result = await self.process(task)
+        except Exception as e:
+            await self._retry_later(task, e)
+            return
+        self.seconds += time.monotonic() - started
+        self.completed += 1
+        if task.attempts > 1:
+            self.recovered += 1
+            logger.info(f"📥 {task.filename} downloaded on attempt {task.attempts}")
+        task.state = COMPLETED
+        task.error = None
+        task.result = result
+        self._persist(task)
+        self._finish(task, result=result)
+
+    async def _retry_later(self, task: DownloadTask, error: Exception) -> None:
+        task.error = str(error)
+        if not isinstance(error, DownloadExpired) and not _retryable(error):
+            logger.error(f"❌ Download of {task.filename} failed on attempt {task.attempts} and retrying won't help: {error}")
+            self.failed += 1
+            task.state = FAILED
+            task.error = f"{type(error).__name__}: {error}"
+            self._persist(task)
+            self._finish(task, error=DownloadFailed(f"{task.filename} could not be downloaded: {task.error}"))
+            return
+        expired = isinstance(error, DownloadExpired)
+        if not expired and self.lookup_expiry:
+            try:
+                task.expires_at = await self.lookup_expiry(task) or task.expires_at
+            except DownloadExpired:
+                expired = True
+            except Exception as e:
+                logger.debug(f"No expiry for {task.download_id}: {e}")
+        delay = max(self.retry_base, backoff_delay(task.attempts, self.retry_base, self.retry_max))
+        if expired or _utcnow() + timedelta(seconds=delay) >= task.deadline():
+            logger.error(f"❌ Giving up on {task.filename} after {task.attempts} attempt(s), the provider's file has expired: {error}")
+            self.expired += 1
+            task.state = EXPIRED
+            self._persist(task)
+            self._finish(task, error=DownloadExpired(f"{task.filename} expired before it could be downloaded: {error}"))
+            return
+
+        self.retries += 1
+        logger.warning(f"🔁 Download of {task.filename} failed (attempt {task.attempts}): {error}; retrying in {delay:.1f}s")
+        self._persist(task)
+        self._retry_handles[task.download_id] = self._loop.call_later(delay, self._requeue, task)
+
+    def _requeue(self, task: DownloadTask) -> None:
+        self._retry_handles.pop(task.download_id, None)
+        if task.download_id in self._tasks:
+            self._queue.put_nowait(task)
+
+    def _finish(self, task: DownloadTask, result: Optional[Dict[str, Any]] = None, error: Optional[Exception] = None) -> None:
+        self._tasks.pop(task.download_id, None)
+        future = self._futures.pop(task.download_id, None)
+        if future is None or future.done():
+            return
+        if error:
+            future.set_exception(error)
+            # Nobody may be waiting (a download resumed after a restart): don't warn about it
+            future.exception()
+        else:
+            future.set_result(result)
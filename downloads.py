@@ -0,0 +1,390 @@
+"""
+Streaming Video Downloads
+Writes generated videos to disk chunk by chunk, hashing as they stream, and publishes them with an atomic rename.
+Large videos are fetched with parallel byte-range requests that resume from a .part file after failures.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Concurrent range requests per generator (shared by all of its downloads)
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "4"))
+# Size of each range request; also the unit of resume (a chunk cut off mid-way is fetched again)
+DOWNLOAD_CHUNK_SIZE = int(float(os.getenv("DOWNLOAD_CHUNK_MB", "4")) * 1024 * 1024)
+DOWNLOAD_TIMEOUT = httpx.Timeout(float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", "60")), connect=10.0)
+# Attempts at each range within one download before the whole download fails (and is resumed by the retry layer)
+RANGE_ATTEMPTS = int(os.getenv("DOWNLOAD_RANGE_ATTEMPTS", "3"))
+READ_SIZE = 256 * 1024
+
+
+@dataclass
+class DownloadResult:
+    """A video that has been fully written and renamed into place"""
+    path: Path
+    size_bytes: int
+    sha256: str
+
+    @property
+    def size_mb(self) -> float:
+        return round(self.size_bytes / (1024 * 1024), 2)
+
+
+class AtomicVideoWriter(io.RawIOBase):
+    """
+    Writable stream that spools to a hidden temp file next to `final_path`.
+
+    Every chunk is hashed and counted as it is written, so memory use stays constant regardless of video
+    size. `commit()` fsyncs and renames the temp file onto `final_path` (atomic on the same filesystem),
+    so readers never see a half-written video; `abort()` removes the temp file.
+    """
+
+    def __init__(self, final_path: Path):
+        super().__init__()
+        self.final_path = Path(final_path)
+        self.temp_path = self.final_path.with_name(f".{self.final_path.name}.{uuid.uuid4().hex}.part")
+        self._file = open(self.temp_path, "wb")
+        self._hash = hashlib.sha256()
+        self.size_bytes = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, chunk) -> int:
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size_bytes += len(chunk)
+        return len(chunk)
+
+    def commit(self) -> DownloadResult:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.temp_path, self.final_path)
+        self.close()
+        return DownloadResult(self.final_path, self.size_bytes, self._hash.hexdigest())
+
+    def abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.unlink(self.temp_path)
+        except FileNotFoundError:
+            pass
+        self.close()
+
+
+def download_video(client, video, final_path: Path) -> DownloadResult:
+    """
+    Stream a generated video (types.Video) to `final_path` without holding it in memory.
+    Blocking: run it in an executor from async code.
+    """
+    writer = AtomicVideoWriter(final_path)
+    try:
+        if getattr(video, "video_bytes", None):
+            # Some backends return the video inline instead of as a downloadable file
+            writer.write(video.video_bytes)
+        else:
+            client.files.download(file=video, destination=writer)
+        return writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+class DownloadVerificationError(ConnectionError):
+    """
+    The downloaded bytes don't match the size or checksum the provider reported. The partial file is
+    discarded; a ConnectionError so the retry layer treats it as transient and fetches it again.
+    """
+
+
+def _hex_sha256(value: Optional[str]) -> Optional[str]:
+    """Files API sha256_hash (base64, or hex) -> lowercase hex digest; None if absent or unreadable."""
+    if not value:
+        return None
+    if re.fullmatch(r"[0-9a-fA-F]{64}", value):
+        return value.lower()
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except ValueError:
+        return None
+    return digest.hex() if len(digest) == 32 else None
+
+
+def video_file_name(video) -> Optional[str]:
+    """`files/<name>` resource name of a generated video's URI (None for inline or unrecognised videos)."""
+    uri = getattr(video, "uri", None) or ""
+    match = re.search(r"files/([a-z0-9]+)", uri)
+    return match.group(1) if match else None
+
+
+def file_expiration(client, video) -> Optional[datetime]:
+    """
+    When the provider deletes a generated video's file (File.expiration_time); None if it doesn't say.
+    Returns the current time for a file that is already gone.
+    """
+    name = video_file_name(video)
+    if not name:
+        return None
+    try:
+        info = client.files.get(name=name)
+    except Exception as e:
+        # The Files API answers 403 rather than 404 for files that no longer exist
+        if getattr(e, "code", None) in (403, 404):
+            return datetime.now(timezone.utc)
+        raise
+    return getattr(info, "expiration_time", None)
+
+
+class RangedDownloader:
+    """
+    Downloads generated videos with parallel byte-range requests, resumable across failures.
+
+    The file is split into `chunk_size` ranges fetched `connections` at a time straight into their
+    place in a preallocated `.<name>.part` file next to the target. A `.part.json` sidecar records the
+    finished ranges and the server's validator (ETag / Last-Modified, also sent as If-Range), so when a
+    download fails the next attempt (the retry layer calls `download` again with the same target)
+    fetches only what is missing. When every range is in, the size and sha256 are checked against what
+    the Files API reports for the video (File.size_bytes / sha256_hash) before the file is renamed onto
+    the target. Servers that ignore Range get a single streamed request.
+
+    The URL and auth headers are those the client's own `files.download` would use; clients that don't
+    expose them (and inline videos) go through `download_video`. Blocking; run it in an executor.
+    """
+
+    def __init__(self, connections: int = DOWNLOAD_CONNECTIONS, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+        self.connections = max(1, connections)
+        self.chunk_size = max(READ_SIZE, chunk_size)
+        self.http = httpx.Client(
+            timeout=DOWNLOAD_TIMEOUT, follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.connections * 2, max_keepalive_connections=self.connections)
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="video-range")
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.ranged = 0
+        self.resumed = 0
+        self.bytes_fetched = 0
+        self.bytes_reused = 0
+        self.failed_ranges = 0
+        self.verification_failures = 0
+        self.seconds = 0.0
+
+    @staticmethod
+    def endpoint(client, video) -> Optional[Tuple[str, Dict[str, str]]]:
+        """The download URL and auth headers the Gemini client uses for this video, or None."""
+        api = getattr(client, "_api_client", None)
+        options = getattr(api, "_http_options", None)
+        name = video_file_name(video)
+        if options is None or not name or getattr(api, "vertexai", False):
+            return None
+        headers = {header: value for header, value in (options.headers or {}).items() if header.lower() != "content-type"}
+        return f"{options.base_url.rstrip('/')}/{options.api_version}/files/{name}:download?alt=media", headers
+
+    @staticmethod
+    def file_info(client, video) -> Tuple[Optional[int], Optional[str]]:
+        """(size, sha256 hex) the Files API reports for a generated video; (None, None) if unavailable."""
+        name = video_file_name(video)
+        if not name:
+            return None, None
+        try:
+            info = client.files.get(name=name)
+        except Exception as e:
+            logger.debug(f"No file metadata for {name}: {e}")
+            return None, None
+        return getattr(info, "size_bytes", None), _hex_sha256(getattr(info, "sha256_hash", None))
+
+    def download(self, client, video, final_path: Path) -> DownloadResult:
+        """Download a generated video (types.Video) to `final_path`, verified against the provider's metadata."""
+        endpoint = None if getattr(video, "video_bytes", None) else self.endpoint(client, video)
+        if endpoint is None:
+            return download_video(client, video, final_path)
+        size, sha256 = self.file_info(client, video)
+        return self.fetch(endpoint[0], endpoint[1], final_path, size, sha256)
+
+    def fetch(self, url: str, headers: Dict[str, str], final_path: Path, expected_size: Optional[int] = None, expected_sha256: Optional[str] = None) -> DownloadResult:
+        """Fetch `url` to `final_path` (resuming an earlier partial fetch to the same path) and verify it."""
+        final_path = Path(final_path)
+        part = final_path.with_name(f".{final_path.name}.part")
+        sidecar = part.with_name(f"{part.name}.json")
+        started = time.perf_counter()
+
+        # One byte tells us the size, whether ranges work and the validator to resume against
+        with self.http.stream("GET", url, headers={**headers, "range": "bytes=0-0"}) as response:
+            response.raise_for_status()
+            ranged = response.status_code == 206 and "content-range" in response.headers
+            total = int(response.headers["content-range"].rsplit("/", 1)[1]) if ranged else None
+            validator = response.headers.get("etag") or response.headers.get("last-modified")
+        if validator and validator.startswith("W/"):
+            validator = None  # If-Range needs a strong validator
+        if expected_size is not None and total is not None and total != expected_size:
+            raise DownloadVerificationError(f"server reports {total} bytes, Files API {expected_size}")
+
+        if ranged and total:
+            reused = self._fetch_ranges(url, headers, part, sidecar, total, validator)
+        else:
+            reused = 0
+            self._fetch_stream(url, headers, part)
+            sidecar.unlink(missing_ok=True)
+
+        try:
+            result = self._verify(part, expected_size if expected_size is not None else total, expected_sha256)
+        except DownloadVerificationError:
+            with self._lock:
+                self.verification_failures += 1
+            part.unlink(missing_ok=True)
+            sidecar.unlink(missing_ok=True)
+            raise
+        os.replace(part, final_path)
+        sidecar.unlink(missing_ok=True)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.downloads += 1
+            self.ranged += bool(ranged)
+            self.resumed += bool(reused)
+            self.bytes_reused += reused
+            self.seconds += elapsed
+        if reused:
+            logger.info(f"📥 Resumed {final_path.name}: {reused / (1024 * 1024):.1f} of {result.size_mb:.1f} MB were already on disk")
+        return DownloadResult(final_path, result.size_bytes, result.sha256)
+
+    def _load_state(self, part: Path, sidecar: Path, total: int, validator: Optional[str]) -> List[int]:
+        """Offsets of the ranges an earlier attempt finished, if its .part is for the same file."""
+        try:
+            state = json.loads(sidecar.read_text())
+        except (OSError, ValueError):
+            return []
+        same = (
+            state.get("size") == total and state.get("chunk_size") == self.chunk_size and validator is not None
+            and state.get("validator") == validator and part.exists() and part.stat().st_size == total
+        )
+        return list(state.get("done", [])) if same else []
+
+    @staticmethod
+    def _save_state(sidecar: Path, total: int, chunk_size: int, validator: Optional[str], done: List[int]) -> None:
+        temp = sidecar.with_name(f"{sidecar.name}.{uuid.uuid4().hex[:8]}")
+        temp.write_text(json.dumps({"size": total, "chunk_size": chunk_size, "validator": validator, "done": done}))
+        os.replace(temp, sidecar)
+
+    def _fetch_ranges(self, url: str, headers: Dict[str, str], part: Path, sidecar: Path, total: int, validator: Optional[str]) -> int:
+        """Fill `part` with every missing range; returns how many bytes an earlier attempt had already fetched."""
+        done = self._load_state(part, sidecar, total, validator)
+        if not done:
+            with open(part, "wb") as f:
+                f.truncate(total)
+        finished = set(done)
+        todo = [start for start in range(0, total, self.chunk_size) if start not in finished]
+        reused = total - sum(min(self.chunk_size, total - start) for start in todo)
+        if not todo:
+            return reused
+
+        state_lock = threading.Lock()
+        stop = threading.Event()
+        range_headers = {**headers, "if-range": validator} if validator else headers
+        fd = os.open(part, os.O_WRONLY)
+
+        def fetch_range(start: int) -> None:
+            end = min(start + self.chunk_size, total) - 1
+            offset = start
+            with self.http.stream("GET", url, headers={**range_headers, "range": f"bytes={start}-{end}"}) as response:
+                response.raise_for_status()
+                if response.status_code != 206 or not response.headers.get("content-range", "").startswith(f"bytes {start}-{end}/"):
+                    # 200 to an If-Range request: the file changed under us
+                    raise DownloadVerificationError(f"range {start}-{end} answered with {response.status_code} {response.headers.get('content-range')}")
+                for chunk in response.iter_bytes(READ_SIZE):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+            with self._lock:
+                self.bytes_fetched += offset - start
+            if offset != end + 1:
+                raise ConnectionError(f"range {start}-{end} ended after {offset - start} bytes")
+            os.fdatasync(fd)  # on disk before it is recorded as done
+            with state_lock:
+                done.append(start)
+                self._save_state(sidecar, total, self.chunk_size, validator, done)
+
+        def fetch_range_with_retries(start: int) -> None:
+            for attempt in range(1, RANGE_ATTEMPTS + 1):
+                if stop.is_set():
+                    return  # another range gave up; leave this one to the next attempt
+                try:
+                    return fetch_range(start)
+                except DownloadVerificationError:
+                    raise
+                except (ConnectionError, httpx.TransportError, httpx.HTTPStatusError) as e:
+                    status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                    with self._lock:
+                        self.failed_ranges += 1
+                    if attempt == RANGE_ATTEMPTS or (status is not None and status < 500 and status != 408):
+                        raise
+                    time.sleep(0.2 * attempt)
+
+        try:
+            futures = [self._executor.submit(fetch_range_with_retries, start) for start in todo]
+            finished_futures, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            errors = [future.exception() for future in finished_futures if future.exception()]
+            if errors:
+                # Ranges already streaming finish (and are recorded for the next attempt); the rest don't start
+                stop.set()
+                wait(pending)
+                raise errors[0]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return reused
+
+    def _fetch_stream(self, url: str, headers: Dict[str, str], part: Path) -> None:
+        with self.http.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            with open(part, "wb") as f:
+                for chunk in response.iter_bytes(READ_SIZE):
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        with self._lock:
+            self.bytes_fetched += part.stat().st_size
+
+    @staticmethod
+    def _verify(part: Path, expected_size: Optional[int], expected_sha256: Optional[str]) -> DownloadResult:
+        digest = hashlib.sha256()
+        size = 0
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        if expected_size is not None and size != expected_size:
+            raise DownloadVerificationError(f"got {size} bytes, expected {expected_size}")
+        sha256 = digest.hexdigest()
+        if expected_sha256 and sha256 != expected_sha256:
+            raise DownloadVerificationError(f"sha256 {sha256[:12]}… does not match the provider's {expected_sha256[:12]}…")
+        return DownloadResult(part, size, sha256)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "downloads": self.downloads,
+            "ranged": self.ranged,
+            "resumed": self.resumed,
+            "connections": self.connections,
+            "fetched_mb": round(self.bytes_fetched / (1024 * 1024), 2),
+            "reused_mb": round(self.bytes_reused / (1024 * 1024), 2),
+            "failed_ranges": self.failed_ranges,
+            "verification_failures": self.verification_failures,
+            "avg_seconds": round(self.seconds / self.downloads, 3) if self.downloads else None,
+        }
@@ -0,0 +1,211 @@
+"""
+MP4 Faststart
+Moves the moov box in front of the media data (no re-encoding) so players can start before the whole file arrives
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+from downloads import DownloadResult
+
+logger = logging.getLogger(__name__)
+
+FASTSTART_ENABLED = os.getenv("FASTSTART_ENABLED", "true").lower() in ("1", "true", "yes")
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Boxes on the path from moov to the chunk offset tables; everything else is copied as opaque bytes
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+class FaststartError(Exception):
+    """The file is not an MP4 this module can rewrite."""
+
+
+@dataclass
+class TopLevelBox:
+    kind: bytes
+    offset: int
+    size: int
+
+
+@dataclass
+class Box:
+    kind: bytes
+    payload: bytes = b""
+    children: Optional[List["Box"]] = None
+
+    def serialize(self) -> bytes:
+        body = b"".join(child.serialize() for child in self.children) if self.children is not None else self.payload
+        if len(body) + 8 > 0xFFFFFFFF:
+            return struct.pack(">I4sQ", 1, self.kind, len(body) + 16) + body
+        return struct.pack(">I4s", len(body) + 8, self.kind) + body
+
+
+def top_level_boxes(f) -> List[TopLevelBox]:
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    boxes, offset = [], 0
+    while offset < end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            raise FaststartError(f"truncated box header at {offset}")
+        size, kind = struct.unpack(">I4s", header)
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = end - offset
+        if size < 8 or offset + size > end:
+            raise FaststartError(f"bad size for {kind!r} box at {offset}")
+        boxes.append(TopLevelBox(kind, offset, size))
+        offset += size
+    return boxes
+
+
+def parse_boxes(data: bytes) -> List[Box]:
+    boxes, offset = [], 0
+    while offset < len(data):
+        size, kind = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header or offset + size > len(data):
+            raise FaststartError(f"bad size for {kind!r} box inside moov")
+        payload = data[offset + header:offset + size]
+        if kind in CONTAINER_BOXES:
+            boxes.append(Box(kind, children=parse_boxes(payload)))
+        else:
+            boxes.append(Box(kind, payload))
+        offset += size
+    return boxes
+
+
+def chunk_offset_boxes(boxes: List[Box]) -> List[Box]:
+    found = []
+    for box in boxes:
+        if box.children is not None:
+            found += chunk_offset_boxes(box.children)
+        elif box.kind in (b"stco", b"co64"):
+            found.append(box)
+    return found
+
+
+def shift_chunk_offsets(moov: Box, shift: Callable[[int], int]) -> None:
+    """Map every chunk offset through `shift`; 32-bit stco tables that overflow become 64-bit co64."""
+    for box in chunk_offset_boxes(moov.children):
+        version_flags = box.payload[:4]
+        count = struct.unpack_from(">I", box.payload, 4)[0]
+        wide = box.kind == b"co64"
+        offsets = struct.unpack_from(f">{count}{'Q' if wide else 'I'}", box.payload, 8)
+        shifted = [shift(offset) for offset in offsets]
+        if wide or max(shifted, default=0) > 0xFFFFFFFF:
+            box.kind = b"co64"
+            box.payload = version_flags + struct.pack(f">I{count}Q", count, *shifted)
+        else:
+            box.payload = version_flags + struct.pack(f">I{count}I", count, *shifted)
+
+
+def needs_faststart(path: Union[str, Path]) -> bool:
+    with open(path, "rb") as f:
+        boxes = top_level_boxes(f)
+    kinds = [box.kind for box in boxes]
+    return b"moov" in kinds and b"mdat" in kinds and kinds.index(b"moov") > kinds.index(b"mdat")
+
+
+def rewrite(path: Union[str, Path]) -> Optional[Tuple[int, str]]:
+    """
+    Rewrite `path` in place with moov before mdat (temp file + atomic rename).
+    Returns (new size, sha256) or None if the file already starts with moov.
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        boxes = top_level_boxes(f)
+        kinds = [box.kind for box in boxes]
+        if b"moov" not in kinds or b"mdat" not in kinds:
+            raise FaststartError("no moov/mdat box")
+        moov_box = boxes[kinds.index(b"moov")]
+        first_mdat = boxes[kinds.index(b"mdat")]
+        if moov_box.offset < first_mdat.offset:
+            return None
+
+        f.seek(moov_box.offset)
+        raw = f.read(moov_box.size)
+        header = 16 if struct.unpack_from(">I", raw)[0] == 1 else 8
+        moov = Box(b"moov", children=parse_boxes(raw[header:]))
+        if any(child.kind == b"cmov" for child in moov.children):
+            raise FaststartError("compressed moov")
+
+        # Media between the insertion point and the old moov moves down by the size of the new moov;
+        # media after the old moov (rare) only by the difference. The new moov grows if 32-bit offsets
+        # overflow and become co64, so repeat until its size is stable.
+        delta = len(moov.serialize())
+        for _ in range(3):
+            candidate = Box(b"moov", children=parse_boxes(raw[header:]))
+            shift_chunk_offsets(
+                candidate,
+                lambda offset: offset + delta if offset < moov_box.offset else offset + delta - moov_box.size
+            )
+            new_moov = candidate.serialize()
+            if len(new_moov) == delta:
+                break
+            delta = len(new_moov)
+        else:
+            raise FaststartError("moov size did not converge")
+
+        temp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.part")
+        digest = hashlib.sha256()
+        try:
+            with open(temp, "wb") as out:
+                def emit(data: bytes) -> None:
+                    digest.update(data)
+                    out.write(data)
+
+                for box in boxes:
+                    if box is moov_box:
+                        continue
+                    if box is first_mdat:
+                        emit(new_moov)
+                    f.seek(box.offset)
+                    remaining = box.size
+                    while remaining:
+                        chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                        if not chunk:
+                            raise FaststartError("file shrank while rewriting")
+                        emit(chunk)
+                        remaining -= len(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp, path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+    return path.stat().st_size, digest.hexdigest()
+
+
+def make_faststart(download: DownloadResult) -> DownloadResult:
+    """
+    Post-download stage: move moov to the front of a freshly downloaded video. Returns the download with
+    its new size/sha256 (the hash is the catalog ETag, so it must describe the final bytes). Files that
+    already start with moov, or that can't be parsed, are left as they are. Blocking; run it in an executor.
+    """
+    if not FASTSTART_ENABLED:
+        return download
+    try:
+        rewritten = rewrite(download.path)
+    except (FaststartError, struct.error, OSError) as e:
+        logger.warning(f"⚠️ Faststart skipped for {download.path.name}: {e}")
+        return download
+    if rewritten is None:
+        return download
+    size_bytes, sha256 = rewritten
+    logger.info(f"⏩ Faststart: moved moov to the front of {download.path.name}")
+    return DownloadResult(download.path, size_bytes, sha256)
@@ -12,10 +12,15 @@ import logging
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 from dotenv import load_dotenv
 from google import genai
-from google.genai import types
+
+from jobs import Job, JobManager
+from job_store import JobStore
+from retention import RetentionManager
+from veo_generator import VideoGeneratorGemini
+from video_tools import VideoLibrary
 
 # ElevenLabs imports  
 from elevenlabs.client import ElevenLabs
@@ -28,7 +33,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Global configuration
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEYS")  # single key or comma-separated pool
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY") 
 ELEVENLABS_AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID")
 
@@ -39,140 +44,48 @@ if not all([GEMINI_API_KEY, ELEVENLABS_API_KEY]):
 elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
 # genai.configure(api_key=GEMINI_API_KEY)
 
-class VideoGeneratorGemini:
-    """Handles Google Gemini (Veo 2) video generation"""
-
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.output_dir = Path("generated_videos")
-        self.output_dir.mkdir(exist_ok=True)
-
-    def generate_video(self, prompt: str, aspect_ratio: str = "16:9", person_generation: str = "dont_allow", **kwargs) -> Dict[str, Any]:
-        """
-        Generate video using Google Gemini (Veo 2) API.
-        
-        Args:
-            prompt: Text description for video generation
-            aspect_ratio: "16:9" (landscape) or "9:16" (portrait)
-            person_generation: "dont_allow" or "allow_adult"
-            **kwargs: Additional parameters (for compatibility)
-        """
-        try:
-            logger.info(f"Generating video with Gemini Veo 2:")
-            logger.info(f"  Prompt: '{prompt}'")
-            logger.info(f"  Aspect ratio: {aspect_ratio}")
-            logger.info(f"  Person generation: {person_generation}")
-            
-            # Start video generation
-            operation = self.client.models.generate_videos(
-                model="veo-2.0-generate-001",
-                prompt=prompt,
-                config=types.GenerateVideosConfig(
-                    person_generation=person_generation,
-                    aspect_ratio=aspect_ratio,
-                ),
-            )
-
-            logger.info(f"Video generation started. Operation ID: {operation.name}")
-            
-            # Poll until done
-            poll_count = 0
-            max_polls = 30  # Max ~10 minutes (30 * 20 seconds)
-            
-            while not operation.done and poll_count < max_polls:
-                poll_count += 1
-                logger.info(f"Waiting for video generation... (attempt {poll_count}/{max_polls})")
-                time.sleep(20)  # Wait 20 seconds between polls
-                operation = self.client.operations.get(operation.name)
-
-            if not operation.done:
-                logger.error("Video generation timed out after 10 minutes")
-                return {
-                    "success": False,
-                    "error": "Video generation timed out after 10 minutes",
-                    "prompt": prompt,
-                    "timestamp": datetime.now().isoformat()
-                }
-
-            # Check for errors
-            if operation.error:
-                logger.error(f"Video generation failed: {operation.error}")
-                return {
-                    "success": False,
-                    "error": str(operation.error),
-                    "prompt": prompt,
-                    "timestamp": datetime.now().isoformat()
-                }
-
-            # Download generated videos
-            output_paths = []
-            video_urls = []
-            
-            for n, generated_video in enumerate(operation.response.generated_videos):
-                # Create filename
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"gemini_video_{timestamp}_{n}.mp4"
-                filepath = self.output_dir / filename
-                
-                try:
-                    # Download video file
-                    logger.info(f"Downloading video {n+1}...")
-                    video_data = self.client.files.download(file=generated_video.video)
-                    
-                    # Save to local file
-                    with open(filepath, 'wb') as f:
-                        f.write(video_data)
-                    
-                    output_paths.append(str(filepath))
-                    # For web access, you'd typically upload to cloud storage and return URL
-                    # For now, return local file path
-                    video_urls.append(f"file://{filepath.absolute()}")
-                    
-                    logger.info(f"Video saved to: {filepath}")
-                    
-                except Exception as e:
-                    logger.error(f"Error downloading video {n}: {e}")
-                    continue
-
-            if not output_paths:
-                return {
-                    "success": False,
-                    "error": "Failed to download any generated videos",
-                    "prompt": prompt,
-                    "timestamp": datetime.now().isoformat()
-                }
-
-            return {
-                "success": True,
-                "video_urls": video_urls,
-                "local_paths": output_paths,
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,
-                "person_generation": person_generation,
-                "generation_time_minutes": (poll_count * 20) / 60,
-                "timestamp": datetime.now().isoformat()
-            }
-
-        except Exception as e:
-            logger.error(f"Error generating video with Gemini: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "prompt": prompt,
-                "timestamp": datetime.now().isoformat()
-            }
-
-# Initialize video generator
-video_gen_gemini = VideoGeneratorGemini()
+# Initialize video generator and background job tracking
+job_manager = JobManager(store=JobStore())
+# Pending downloads are persisted next to the jobs, so they are retried after a restart
+video_gen_gemini = VideoGeneratorGemini(job_store=job_manager.store)
+# Disk budget / age limits for generated_videos/
+retention = RetentionManager(video_gen_gemini.catalog, storage=video_gen_gemini.storage, job_store=job_manager.store)
+
+async def run_generation_job(job: Job) -> Dict[str, Any]:
+    """
+    Run a generate job from its recorded parameters.
+    Used for new jobs and for jobs resumed after a restart (job.variations carries their progress).
+    """
+    params = job.parameters
+    result = await video_gen_gemini.generate_video_async(
+        prompt=params["prompt"],
+        aspect_ratio=params.get("aspect_ratio", "16:9"),
+        person_generation=params.get("person_generation", "dont_allow"),
+        progress=job.update_variation,
+        resume=job.variations
+    )
+    if result.get("success"):
+        # Request-level metadata the generator doesn't see: style, originating tool/job, end-to-end time
+        await asyncio.to_thread(
+            video_gen_gemini.catalog.annotate,
+            result.get("video_ids") or [Path(path).name for path in result.get("local_paths", [])],
+            style=params.get("style"),
+            tool=job.tool,
+            job_id=job.job_id,
+            generation_seconds=round((datetime.now() - job.created_at).total_seconds(), 1)
+        )
+    return result
 
 # Tool Functions - These are called by the webhook handler
+# Generate tools enqueue a background job and return its job_id right away;
+# progress and final video URLs are available from GET /jobs/{job_id} or get_video_status.
 
-def generate_video_basic_tool(prompt: str) -> str:
+async def generate_video_basic_tool(prompt: str) -> str:
     """Generate a video from a text prompt using default settings."""
-    result = video_gen_gemini.generate_video(prompt)
-    return json.dumps(result, indent=2)
+    job = job_manager.submit("generate_video_basic", {"prompt": prompt}, run_generation_job)
+    return json.dumps(job_manager.accepted_response(job), indent=2)
 
-def generate_video_advanced_tool(
+async def generate_video_advanced_tool(
     prompt: str, 
     style: str = "cinematic", 
     format_type: str = "landscape", 
@@ -219,85 +132,24 @@ def generate_video_advanced_tool(
     logger.info(f"Advanced generation: style={style}, format={format_type}, people={allow_people}")
     logger.info(f"Mapped to: aspect_ratio={aspect_ratio}, person_generation={person_generation}")
     
-    result = video_gen_gemini.generate_video(
-        prompt=enhanced_prompt,
-        aspect_ratio=aspect_ratio,
-        person_generation=person_generation
+    job = job_manager.submit(
+        "generate_video_advanced",
+        {
+            "prompt": enhanced_prompt,
+            "style": style,
+            "aspect_ratio": aspect_ratio,
+            "person_generation": person_generation
+        },
+        run_generation_job
     )
-    return json.dumps(result, indent=2)
+    return json.dumps(job_manager.accepted_response(job), indent=2)
 
-def get_video_status_tool(video_path: str) -> str:
-    """Check the status of a generated video file."""
-    try:
-        if video_path.startswith("file://"):
-            file_path = video_path.replace("file://", "")
-        else:
-            file_path = video_path
-            
-        if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
-            status = {
-                "video_path": video_path,
-                "status": "available",
-                "file_size_mb": round(file_size / (1024 * 1024), 2),
-                "exists": True,
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            status = {
-                "video_path": video_path,
-                "status": "not_found",
-                "exists": False,
-                "timestamp": datetime.now().isoformat()
-            }
-        return json.dumps(status, indent=2)
-    except Exception as e:
-        return json.dumps({
-            "video_path": video_path,
-            "status": "error",
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }, indent=2)
-
-def list_recent_videos_tool() -> str:
-    """List recently generated videos from the output directory."""
-    try:
-        output_dir = Path("generated_videos")
-        if not output_dir.exists():
-            return json.dumps({
-                "videos": [],
-                "count": 0,
-                "message": "No videos generated yet",
-                "timestamp": datetime.now().isoformat()
-            }, indent=2)
-        
-        video_files = list(output_dir.glob("*.mp4"))
-        video_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)  # Sort by modification time
-        
-        videos = []
-        for video_file in video_files[:10]:  # Last 10 videos
-            stat = video_file.stat()
-            videos.append({
-                "filename": video_file.name,
-                "path": str(video_file.absolute()),
-                "size_mb": round(stat.st_size / (1024 * 1024), 2),
-                "created": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                "url": f"file://{video_file.absolute()}"
-            })
-        
-        return json.dumps({
-            "videos": videos,
-            "count": len(videos),
-            "total_files": len(video_files),
-            "output_directory": str(output_dir.absolute()),
-            "timestamp": datetime.now().isoformat()
-        }, indent=2)
-        
-    except Exception as e:
-        return json.dumps({
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }, indent=2)
+# Status, listing, search and pinning of generated videos (shared with the other servers)
+library = VideoLibrary(video_gen_gemini.catalog, video_gen_gemini.storage, job_manager)
+get_video_status_tool = library.get_video_status
+list_recent_videos_tool = library.list_recent_videos
+pin_video_tool = library.pin_video
+search_videos_tool = library.search_videos
 
 class VoiceVideoAgent:
     """Main orchestrator for voice-controlled video generation"""
@@ -323,14 +175,17 @@ When users request videos:
 - Ask clarifying questions about style, mood, and format requirements
 - Suggest improvements to prompts for better results
 - Explain that video generation takes 2-10 minutes with Gemini Veo 2
+- Generation runs in the background: the generate tools return a job_id right away, use get_video_status with that job_id to check progress and get the video links
 - Offer format options: landscape (16:9) for desktop/TV or portrait (9:16) for mobile/social media
 - Ask about including people in videos (some use cases may require this setting)
 
 Available tools:
 - generate_video_basic: For simple video generation with default settings
 - generate_video_advanced: For videos with specific style, format, and people settings
-- get_video_status: To check if a video file exists and get its details
+- get_video_status: To check a generation job (by job_id) or whether a video file exists and get its details
 - list_recent_videos: To show recent video creations
+- search_videos: To find past videos by prompt content, style or date
+- pin_video: To keep a favourite video from being cleaned up automatically
 
 Video generation capabilities:
 - High-quality video output using Google's Veo 2 model
@@ -354,13 +209,23 @@ Always be helpful, creative, and provide clear explanations of what you're doing
             },
             {
                 "name": "get_video_status",
-                "description": "Check the status and details of a generated video file",
+                "description": "Check the progress of a generation job (pass its job_id) or the details of a generated video file",
                 "webhook_url": "http://localhost:8000/tools/get_video_status"
             },
             {
                 "name": "list_recent_videos",
-                "description": "List recently generated videos with details",
+                "description": "List recently generated videos with details, newest first; optional limit, model, aspect_ratio, since/until (ISO dates) filters and cursor (next_cursor of the previous page)",
                 "webhook_url": "http://localhost:8000/tools/list_recent_videos"
+            },
+            {
+                "name": "search_videos",
+                "description": "Search past videos by what their prompt described (e.g. query 'ocean', style 'cinematic', days 7 for last week); optional model, aspect_ratio, since/until filters",
+                "webhook_url": "http://localhost:8000/tools/search_videos"
+            },
+            {
+                "name": "pin_video",
+                "description": "Keep a video permanently (exempt from automatic disk cleanup); pass its filename or URL as video_path, pinned 'no' to unpin",
+                "webhook_url": "http://localhost:8000/tools/pin_video"
             }
         ]
         
@@ -402,7 +267,6 @@ async def start_webhook_server():
     """Start webhook server to handle tool calls from ElevenLabs agent"""
     from fastapi import FastAPI, Request
     from fastapi.middleware.cors import CORSMiddleware
-    from fastapi.staticfiles import StaticFiles
     import uvicorn
     
     app = FastAPI(title="Gemini Veo 2 Video Generation Server")
@@ -416,9 +280,8 @@ async def start_webhook_server():
         allow_headers=["*"],
     )
     
-    # Serve generated videos as static files
-    if Path("generated_videos").exists():
-        app.mount("/videos", StaticFiles(directory="generated_videos"), name="videos")
+    # /videos, /previews, /jobs, /catalog and /search
+    media_files, media_server = library.mount(app, retention)
     
     @app.post("/tools/{tool_name}")
     async def handle_tool_call(tool_name: str, request: Request):
@@ -435,8 +298,7 @@ async def start_webhook_server():
                 if not prompt:
                     result_json = json.dumps({"error": "No prompt provided"}, indent=2)
                 else:
-                    result = video_gen_gemini.generate_video(prompt)
-                    result_json = json.dumps(result, indent=2)
+                    result_json = await generate_video_basic_tool(prompt)
                 
             elif tool_name == "generate_video_advanced":
                 prompt = parameters.get("prompt", "")
@@ -447,14 +309,10 @@ async def start_webhook_server():
                 if not prompt:
                     result_json = json.dumps({"error": "No prompt provided"}, indent=2)
                 else:
-                    result_json = generate_video_advanced_tool(prompt, style, format_type, allow_people)
+                    result_json = await generate_video_advanced_tool(prompt, style, format_type, allow_people)
                 
-            elif tool_name == "get_video_status":
-                video_path = parameters.get("video_path", "")
-                result_json = get_video_status_tool(video_path)
-                    
-            elif tool_name == "list_recent_videos":
-                result_json = list_recent_videos_tool()
+            elif tool_name in VideoLibrary.TOOLS:
+                result_json = await library.call_tool(tool_name, parameters)
                 
             else:
                 result_json = json.dumps({"error": f"Unknown tool: {tool_name}"}, indent=2)
@@ -471,6 +329,10 @@ async def start_webhook_server():
         return {
             "status": "healthy", 
             "service": "Gemini Veo 2 Video Generator",
+            **video_gen_gemini.stats(),
+            "catalog": await asyncio.to_thread(video_gen_gemini.catalog.stats),
+            "media": media_server.stats() if media_server else media_files.stats(),
+            "retention": retention.stats(),
             "timestamp": datetime.now().isoformat()
         }
     
@@ -482,15 +344,41 @@ async def start_webhook_server():
             "endpoints": {
                 "health": "/health",
                 "tools": "/tools/{tool_name}",
-                "videos": "/videos/ (static file serving)"
+                "jobs": "/jobs/{job_id}",
+                "catalog": "/catalog",
+                "search": "/search?q=...",
+                "videos": "/videos/{filename} (range requests, ETags; redirects to object storage when VIDEO_STORAGE=s3)",
+                "previews": "/previews/{poster or preview filename}"
             }
         }
     
+    # Index videos already on disk (and, with VIDEO_CATALOG_RECONCILE_SECONDS, keep re-checking) in the background
+    video_gen_gemini.catalog.start_watcher()
+    # Posters / previews for videos from before the preview stage existed (worker processes, in the background)
+    backfill = asyncio.create_task(video_gen_gemini.previews.backfill())
+    # Evict / expire videos over the disk budget and clean up leftovers in a background thread
+    retention.start()
+    
+    # Retry downloads that were still failing when the server last stopped
+    await video_gen_gemini.download_stage.resume_pending()
+    
+    # Pick up jobs whose operations were still in flight when the server last stopped
+    resumed = job_manager.resume_unfinished(run_generation_job)
+    if resumed:
+        logger.info(f"Resumed {len(resumed)} unfinished job(s) from the job store")
+    
     # Start server
     logger.info("Starting Gemini Veo 2 webhook server on http://localhost:8000")
     config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
     server = uvicorn.Server(config)
-    await server.serve()
+    try:
+        await server.serve()
+    finally:
+        backfill.cancel()
+        retention.stop()
+        if media_server:
+            media_server.stop()
+        job_manager.store.flush()
 
 async def main():
     """Main application entry point"""
@@ -499,7 +387,7 @@ async def main():
     
     # Check API keys
     if not GEMINI_API_KEY:
-        logger.error("❌ GEMINI_API_KEY not found in environment variables")
+        logger.error("❌ GEMINI_API_KEY (or GEMINI_API_KEYS) not found in environment variables")
         return
         
     if not ELEVENLABS_API_KEY:
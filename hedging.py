@@ -0,0 +1,140 @@
+"""
+Hedged Generation Requests
+Decides when a slow Veo operation deserves a duplicate, within a fixed budget of extra spend
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEDGE_ENABLED = os.getenv("VEO_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("VEO_HEDGE_PERCENTILE", "0.9"))  # hedge operations slower than this share of history
+HEDGE_BUDGET = float(os.getenv("VEO_HEDGE_BUDGET", "0.1"))  # max hedges as a fraction of primary submissions
+HEDGE_MIN_SAMPLES = int(os.getenv("VEO_HEDGE_MIN_SAMPLES", "10"))  # completed operations needed before hedging
+HEDGE_WINDOW = 500
+
+
+class HedgePolicy:
+    """
+    Latency history plus the hedge budget.
+
+    `threshold()` is the configured percentile of recent successful generation times; an operation still
+    running after that long is a hedge candidate. `try_hedge()` only says yes while hedges stay within
+    `budget` × primary submissions, so the extra spend is bounded (10% by default). Thread safe.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = HEDGE_ENABLED,
+        percentile: float = HEDGE_PERCENTILE,
+        budget: float = HEDGE_BUDGET,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        window: int = HEDGE_WINDOW,
+    ):
+        self.enabled = enabled
+        self.percentile = min(max(percentile, 0.0), 1.0)
+        self.budget = max(budget, 0.0)
+        self.min_samples = max(1, min_samples)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped_over_budget = 0
+        self.skipped_no_capacity = 0
+
+    def record_submission(self) -> None:
+        with self._lock:
+            self.primaries += 1
+
+    def record_latency(self, seconds: float) -> None:
+        """Duration of an operation that completed successfully (primary or hedge)."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def threshold(self) -> Optional[float]:
+        """Seconds after which to hedge, or None (disabled / not enough history yet)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))]
+
+    def try_hedge(self) -> bool:
+        """Reserve one hedge if the budget allows it."""
+        with self._lock:
+            if self.hedges + 1 > self.budget * max(self.primaries, 1):
+                self.skipped_over_budget += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def release_no_capacity(self) -> None:
+        """Give back a hedge reserved by `try_hedge` that found no free rate-limit token / operation slot."""
+        with self._lock:
+            self.hedges -= 1
+            self.skipped_no_capacity += 1
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.hedge_wins += 1
+
+    async def race(self, pending: Dict[asyncio.Future, Tuple[Any, str]], started: float, abandon: Callable[[str], None], on_hedge_win: Callable[[Any, str], None]) -> Tuple[Any, Any]:
+        """
+        Wait for the primary operation (the first entry of `pending`, future -> (key, operation name)) and its hedge.
+        The first to finish successfully wins: the other is cancelled and `abandon`ed (no longer polled), and
+        `on_hedge_win(key, name)` is called if it was the hedge. If both fail, the primary's outcome is
+        returned (or raised). Returns (final operation, key).
+        """
+        pending = dict(pending)
+        primary = next(iter(pending))
+        outcomes = {}
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                key, name = pending.pop(future)
+                try:
+                    final = future.result()
+                except Exception as e:
+                    outcomes[future] = (e, key)
+                    continue
+                outcomes[future] = (final, key)
+                if final.done and not final.error:
+                    for loser, (_, loser_name) in pending.items():
+                        loser.cancel()
+                        abandon(loser_name)
+                    self.record_latency(time.monotonic() - started)
+                    if future is not primary:
+                        self.record_win()
+                        on_hedge_win(key, name)
+                    return final, key
+
+        outcome, key = outcomes[primary]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, key
+
+    def stats(self) -> Dict[str, Any]:
+        threshold = self.threshold()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "percentile": self.percentile,
+                "threshold_seconds": round(threshold, 1) if threshold is not None else None,
+                "budget": self.budget,
+                "primaries": self.primaries,
+                "hedges": self.hedges,
+                "hedge_rate": round(self.hedges / self.primaries, 3) if self.primaries else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "skipped_over_budget": self.skipped_over_budget,
+                "skipped_no_capacity": self.skipped_no_capacity,
+            }
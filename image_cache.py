@@ -0,0 +1,178 @@
+"""
+Image Preprocessing Cache
+Resizes and re-encodes input images for image-to-video uploads once per (image content, target size)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+try:  # Pillow is optional: without it images are uploaded as-is
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+HASH_CHUNK_SIZE = 1024 * 1024
+# Disk budget for preprocessed images (0 = unlimited); least recently used files are evicted past it
+IMAGE_CACHE_MAX_BYTES = int(float(os.getenv("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+# Memoized source image hashes
+MAX_HASH_ENTRIES = 4096
+
+# Output sizes Stability's image-to-video accepts, by aspect ratio
+ASPECT_SIZES = {
+    "16:9": (1024, 576),
+    "9:16": (576, 1024),
+    "1:1": (768, 768),
+}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImagePreprocessor:
+    """
+    On-disk cache of upload-ready images, keyed by (sha256 of the source image, target size).
+
+    `prepare(path, size)` returns the path of a PNG that is exactly `size` (center-cropped to the target
+    aspect ratio, then resized), decoding and resizing only on the first request for that pair. Content
+    hashes are memoized by (path, mtime, size) so repeated requests don't re-read the source either.
+    Without Pillow the original file is returned unchanged. Blocking; call it from an executor.
+
+    The directory is kept under `max_bytes`: a hit refreshes a file's mtime, and after a miss pushes
+    the total over budget the least recently used files are deleted. The hash memo is a bounded LRU
+    and per-file locks only exist while a request for that file is in progress.
+    """
+
+    def __init__(self, cache_dir: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self.enabled = Image is not None
+        self._hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        # target name -> [lock, requests using it]
+        self._locks: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._bytes = sum(f.stat().st_size for f in self.cache_dir.glob("*.png"))
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.bytes_saved = 0  # upload bytes avoided compared to sending the originals
+        if not self.enabled:
+            logger.warning("⚠️ Pillow not installed: input images are uploaded without resizing")
+
+    def content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(signature)
+            if cached:
+                self._hashes.move_to_end(signature)
+                return cached
+        digest = file_sha256(path)
+        with self._lock:
+            self._hashes[signature] = digest
+            if len(self._hashes) > MAX_HASH_ENTRIES:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def prepare(self, path: str, size: Optional[Tuple[int, int]] = None) -> Path:
+        """Path of the upload-ready version of `path` at `size` (default 16:9)."""
+        if not self.enabled:
+            return Path(path)
+        width, height = size or ASPECT_SIZES["16:9"]
+        target = self.cache_dir / f"{self.content_hash(path)}_{width}x{height}.png"
+
+        with self._lock:
+            entry = self._locks.setdefault(target.name, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            # Concurrent requests for the same image and size wait for one resize instead of each doing it
+            with entry[0]:
+                if target.exists():
+                    os.utime(target)  # recently used: evicted last
+                    with self._lock:
+                        self.hits += 1
+                        self.bytes_saved += max(0, os.path.getsize(path) - target.stat().st_size)
+                    return target
+                self._resize(path, target, (width, height))
+                size_bytes = target.stat().st_size
+                with self._lock:
+                    self.misses += 1
+                    self.bytes_saved += max(0, os.path.getsize(path) - size_bytes)
+                    self._bytes += size_bytes
+                    over_budget = self.max_bytes and self._bytes > self.max_bytes
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[target.name]
+        logger.info(f"🖼️ Preprocessed {path} -> {target.name}")
+        if over_budget:
+            self._evict(keep=target)
+        return target
+
+    def _evict(self, keep: Path) -> None:
+        """Delete least recently used images (not `keep`, nor any being prepared) until the cache is back under budget."""
+        files = []
+        for file in self.cache_dir.glob("*.png"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        files.sort()
+        with self._lock:
+            self._bytes = sum(size for _, size, _ in files)
+            for _, size, file in files:
+                if self._bytes <= self.max_bytes:
+                    break
+                if file == keep or file.name in self._locks:
+                    continue
+                file.unlink(missing_ok=True)
+                self._bytes -= size
+                self.evicted += 1
+
+    @staticmethod
+    def _resize(source: str, target: Path, size: Tuple[int, int]) -> None:
+        temp = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGB")
+                if image.size == size:
+                    image.save(temp, format="PNG")
+                else:
+                    ImageOps.fit(image, size, method=Image.Resampling.LANCZOS).save(temp, format="PNG", optimize=True)
+            os.replace(temp, target)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            files = list(self.cache_dir.glob("*.png"))
+            return {
+                "enabled": self.enabled,
+                "entries": len(files),
+                "cache_bytes": sum(f.stat().st_size for f in files),
+                "budget_bytes": self.max_bytes or None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+                "upload_bytes_saved": self.bytes_saved,
+            }
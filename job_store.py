@@ -0,0 +1,303 @@
+"""
+Durable Job Store
+SQLite (WAL mode) record of generation jobs, their Veo operations and pending downloads, so in-flight work survives restarts
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("PROOFAI_DB_PATH", "proofai.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    state TEXT NOT NULL,
+    variations TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+
+CREATE TABLE IF NOT EXISTS operations (
+    operation_name TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    variation INTEGER NOT NULL,
+    model TEXT,
+    parameters TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS operations_job ON operations(job_id);
+
+CREATE TABLE IF NOT EXISTS operation_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation_name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    detail TEXT,
+    at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS downloads (
+    download_id TEXT PRIMARY KEY,
+    backend TEXT NOT NULL,
+    operation_name TEXT NOT NULL,
+    video_index INTEGER NOT NULL,
+    video TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    api_key TEXT,
+    variation INTEGER,
+    metadata TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    expires_at TEXT,
+    result TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS downloads_state ON downloads(backend, state);
+"""
+
+DOWNLOAD_JSON_FIELDS = ("video", "metadata", "result")
+
+_STOP = object()
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a WAL-mode connection usable from any thread (callers serialize access themselves)."""
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class JobStore:
+    """
+    Persists jobs, operations, operation state transitions and the download stage's retry queue.
+
+    Writes are put on a queue and applied by one background thread, which drains everything that is
+    pending into a single transaction. Callers on the event loop therefore never wait for SQLite, and
+    bursts of progress updates cost one commit instead of one per update. Repeated upserts of the same
+    job within a batch collapse to the latest one.
+    """
+
+    def __init__(self, path: str = DB_PATH, max_batch: int = 500):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._read_conn = connect(path)
+        self._read_conn.executescript(SCHEMA)
+        self._read_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True)
+        self._writer.start()
+
+    # Writes (non-blocking)
+
+    def save_job(self, record: Dict[str, Any]) -> None:
+        """Upsert a job row. `record` is Job.to_record()."""
+        # Serialize now: the job keeps mutating on the event loop while the row waits in the queue
+        row = {
+            **record,
+            "parameters": json.dumps(record["parameters"]),
+            "variations": json.dumps(record["variations"]),
+            "result": json.dumps(record["result"]) if record["result"] is not None else None,
+        }
+        self._queue.put(("job", record["job_id"], row))
+
+    def save_operation(self, operation_name: str, job_id: str, variation: int, model: Optional[str], parameters: Dict[str, Any], state: str, error: Optional[str] = None) -> None:
+        """Upsert an operation row and append a state transition event."""
+        record = {
+            "operation_name": operation_name,
+            "job_id": job_id,
+            "variation": variation,
+            "model": model,
+            "parameters": json.dumps(parameters),
+            "state": state,
+            "error": error,
+            "at": datetime.now().isoformat(),
+        }
+        self._queue.put(("operation", None, record))
+
+    def save_download(self, record: Dict[str, Any]) -> None:
+        """Upsert a download row. `record` is DownloadTask.to_record()."""
+        row = {**record, **{field: json.dumps(record[field]) for field in DOWNLOAD_JSON_FIELDS}}
+        self._queue.put(("download", record["download_id"], row))
+
+    def flush(self, timeout: float = 10) -> None:
+        """Block until everything queued so far is committed (used on shutdown and in scripts)."""
+        done = threading.Event()
+        self._queue.put(("flush", None, done))
+        done.wait(timeout)
+
+    def close(self) -> None:
+        self._queue.put((_STOP, None, None))
+        self._writer.join(timeout=10)
+        self._read_conn.close()
+
+    # Reads (blocking; call via asyncio.to_thread from the event loop)
+
+    def load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._read_lock:
+            row = self._read_conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def unfinished_jobs(self) -> List[Dict[str, Any]]:
+        """Jobs that were queued or running when the process stopped."""
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT * FROM jobs WHERE state IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._job_from_row(row) for row in rows]
+
+    def load_download(self, download_id: str) -> Optional[Dict[str, Any]]:
+        with self._read_lock:
+            row = self._read_conn.execute("SELECT * FROM downloads WHERE download_id = ?", (download_id,)).fetchone()
+        return self._download_from_row(row) if row else None
+
+    def pending_downloads(self, backend: str) -> List[Dict[str, Any]]:
+        """Downloads of `backend` that had not succeeded (or expired) when the process stopped."""
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT * FROM downloads WHERE backend = ? AND state = 'pending' ORDER BY created_at",
+                (backend,)
+            ).fetchall()
+        return [self._download_from_row(row) for row in rows]
+
+    def pending_download_files(self) -> List[str]:
+        """Filenames of every backend's pending downloads (their staging files must survive cleanup)."""
+        with self._read_lock:
+            rows = self._read_conn.execute("SELECT filename FROM downloads WHERE state = 'pending'").fetchall()
+        return [row["filename"] for row in rows]
+
+    def operation_history(self, operation_name: str) -> List[Dict[str, Any]]:
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT state, detail, at FROM operation_events WHERE operation_name = ? ORDER BY id",
+                (operation_name,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _job_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["parameters"] = json.loads(record["parameters"])
+        record["variations"] = json.loads(record["variations"])
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+    @staticmethod
+    def _download_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        for field in DOWNLOAD_JSON_FIELDS:
+            record[field] = json.loads(record[field]) if record[field] else None
+        return record
+
+    # Writer thread
+
+    def _write_loop(self) -> None:
+        conn = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(kind is _STOP for kind, _, _ in batch)
+            flushes = [payload for kind, _, payload in batch if kind == "flush"]
+            try:
+                self._apply(conn, batch)
+            except Exception as e:
+                logger.warning(f"⚠️ Job store batch write failed ({e}); writing its {len(batch)} updates one at a time")
+                self._apply_each(conn, batch)
+            for done in flushes:
+                done.set()
+            if stop:
+                conn.close()
+                return
+
+    def _apply_each(self, conn: sqlite3.Connection, batch: List) -> None:
+        """Commit updates one by one so a bad row only loses itself, not the rest of its batch."""
+        dropped = 0
+        for update in batch:
+            if update[0] not in ("job", "operation", "download"):
+                continue
+            try:
+                self._apply(conn, [update])
+            except Exception as e:
+                dropped += 1
+                logger.error(f"❌ Job store write of {update[0]} {update[1] or update[2].get('operation_name')} failed: {e}")
+        if dropped:
+            logger.error(f"❌ Job store dropped {dropped} of {len(batch)} updates")
+
+    def _apply(self, conn: sqlite3.Connection, batch: List) -> None:
+        latest_jobs: Dict[str, Dict[str, Any]] = {}
+        operations: List[Dict[str, Any]] = []
+        latest_downloads: Dict[str, Dict[str, Any]] = {}
+        for kind, key, payload in batch:
+            if kind == "job":
+                latest_jobs[key] = payload
+            elif kind == "operation":
+                operations.append(payload)
+            elif kind == "download":
+                latest_downloads[key] = payload
+
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO jobs (job_id, tool, parameters, state, variations, result, error, created_at, updated_at)
+                VALUES (:job_id, :tool, :parameters, :state, :variations, :result, :error, :created_at, :updated_at)
+                ON CONFLICT(job_id) DO UPDATE SET
+                    state = excluded.state,
+                    variations = excluded.variations,
+                    result = excluded.result,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                list(latest_jobs.values())
+            )
+            conn.executemany(
+                """
+                INSERT INTO operations (operation_name, job_id, variation, model, parameters, state, error, created_at, updated_at)
+                VALUES (:operation_name, :job_id, :variation, :model, :parameters, :state, :error, :at, :at)
+                ON CONFLICT(operation_name) DO UPDATE SET
+                    state = excluded.state,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                operations
+            )
+            conn.executemany(
+                "INSERT INTO operation_events (operation_name, state, detail, at) VALUES (?, ?, ?, ?)",
+                [(op["operation_name"], op["state"], op["error"], op["at"]) for op in operations]
+            )
+            conn.executemany(
+                """
+                INSERT INTO downloads (download_id, backend, operation_name, video_index, video, filename, api_key, variation, metadata, state, attempts, error, expires_at, result, created_at, updated_at)
+                VALUES (:download_id, :backend, :operation_name, :video_index, :video, :filename, :api_key, :variation, :metadata, :state, :attempts, :error, :expires_at, :result, :created_at, :updated_at)
+                ON CONFLICT(download_id) DO UPDATE SET
+                    state = excluded.state,
+                    attempts = excluded.attempts,
+                    error = excluded.error,
+                    expires_at = excluded.expires_at,
+                    result = excluded.result,
+                    updated_at = excluded.updated_at
+                """,
+                list(latest_downloads.values())
+            )
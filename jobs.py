@@ -0,0 +1,251 @@
+"""
+Background Job Tracking
+Lets the webhook servers return a job ID immediately while videos generate in the background
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+
+from job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, FAILED)
+
+
+class Job:
+    """A single generation request and the per-variation progress reported by the generator"""
+
+    def __init__(self, tool: str, parameters: Dict[str, Any], n_variations: int = 1):
+        self.job_id = uuid.uuid4().hex
+        self.tool = tool
+        self.parameters = parameters
+        self.state = QUEUED
+        self.variations = [
+            {"variation": i + 1, "state": QUEUED, "polls": 0, "videos": []}
+            for i in range(n_variations)
+        ]
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.updated_at = self.created_at
+        self.task: Optional[asyncio.Task] = None
+        # Called as listener(job, variation, previous_state, previous_operation) after every progress update
+        self.listener: Optional[Callable[["Job", int, str, Optional[str]], None]] = None
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Job":
+        """Rebuild a job from its JobStore row."""
+        job = cls(record["tool"], record["parameters"])
+        job.job_id = record["job_id"]
+        job.state = record["state"]
+        job.variations = record["variations"]
+        job.result = record["result"]
+        job.error = record["error"]
+        job.created_at = datetime.fromisoformat(record["created_at"])
+        job.updated_at = datetime.fromisoformat(record["updated_at"])
+        return job
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "tool": self.tool,
+            "parameters": self.parameters,
+            "state": self.state,
+            "variations": self.variations,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+    def update_variation(self, variation: int, state: str, **info) -> None:
+        """Progress callback handed to the generators: record the latest state of one variation."""
+        if not 1 <= variation <= len(self.variations):
+            return
+        entry = self.variations[variation - 1]
+        previous_state = entry["state"]
+        previous_operation = entry.get("operation")
+        entry["state"] = state
+        entry.update(info)
+        self.updated_at = datetime.now()
+        if self.listener:
+            self.listener(self, variation, previous_state, previous_operation)
+
+    def video_urls(self) -> List[str]:
+        if not self.result:
+            return []
+        if "videos" in self.result:
+            return [video["url"] for video in self.result["videos"]]
+        return list(self.result.get("video_urls", []))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "tool": self.tool,
+            "status": self.state,
+            "parameters": self.parameters,
+            "variations": self.variations,
+            "video_urls": self.video_urls(),
+            "result": self.result,
+            "error": self.error,
+            "created": self.created_at.isoformat(),
+            "updated": self.updated_at.isoformat(),
+        }
+
+
+class JobManager:
+    """Runs generation coroutines as background tasks and keeps their state for GET /jobs/{id}"""
+
+    def __init__(self, base_url: str = "http://localhost:8000", max_finished_jobs: int = 1000, store: Optional[JobStore] = None):
+        self.base_url = base_url
+        self.max_finished_jobs = max_finished_jobs
+        self.store = store
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # dedupe_key -> unfinished job, so identical concurrent requests share one generation
+        self.inflight: Dict[str, Job] = {}
+        self.coalesced = 0
+
+    def status_url(self, job_id: str) -> str:
+        return f"{self.base_url}/jobs/{job_id}"
+
+    def submit(
+        self,
+        tool: str,
+        parameters: Dict[str, Any],
+        run: Callable[[Job], Awaitable[Dict[str, Any]]],
+        n_variations: int = 1,
+        dedupe_key: Optional[str] = None,
+    ) -> Job:
+        """
+        Register a job and start `run(job)` in the background. Must be called from the event loop.
+        `run` receives the job so it can pass `job.update_variation` to the generator as progress callback.
+
+        If `dedupe_key` is given and a job with the same key is still queued or running, that job is
+        returned instead of starting a new one: the caller gets its job_id and therefore its result.
+        """
+        if dedupe_key:
+            existing = self.inflight.get(dedupe_key)
+            if existing and existing.state not in FINISHED_STATES:
+                self.coalesced += 1
+                logger.info(f"🔗 Coalesced {tool} request into in-flight job {existing.job_id}")
+                return existing
+        job = Job(tool, parameters, n_variations)
+        self._start(job, run, dedupe_key)
+        logger.info(f"📥 Queued job {job.job_id} ({tool}, {n_variations} variation(s))")
+        return job
+
+    def resume_unfinished(
+        self,
+        run: Callable[[Job], Awaitable[Dict[str, Any]]],
+        dedupe_key: Optional[Callable[[Job], str]] = None,
+    ) -> List[Job]:
+        """
+        Restart jobs that were queued or running when the process stopped. Must be called from the event loop.
+        `run(job)` gets the recorded job.variations, so the generators pick up existing operation names
+        instead of resubmitting (and paying for) the generation again. `dedupe_key(job)` re-registers
+        resumed jobs for coalescing.
+        """
+        if not self.store:
+            return []
+        resumed = []
+        for record in self.store.unfinished_jobs():
+            job = Job.from_record(record)
+            self._start(job, run, dedupe_key(job) if dedupe_key else None)
+            resumed.append(job)
+            logger.info(f"♻️ Resumed job {job.job_id} ({job.tool})")
+        return resumed
+
+    def _start(self, job: Job, run: Callable[[Job], Awaitable[Dict[str, Any]]], dedupe_key: Optional[str] = None) -> None:
+        job.listener = self._on_variation_update
+        self.jobs[job.job_id] = job
+        if dedupe_key:
+            self.inflight[dedupe_key] = job
+        self._persist(job)
+        job.task = asyncio.create_task(self._run(job, run, dedupe_key))
+        self._prune()
+
+    def _persist(self, job: Job) -> None:
+        if self.store:
+            self.store.save_job(job.to_record())
+
+    def _on_variation_update(self, job: Job, variation: int, previous_state: str, previous_operation: Optional[str]) -> None:
+        self._persist(job)
+        entry = job.variations[variation - 1]
+        # A new operation (hedge winner, resubmitted after a restart) needs its own row even if the state is unchanged
+        changed = entry["state"] != previous_state or entry.get("operation") != previous_operation
+        if self.store and entry.get("operation") and changed:
+            self.store.save_operation(
+                entry["operation"],
+                job.job_id,
+                variation,
+                entry.get("model"),
+                job.parameters,
+                entry["state"],
+                entry.get("error")
+            )
+
+    def accepted_response(self, job: Job) -> Dict[str, Any]:
+        """The immediate tool response for a freshly queued (or coalesced, already running) job."""
+        return {
+            "success": True,
+            "job_id": job.job_id,
+            "status": job.state,
+            "status_url": self.status_url(job.job_id),
+            "variations_requested": len(job.variations),
+            "message": "Video generation started. Check progress with get_video_status using the job_id.",
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """In-memory job, falling back to the store for jobs from earlier runs (blocking read)."""
+        job = self.jobs.get(job_id)
+        if job or not self.store:
+            return job
+        record = self.store.load_job(job_id)
+        return Job.from_record(record) if record else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent jobs first."""
+        recent = list(self.jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(recent)]
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[Dict[str, Any]]], dedupe_key: Optional[str] = None) -> None:
+        job.state = RUNNING
+        job.updated_at = datetime.now()
+        self._persist(job)
+        try:
+            result = await run(job)
+            job.result = result
+            if result.get("success"):
+                job.state = COMPLETED
+            else:
+                job.state = FAILED
+                job.error = result.get("error")
+            logger.info(f"🏁 Job {job.job_id} finished: {job.state}")
+        except Exception as e:
+            logger.error(f"❌ Job {job.job_id} crashed: {e}")
+            job.state = FAILED
+            job.error = str(e)
+        finally:
+            job.updated_at = datetime.now()
+            job.task = None
+            if dedupe_key and self.inflight.get(dedupe_key) is job:
+                del self.inflight[dedupe_key]
+            self._persist(job)
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs once more than max_finished_jobs are kept."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
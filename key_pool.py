@@ -0,0 +1,186 @@
+"""
+Gemini API Key Pool
+Spreads generation requests over several API keys / projects, each with its own client and quota window
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+
+from google import genai
+
+logger = logging.getLogger(__name__)
+
+KEY_REQUESTS_PER_MINUTE = int(os.getenv("VEO_KEY_REQUESTS_PER_MINUTE", "10"))  # per-key quota, unless given as key:rpm
+QUOTA_COOLDOWN_SECONDS = float(os.getenv("VEO_KEY_QUOTA_COOLDOWN_SECONDS", "60"))
+AUTH_COOLDOWN_SECONDS = float(os.getenv("VEO_KEY_AUTH_COOLDOWN_SECONDS", "900"))
+
+QUOTA_ERROR = "quota"
+AUTH_ERROR = "auth"
+
+
+def classify_key_error(error: Exception) -> Optional[str]:
+    """Is this error the key's fault (quota exhausted / key rejected)? Returns QUOTA_ERROR, AUTH_ERROR or None."""
+    code = getattr(error, "code", None)
+    status = str(getattr(error, "status", "") or "")
+    message = str(error)
+    if code == 429 or status == "RESOURCE_EXHAUSTED" or "RESOURCE_EXHAUSTED" in message or "quota" in message.lower():
+        return QUOTA_ERROR
+    if code in (401, 403) or status in ("UNAUTHENTICATED", "PERMISSION_DENIED") or "API key not valid" in message:
+        return AUTH_ERROR
+    return None
+
+
+class ApiKey:
+    """One key, its client and usage counters"""
+
+    def __init__(self, api_key: str, requests_per_minute: int = KEY_REQUESTS_PER_MINUTE, client=None):
+        # Stable, non-secret identifier: recorded with operations so polling/downloading uses the same key
+        self.key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+        self.label = f"…{api_key[-4:]}"
+        self.client = client or genai.Client(api_key=api_key)
+        self.requests_per_minute = max(1, requests_per_minute)
+        self.cooldown_until = 0.0
+        self.cooldown_reason: Optional[str] = None
+        self._recent = deque()  # monotonic timestamps of submissions in the last minute
+
+        self.requests = 0
+        self.successes = 0
+        self.quota_errors = 0
+        self.auth_errors = 0
+        self.other_errors = 0
+
+    def remaining(self, now: float) -> int:
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        return self.requests_per_minute - len(self._recent)
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "key_id": self.key_id,
+            "label": self.label,
+            "requests_per_minute": self.requests_per_minute,
+            "remaining_this_minute": max(0, self.remaining(now)),
+            "cooling_down_seconds": round(max(0.0, self.cooldown_until - now), 1),
+            "cooldown_reason": self.cooldown_reason if not self.available(now) else None,
+            "requests": self.requests,
+            "successes": self.successes,
+            "quota_errors": self.quota_errors,
+            "auth_errors": self.auth_errors,
+            "other_errors": self.other_errors,
+        }
+
+
+class ApiKeyPool:
+    """
+    Picks the key with the most remaining quota for every new generation.
+
+    Each key counts its own submissions over a sliding one-minute window. Keys that return quota
+    errors are rested for `quota_cooldown` seconds, keys that are rejected (401/403) for
+    `auth_cooldown` seconds; if every key is resting, the one that recovers first is used. Thread safe.
+    """
+
+    def __init__(self, keys: List[ApiKey], quota_cooldown: float = QUOTA_COOLDOWN_SECONDS, auth_cooldown: float = AUTH_COOLDOWN_SECONDS):
+        if not keys:
+            raise ValueError("ApiKeyPool needs at least one API key")
+        self.keys = keys
+        self.quota_cooldown = quota_cooldown
+        self.auth_cooldown = auth_cooldown
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ApiKeyPool":
+        """
+        Keys from GEMINI_API_KEYS (comma separated, optionally `key:requests_per_minute`),
+        falling back to the single GEMINI_API_KEY.
+        """
+        entries = [entry.strip() for entry in os.getenv("GEMINI_API_KEYS", "").split(",") if entry.strip()]
+        if not entries and os.getenv("GEMINI_API_KEY"):
+            entries = [os.getenv("GEMINI_API_KEY")]
+        keys = []
+        for entry in entries:
+            api_key, _, rpm = entry.partition(":")
+            keys.append(ApiKey(api_key, int(rpm) if rpm else KEY_REQUESTS_PER_MINUTE))
+        logger.info(f"🔑 Gemini API key pool: {len(keys)} key(s)")
+        return cls(keys)
+
+    @property
+    def client(self):
+        """Client of the first key, for callers that don't go through the pool."""
+        return self.keys[0].client
+
+    def acquire(self, avoid: Optional[ApiKey] = None) -> ApiKey:
+        """Reserve one request on the best key right now (other than `avoid`, if another key is usable)."""
+        with self._lock:
+            now = time.monotonic()
+            available = [key for key in self.keys if key.available(now)]
+            if avoid is not None and any(key is not avoid for key in available):
+                available = [key for key in available if key is not avoid]
+            if available:
+                key = max(available, key=lambda k: k.remaining(now))
+            else:
+                key = min(self.keys, key=lambda k: k.cooldown_until)
+            key.remaining(now)
+            key._recent.append(now)
+            key.requests += 1
+            return key
+
+    def get(self, key_id: Optional[str]) -> ApiKey:
+        """The key an earlier operation was submitted with (falls back to the first key if it is gone)."""
+        for key in self.keys:
+            if key.key_id == key_id:
+                return key
+        return self.keys[0]
+
+    def report_success(self, key: ApiKey) -> None:
+        with self._lock:
+            key.successes += 1
+            if key.cooldown_reason and key.available(time.monotonic()):
+                key.cooldown_reason = None
+
+    def report_error(self, key: ApiKey, error: Exception) -> Optional[str]:
+        """Count a failed submission; quota/auth failures take the key out of rotation for a while."""
+        kind = classify_key_error(error)
+        with self._lock:
+            if kind == QUOTA_ERROR:
+                key.quota_errors += 1
+                cooldown = self.quota_cooldown
+            elif kind == AUTH_ERROR:
+                key.auth_errors += 1
+                cooldown = self.auth_cooldown
+            else:
+                key.other_errors += 1
+                return None
+            key.cooldown_until = time.monotonic() + cooldown
+            key.cooldown_reason = kind
+        logger.warning(f"🔑 API key {key.label} hit a {kind} error, resting it for {cooldown:.0f}s")
+        return kind
+
+    async def generate_videos(self, run_blocking: Callable[..., Awaitable[Any]], avoid: Optional[ApiKey] = None, **request) -> Tuple[Any, ApiKey]:
+        """
+        Submit `client.models.generate_videos(**request)` on the best key through `run_blocking`
+        (the generator's executor). On a quota/auth error the key is rested and the next one tried.
+        Returns the operation and the key it belongs to (poll and download with that key's client).
+        """
+        for attempt in range(len(self.keys)):
+            key = self.acquire(avoid if attempt == 0 else None)
+            try:
+                operation = await run_blocking(key.client.models.generate_videos, **request)
+            except Exception as e:
+                if self.report_error(key, e) is None or attempt == len(self.keys) - 1:
+                    raise
+                continue
+            self.report_success(key)
+            return operation, key
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [key.stats(now) for key in self.keys]
@@ -0,0 +1,397 @@
+"""
+Media Serving
+Range/206, ETag and Cache-Control aware serving of generated MP4s: an ASGI app for /videos and an optional
+dedicated sendfile server that keeps video traffic off the tool-handling event loop
+"""
+
+import asyncio
+import logging
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+VIDEO_DIR = "generated_videos"
+# Videos are never rewritten under the same name, so clients and CDNs may cache them for a long time
+CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+# Port of the dedicated sendfile server (0 = disabled; /videos on the main server is always available)
+MEDIA_SERVER_PORT = int(os.getenv("MEDIA_SERVER_PORT", "0"))
+CHUNK_SIZE = 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+KEEPALIVE_TIMEOUT = 15.0
+LOOKUP_CACHE_SIZE = 4096
+
+
+@dataclass
+class MediaFile:
+    path: Path
+    size: int
+    mtime_ns: int
+    etag: str
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.mtime_ns / 1e9, usegmt=True)
+
+
+@dataclass
+class MediaResponse:
+    status: int
+    headers: Dict[str, str]
+    offset: int = 0
+    length: int = 0  # body bytes to send from `offset` (0 for HEAD / 304 / errors)
+
+
+def parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    A single `bytes=` range -> (start, end inclusive). None for ranges we don't serve (multiple ranges,
+    other units, malformed), in which case the whole file is sent. ValueError if it is unsatisfiable.
+    """
+    unit, _, spec = value.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or "," in spec or not dash or not (first or last):
+        return None
+    if not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class MediaFiles:
+    """
+    Resolves /videos/<video ID> (or /previews/<filename>) requests to files and plans their HTTP responses.
+    With a catalog, IDs resolve to wherever the catalog says the bytes are (the sharded video store);
+    otherwise to a file of that name in `video_dir`.
+
+    Strong ETags are the sha256 recorded by the video catalog when the download completed, so they are
+    never recomputed; files the catalog has no hash for get a weak size/mtime validator. Lookups are
+    cached (validated against a fresh stat) so the catalog is only consulted once per file. Serve times
+    are kept in memory for the retention manager (`drain_accessed`), never written on the request path.
+    With remote `storage` (S3), videos published there are answered with a redirect to their storage
+    URL, so the bytes are served by the object store / CDN instead of this server.
+    """
+
+    def __init__(self, video_dir: str = VIDEO_DIR, catalog=None, max_age: int = CACHE_MAX_AGE, storage=None):
+        self.video_dir = Path(video_dir)
+        self.catalog = catalog
+        self.storage = storage
+        # Only consulted per request when there is somewhere else to send clients
+        self.redirecting = catalog is not None and storage is not None and storage.remote
+        self.cache_control = f"public, max-age={max_age}, immutable"
+        self._files: "OrderedDict[str, MediaFile]" = OrderedDict()
+        self._accessed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.partial_responses = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.redirects = 0
+
+    def lookup(self, filename: str) -> Optional[MediaFile]:
+        """The file for a request path segment (a video ID), or None (blocking: stat + catalog on first use)."""
+        filename = unquote(filename)
+        if not filename or "/" in filename or "\\" in filename or filename.startswith("."):
+            return None
+        with self._lock:
+            cached = self._files.get(filename)
+        if cached:
+            try:
+                stat = cached.path.stat()
+                if cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+                    with self._lock:
+                        self._files.move_to_end(filename)
+                        self._accessed[filename] = time.time()
+                    return cached
+            except OSError:
+                pass  # moved (e.g. into the sharded store) or deleted: resolve it again
+
+        # IDs map to content-addressed paths through the catalog; without an entry, a file of that name
+        entry = self.catalog.get(filename) if self.catalog is not None else None
+        path = Path(entry["local_path"]) if entry else self.video_dir / filename
+        try:
+            stat = path.stat()
+        except OSError:
+            self.forget(filename)
+            return None
+        if entry and entry.get("sha256") and entry.get("size_bytes") == stat.st_size:
+            etag = f'"{entry["sha256"]}"'
+        else:
+            etag = f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        media = MediaFile(path, stat.st_size, stat.st_mtime_ns, etag)
+        with self._lock:
+            self._files[filename] = media
+            self._accessed[filename] = time.time()
+            if len(self._files) > LOOKUP_CACHE_SIZE:
+                self._files.popitem(last=False)
+        return media
+
+    def remote_url(self, filename: str) -> Optional[str]:
+        """The storage URL to redirect a request for this video ID to, or None to serve it from disk (blocking)."""
+        if not self.redirecting:
+            return None
+        entry = self.catalog.get(unquote(filename))
+        if not entry or not entry.get("storage_key"):
+            return None
+        with self._lock:
+            self._accessed[entry["filename"]] = time.time()
+        return self.storage.url(entry["filename"], entry["storage_key"])
+
+    def drain_accessed(self) -> Dict[str, float]:
+        """{filename: last serve time} since the previous call."""
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+        return accessed
+
+    def forget(self, filename: str) -> None:
+        """Drop a cached lookup (the file was deleted or replaced)."""
+        with self._lock:
+            self._files.pop(filename, None)
+            self._accessed.pop(filename, None)
+
+    def _not_modified(self, media: MediaFile, headers: Dict[str, str]) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison, as RFC 9110 requires for If-None-Match
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or media.etag.removeprefix("W/") in tags
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return media.mtime_ns // 10 ** 9 <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _range_applies(self, media: MediaFile, headers: Dict[str, str]) -> bool:
+        if_range = headers.get("if-range")
+        if if_range is None:
+            return True
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            # Strong comparison: a weak validator never matches
+            return not media.etag.startswith("W/") and if_range == media.etag
+        return if_range == media.last_modified
+
+    def respond(self, media: Optional[MediaFile], method: str, headers: Dict[str, str], location: Optional[str] = None) -> MediaResponse:
+        """Status, headers and byte span to send for a GET/HEAD request (`headers` keys lower-case)."""
+        self.requests += 1
+        if method not in ("GET", "HEAD"):
+            return MediaResponse(405, {"allow": "GET, HEAD", "content-length": "0"})
+        if location:
+            self.redirects += 1
+            # Presigned URLs expire, so the redirect itself must not be cached
+            return MediaResponse(307, {"location": location, "cache-control": "no-store", "content-length": "0"})
+        if media is None:
+            return MediaResponse(404, {"content-type": "text/plain", "content-length": "0"})
+
+        common = {
+            "content-type": mimetypes.guess_type(media.path.name)[0] or "application/octet-stream",
+            "accept-ranges": "bytes",
+            "etag": media.etag,
+            "last-modified": media.last_modified,
+            "cache-control": self.cache_control,
+        }
+        if self._not_modified(media, headers):
+            self.not_modified += 1
+            return MediaResponse(304, common)
+
+        status, start, end = 200, 0, media.size - 1
+        if "range" in headers and self._range_applies(media, headers):
+            try:
+                span = parse_range(headers["range"], media.size)
+            except ValueError:
+                return MediaResponse(416, {**common, "content-range": f"bytes */{media.size}", "content-length": "0"})
+            if span:
+                status, (start, end) = 206, span
+                common["content-range"] = f"bytes {start}-{end}/{media.size}"
+                self.partial_responses += 1
+
+        length = max(0, end - start + 1)
+        common["content-length"] = str(length)
+        if method == "GET":
+            self.bytes_sent += length
+            return MediaResponse(status, common, start, length)
+        return MediaResponse(status, common)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "partial_responses": self.partial_responses,
+            "not_modified": self.not_modified,
+            "bytes_sent": self.bytes_sent,
+            "redirects": self.redirects,
+            "cached_lookups": len(self._files),
+        }
+
+
+class MediaApp:
+    """
+    ASGI app for the /videos mount (replaces StaticFiles).
+
+    Uses the `http.response.zerocopysend` extension when the ASGI server offers it; otherwise the
+    requested span is read with os.pread in 1 MiB chunks off the event loop.
+    """
+
+    def __init__(self, files: MediaFiles):
+        self.files = files
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        filename = scope["path"].rsplit("/", 1)[-1]
+        location = await asyncio.to_thread(self.files.remote_url, filename) if self.files.redirecting else None
+        media = None if location else await asyncio.to_thread(self.files.lookup, filename)
+        response = self.files.respond(media, scope["method"], headers, location)
+        await send({
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()],
+        })
+        if not response.length:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        fd = await asyncio.to_thread(os.open, media.path, os.O_RDONLY)
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": fd, "offset": response.offset, "count": response.length})
+                return
+            offset, remaining = response.offset, response.length
+            while remaining:
+                chunk = await asyncio.to_thread(os.pread, fd, min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                # File shrank underneath us: end the body; the client sees a short read
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+
+REASONS = {200: "OK", 206: "Partial Content", 304: "Not Modified", 307: "Temporary Redirect", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 416: "Range Not Satisfiable"}
+
+
+class MediaServer:
+    """
+    Dedicated HTTP/1.1 server for /videos/<filename> on its own thread and event loop.
+
+    Bodies go out with loop.sendfile (os.sendfile: zero-copy from the page cache to the socket), and
+    connections are kept alive for scrubbing clients. Only GET/HEAD of videos is handled, so video
+    traffic never competes with tool calls on the main server's event loop.
+    """
+
+    def __init__(self, files: MediaFiles, host: str = "0.0.0.0", port: int = MEDIA_SERVER_PORT):
+        self.files = files
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="media-server", daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        logger.info(f"🎞️ Media server (sendfile) on http://{self.host}:{self.port}/videos/")
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Let open connections (idle keep-alives) close their sockets before the loop goes away
+            connections = asyncio.all_tasks(self._loop)
+            for connection in connections:
+                connection.cancel()
+            self._loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+            self._loop.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str]]]:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3:
+            return None
+        method, target, version = parts
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return method, target.split("?", 1)[0], version, headers
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    return
+                method, path, version, headers = request
+                media, location = None, None
+                if path.startswith("/videos/"):
+                    # Catalog / filesystem lookups block: keep them off this loop, which serves every connection
+                    filename = path[len("/videos/"):]
+                    location = await asyncio.to_thread(self.files.remote_url, filename) if self.files.redirecting else None
+                    media = None if location else await asyncio.to_thread(self.files.lookup, filename)
+                response = self.files.respond(media, method, headers, location)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                lines = [f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}"]
+                lines += [f"{name}: {value}" for name, value in response.headers.items()]
+                lines.append(f"date: {formatdate(usegmt=True)}")
+                lines.append("connection: keep-alive" if keep_alive else "connection: close")
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                if response.length:
+                    video = await asyncio.to_thread(open, media.path, "rb")
+                    with video:
+                        await loop.sendfile(writer.transport, video, response.offset, response.length)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, OSError) as e:
+            logger.debug(f"Media connection closed: {e}")
+        finally:
+            writer.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"port": self.port, "connections": self.connections, **self.files.stats()}
@@ -0,0 +1,324 @@
+"""
+Central Veo Operation Poller
+One background loop owns every in-flight generation operation and polls it on an adaptive schedule
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from concurrent.futures import Executor
+from typing import Dict, Any, Callable, List, Optional
+
+from resilience import HALF_OPEN, TRANSIENT, Resilience, backoff_delay, classify_error
+
+logger = logging.getLogger(__name__)
+
+# Poll schedule configuration
+POLL_MIN_INTERVAL = float(os.getenv("VEO_POLL_MIN_INTERVAL", "5"))  # seconds, used near the expected completion time
+POLL_MAX_INTERVAL = float(os.getenv("VEO_POLL_MAX_INTERVAL", "30"))  # seconds, used early on and for stragglers
+POLL_JITTER = float(os.getenv("VEO_POLL_JITTER", "0.2"))  # +/- fraction applied to every interval
+EXPECTED_GENERATION_SECONDS = float(os.getenv("VEO_EXPECTED_GENERATION_SECONDS", "120"))
+OPERATION_TIMEOUT_SECONDS = float(os.getenv("VEO_OPERATION_TIMEOUT_SECONDS", "1200"))  # 20 minutes
+MAX_CONCURRENT_POLLS = int(os.getenv("VEO_MAX_CONCURRENT_POLLS", "16"))
+MAX_POLL_ERRORS = 8  # consecutive transient poll failures before an operation is given up
+
+
+class _Waiter:
+    """One `track` caller: its own future, deadline and poll callback"""
+
+    __slots__ = ("future", "deadline", "on_poll")
+
+    def __init__(self, future: asyncio.Future, deadline: float, on_poll: Optional[Callable[..., None]]):
+        self.future = future
+        self.deadline = deadline
+        self.on_poll = on_poll
+
+
+class _TrackedOperation:
+    """Bookkeeping for one in-flight operation, polled once however many callers wait for it"""
+
+    __slots__ = ("name", "operation", "client", "waiters", "started_at", "polls", "errors", "scheduled")
+
+    def __init__(self, operation, client):
+        self.name = operation.name
+        self.operation = operation
+        self.client = client
+        self.waiters: List[_Waiter] = []
+        self.started_at = time.monotonic()
+        self.polls = 0
+        self.errors = 0
+        self.scheduled = None  # sequence number of the schedule entry that counts; older ones are stale
+
+    def live(self) -> List[_Waiter]:
+        """Callers still waiting (drops the ones that were cancelled or got their result)."""
+        self.waiters = [waiter for waiter in self.waiters if not waiter.future.done()]
+        return self.waiters
+
+    @property
+    def deadline(self) -> float:
+        return min((waiter.deadline for waiter in self.live()), default=time.monotonic())
+
+
+class OperationPoller:
+    """
+    Polls all in-flight operations from a single loop.
+
+    Due operations are kept in a heap ordered by their next poll time, so each tick only touches the
+    operations that are due. Blocking `client.operations.get` calls run in the given executor, at most
+    `max_concurrent_polls` at a time. Completed (or timed out) operations are handed back through the
+    future returned by `track`, which is what the download stage awaits. Tracking an operation that is
+    already tracked adds a caller with its own future, timeout and `on_poll` to the same poll schedule;
+    polling stops once every caller has its result or went away.
+
+    The schedule starts slow, tightens to `min_interval` around the expected completion time (a moving
+    average of observed generation times) and backs off again for stragglers; every interval is jittered
+    so operations submitted together don't poll in lockstep.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        min_interval: float = POLL_MIN_INTERVAL,
+        max_interval: float = POLL_MAX_INTERVAL,
+        jitter: float = POLL_JITTER,
+        expected_seconds: float = EXPECTED_GENERATION_SECONDS,
+        timeout_seconds: float = OPERATION_TIMEOUT_SECONDS,
+        max_concurrent_polls: int = MAX_CONCURRENT_POLLS,
+        resilience: Optional[Resilience] = None,
+    ):
+        self.executor = executor
+        # Shared with the generator: poll failures feed the backend's circuit breaker and metrics
+        self.resilience = resilience
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.jitter = jitter
+        self.expected_seconds = expected_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrent_polls = max(1, max_concurrent_polls)
+
+        self._tracked: Dict[str, _TrackedOperation] = {}
+        self._schedule: List = []  # heap of (due_time, seq, name)
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._polls_in_flight = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.total_polls = 0
+        self.completed = 0
+        self.timed_out = 0
+
+    # Public API
+
+    def track(self, operation, client, timeout: Optional[float] = None, on_poll: Optional[Callable[..., None]] = None) -> asyncio.Future:
+        """
+        Start tracking an operation. Returns a future resolved with the final operation object:
+        done (check `.error` / `.response`) or, after the timeout, the last not-done snapshot.
+        `on_poll(operation, polls)` is called after every poll. Cancelling the future only drops this caller.
+        """
+        self._ensure_running()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if operation.done:
+            future.set_result(operation)
+            return future
+
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout_seconds)
+        tracked = self._tracked.get(operation.name)
+        if tracked and tracked.live():
+            earlier = deadline < tracked.deadline
+            tracked.waiters.append(_Waiter(future, deadline, on_poll))
+            if earlier:
+                # The schedule is capped at the earliest deadline: move the next poll up to this one
+                self._schedule_poll(tracked)
+            return future
+
+        tracked = _TrackedOperation(operation, client)
+        tracked.waiters.append(_Waiter(future, deadline, on_poll))
+        self._tracked[tracked.name] = tracked
+        self._schedule_poll(tracked)
+        return future
+
+    async def wait(self, operation, client, timeout: Optional[float] = None, on_poll: Optional[Callable[..., None]] = None):
+        """Track an operation and wait until it is finished (or timed out). Polling stops once no caller waits."""
+        return await self.track(operation, client, timeout, on_poll)
+
+    def abandon(self, name: str) -> None:
+        """Stop polling an operation; the futures of all its callers are cancelled."""
+        tracked = self._tracked.pop(name, None)
+        if tracked:
+            for waiter in tracked.live():
+                waiter.future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._tracked),
+            "total_polls": self.total_polls,
+            "completed": self.completed,
+            "timed_out": self.timed_out,
+            "expected_generation_seconds": round(self.expected_seconds, 1),
+        }
+
+    def next_interval(self, elapsed: float) -> float:
+        """Seconds until the next poll of an operation that has been running for `elapsed` seconds."""
+        expected = self.expected_seconds
+        if elapsed < 0.5 * expected:
+            # Early: poll slowly, but don't sleep past the start of the "likely done" window
+            interval = min(self.max_interval, 0.5 * expected - elapsed)
+        elif elapsed < 1.5 * expected:
+            # Around the expected completion time: poll fast
+            interval = self.min_interval
+        else:
+            # Stragglers: back off exponentially towards the slow interval
+            overrun = (elapsed - 1.5 * expected) / expected
+            interval = self.min_interval * (2 ** overrun)
+        interval = max(self.min_interval, min(self.max_interval, interval))
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    # Internals
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task and not self._task.done() and self._loop is loop:
+            return
+        if self._loop is not None and self._loop is not loop:
+            # Called from a new event loop (e.g. a sync wrapper's asyncio.run): old futures are unusable
+            self._tracked.clear()
+            self._schedule.clear()
+            self._polls_in_flight.clear()
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def _schedule_poll(self, tracked: _TrackedOperation, delay: Optional[float] = None) -> None:
+        elapsed = time.monotonic() - tracked.started_at
+        if delay is None:
+            delay = self.next_interval(elapsed)
+        due = min(time.monotonic() + delay, tracked.deadline)
+        tracked.scheduled = next(self._seq)
+        heapq.heappush(self._schedule, (due, tracked.scheduled, tracked.name))
+        if self._schedule[0][2] == tracked.name:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        semaphore = asyncio.Semaphore(self.max_concurrent_polls)
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._schedule and self._schedule[0][0] <= now:
+                _, seq, name = heapq.heappop(self._schedule)
+                tracked = self._tracked.get(name)
+                if not tracked or seq != tracked.scheduled:
+                    continue
+                if not tracked.live():
+                    # Every caller went away (cancelled); stop polling
+                    self._tracked.pop(name, None)
+                    continue
+                # Polls run as short-lived tasks bounded by the semaphore, so one slow
+                # request never delays the rest of the schedule
+                task = asyncio.create_task(self._poll(tracked, semaphore))
+                self._polls_in_flight.add(task)
+                task.add_done_callback(self._polls_in_flight.discard)
+
+            timeout = self._schedule[0][0] - now if self._schedule else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, tracked: _TrackedOperation, semaphore: asyncio.Semaphore) -> None:
+        now = time.monotonic()
+        expired = [waiter for waiter in tracked.live() if now >= waiter.deadline]
+        if expired:
+            logger.error(f"❌ Operation {tracked.name} timed out after {tracked.polls} polls")
+            self.timed_out += len(expired)
+            for waiter in expired:
+                waiter.future.set_result(tracked.operation)
+            if tracked.live():
+                # Callers with a later deadline keep waiting
+                self._schedule_poll(tracked)
+            else:
+                self._untrack(tracked)
+            return
+
+        breaker = self.resilience.breaker if self.resilience else None
+        if breaker and not breaker.allow():
+            # Provider is down: the operation keeps running remotely, check back once the breaker may close
+            self.resilience.count("operations.get", "short_circuited")
+            self._schedule_poll(tracked, delay=max(breaker.retry_in(), self.min_interval))
+            return
+        # This poll is the half-open breaker's probe: it has to settle the breaker one way or the other
+        probing = breaker is not None and breaker.state == HALF_OPEN
+
+        try:
+            async with semaphore:
+                loop = asyncio.get_running_loop()
+                if self.resilience:
+                    self.resilience.count("operations.get", "attempts")
+                operation = await loop.run_in_executor(self.executor, tracked.client.operations.get, tracked.operation)
+            tracked.operation = operation
+            tracked.errors = 0
+            if breaker:
+                breaker.record_success()
+        except Exception as e:
+            kind = classify_error(e)
+            tracked.errors += 1
+            if self.resilience:
+                self.resilience.count("operations.get", f"{kind}_errors")
+            if kind == TRANSIENT and breaker:
+                breaker.record_failure()
+            elif probing:
+                # Quota / auth / permanent errors are answers: the provider is up again
+                breaker.record_success()
+            logger.warning(f"⚠️ Polling {tracked.name} failed ({kind}, {tracked.errors}/{MAX_POLL_ERRORS}): {e}")
+            if kind != TRANSIENT or tracked.errors >= MAX_POLL_ERRORS:
+                if self.resilience:
+                    self.resilience.count("operations.get", "gave_up")
+                self._untrack(tracked)
+                for waiter in tracked.live():
+                    waiter.future.set_exception(e)
+                return
+            # Transient: retry with jittered exponential backoff instead of the normal schedule
+            if self.resilience:
+                self.resilience.count("operations.get", "retries")
+            self._schedule_poll(tracked, delay=max(self.min_interval, backoff_delay(tracked.errors, self.min_interval, self.max_interval)))
+            return
+        finally:
+            if probing:
+                # Cancelled mid-probe: let the next poll probe instead of leaving the breaker stuck half-open
+                breaker.release_probe()
+
+        tracked.polls += 1
+        self.total_polls += 1
+        for waiter in tracked.live():
+            if not waiter.on_poll:
+                continue
+            try:
+                waiter.on_poll(operation, tracked.polls)
+            except Exception as e:
+                logger.warning(f"⚠️ on_poll callback for {tracked.name} failed: {e}")
+
+        if operation.done:
+            duration = time.monotonic() - tracked.started_at
+            # Moving average of generation time drives the "fast polling" window
+            self.expected_seconds = 0.8 * self.expected_seconds + 0.2 * duration
+            self.completed += 1
+            logger.info(f"✅ Operation {tracked.name} finished after {tracked.polls} polls ({duration:.0f}s)")
+            self._finish(tracked)
+        elif self._tracked.get(tracked.name) is tracked:
+            self._schedule_poll(tracked)
+
+    def _untrack(self, tracked: _TrackedOperation) -> None:
+        # A poll can outlive its entry: all callers left and the operation was tracked anew meanwhile
+        if self._tracked.get(tracked.name) is tracked:
+            del self._tracked[tracked.name]
+
+    def _finish(self, tracked: _TrackedOperation) -> None:
+        self._untrack(tracked)
+        for waiter in tracked.live():
+            waiter.future.set_result(tracked.operation)
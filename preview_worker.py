@@ -0,0 +1,144 @@
+"""
+Preview Worker
+What the preview worker processes run: MP4 probing and ffmpeg poster / preview encoding. Each worker is
+`python preview_worker.py`, reading `build_previews` arguments as JSON on stdin and writing the result as
+JSON to stdout, so this module must stay free of import-time side effects
+"""
+
+import json
+import os
+import struct
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union
+
+from faststart import Box, FaststartError, parse_boxes, top_level_boxes
+
+FFMPEG_TIMEOUT_SECONDS = 120
+POSTER_WIDTH = 640
+PREVIEW_WIDTH = 320
+PREVIEW_FPS = 12
+PREVIEW_SECONDS = 3
+
+
+def _child(box: Optional[Box], kind: bytes) -> Optional[Box]:
+    if box is None or box.children is None:
+        return None
+    return next((child for child in box.children if child.kind == kind), None)
+
+
+def _duration(payload: bytes) -> Optional[float]:
+    """Seconds from an mvhd/mdhd payload (version 0: 32-bit times, version 1: 64-bit)."""
+    if payload[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", payload, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", payload, 12)
+    return duration / timescale if timescale else None
+
+
+def probe(path: Union[str, Path]) -> Dict[str, Any]:
+    """Duration, dimensions, codec, frame rate and audio presence read from the MP4 boxes (no decoding)."""
+    with open(path, "rb") as f:
+        boxes = top_level_boxes(f)
+        moov_box = next((box for box in boxes if box.kind == b"moov"), None)
+        if moov_box is None:
+            raise FaststartError("no moov box")
+        f.seek(moov_box.offset)
+        raw = f.read(moov_box.size)
+    header = 16 if struct.unpack_from(">I", raw)[0] == 1 else 8
+    moov = Box(b"moov", children=parse_boxes(raw[header:]))
+
+    mvhd = _child(moov, b"mvhd")
+    info: Dict[str, Any] = {
+        "duration_seconds": round(_duration(mvhd.payload), 3) if mvhd else None,
+        "width": None, "height": None, "codec": None, "fps": None, "has_audio": False,
+    }
+    for trak in (box for box in moov.children if box.kind == b"trak"):
+        mdia = _child(trak, b"mdia")
+        hdlr = _child(mdia, b"hdlr")
+        handler = hdlr.payload[8:12] if hdlr else None
+        if handler == b"soun":
+            info["has_audio"] = True
+        if handler != b"vide" or info["codec"]:
+            continue
+        stbl = _child(_child(mdia, b"minf"), b"stbl")
+        tkhd = _child(trak, b"tkhd")
+        if tkhd:
+            # Last two fields of tkhd: width and height as 16.16 fixed point
+            width, height = struct.unpack_from(">II", tkhd.payload, len(tkhd.payload) - 8)
+            info["width"], info["height"] = width >> 16, height >> 16
+        stsd = _child(stbl, b"stsd")
+        if stsd and len(stsd.payload) >= 16:
+            # version/flags, entry count, then the first sample entry's size and type (avc1, hvc1, ...)
+            info["codec"] = stsd.payload[12:16].decode("latin-1")
+        stsz = _child(stbl, b"stsz")
+        mdhd = _child(mdia, b"mdhd")
+        if stsz and mdhd:
+            frames = struct.unpack_from(">I", stsz.payload, 8)[0]
+            seconds = _duration(mdhd.payload)
+            if frames and seconds:
+                info["fps"] = round(frames / seconds, 3)
+    return info
+
+
+def _ffmpeg(ffmpeg: str, source: str, target: Path, input_args: List[str], output_args: List[str]) -> None:
+    """Run ffmpeg into a temp file and rename it into place (no half-written previews are ever served)."""
+    temp = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        subprocess.run(
+            [ffmpeg, "-nostdin", "-v", "error", "-y", *input_args, "-i", source, *output_args, str(temp)],
+            check=True, capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS
+        )
+        os.replace(temp, target)
+    except subprocess.CalledProcessError as e:
+        temp.unlink(missing_ok=True)
+        raise RuntimeError(e.stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited with {e.returncode}")
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+
+def build_previews(video_path: str, preview_dir: str, ffmpeg: Optional[str], video_id: str) -> Dict[str, Any]:
+    """
+    What a worker process runs: probe `video_path` and, with ffmpeg, write `<id stem>_poster.jpg` and a
+    muted `<id stem>_preview.mp4` (first seconds, small and low frame rate) to `preview_dir`. Existing
+    outputs are kept, so re-running for a video is cheap.
+    """
+    info = probe(video_path)
+    result: Dict[str, Any] = {**info, "poster": None, "preview": None, "errors": []}
+    if not ffmpeg:
+        return result
+    out_dir = Path(preview_dir)
+    stem = Path(video_id).stem
+    duration = info["duration_seconds"] or 0
+
+    poster = out_dir / f"{stem}_poster.jpg"
+    try:
+        if not poster.exists():
+            # A frame from a second in (first frames are often black or mid-transition)
+            seek = f"{min(1.0, duration / 2):.3f}"
+            _ffmpeg(ffmpeg, video_path, poster, ["-ss", seek], [
+                "-frames:v", "1", "-vf", f"scale='min({POSTER_WIDTH},iw)':-2", "-q:v", "3", "-f", "image2"
+            ])
+        result["poster"] = poster.name
+    except Exception as e:
+        result["errors"].append(f"poster: {e}")
+
+    preview = out_dir / f"{stem}_preview.mp4"
+    try:
+        if not preview.exists():
+            _ffmpeg(ffmpeg, video_path, preview, ["-t", str(PREVIEW_SECONDS)], [
+                "-an", "-vf", f"fps={PREVIEW_FPS},scale={PREVIEW_WIDTH}:-2",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "32", "-pix_fmt", "yuv420p",
+                "-movflags", "+faststart", "-f", "mp4"
+            ])
+        result["preview"] = preview.name
+    except Exception as e:
+        result["errors"].append(f"preview: {e}")
+    return result
+
+
+if __name__ == "__main__":
+    json.dump(build_previews(**json.load(sys.stdin)), sys.stdout)
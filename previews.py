@@ -0,0 +1,148 @@
+"""
+Video Previews
+Poster frames, short low-res previews and probe data (duration, size, codec) for generated videos, built in
+bounded worker processes
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+
+import preview_worker
+from storage import PUBLIC_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = os.getenv("PREVIEW_DIR", "previews")
+PREVIEW_BASE_URL = f"{PUBLIC_BASE_URL}/previews"
+# Worker processes shared by every generator in the server (poster/preview encoding is CPU-bound)
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", str(min(2, os.cpu_count() or 1))))
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+BACKFILL_BATCH = 50
+
+
+def preview_fields(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Poster/preview URLs and probe data of a catalog row (or `PreviewGenerator.process` result) for API results."""
+    return {
+        "poster_url": f"{PREVIEW_BASE_URL}/{entry['poster']}" if entry.get("poster") else None,
+        "preview_url": f"{PREVIEW_BASE_URL}/{entry['preview']}" if entry.get("preview") else None,
+        "duration_seconds": entry.get("duration_seconds"),
+        "width": entry.get("width"),
+        "height": entry.get("height"),
+        "codec": entry.get("codec"),
+    }
+
+
+_slots: Optional[asyncio.Semaphore] = None
+_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _worker_slots() -> asyncio.Semaphore:
+    """The PREVIEW_WORKERS slots shared by every PreviewGenerator on the running loop."""
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots_loop is not loop:
+        _slots, _slots_loop = asyncio.Semaphore(PREVIEW_WORKERS), loop
+    return _slots
+
+
+async def _run_worker(**job: Any) -> Dict[str, Any]:
+    """
+    Run `build_previews(**job)` in a fresh `python preview_worker.py` process. A multiprocessing pool would
+    re-run the server's __main__ (its generators, job store and catalog) in every worker; the worker script
+    imports nothing but the probing and encoding code.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, preview_worker.__file__,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate(json.dumps(job).encode())
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        raise
+    if process.returncode:
+        message = stderr.decode("utf-8", "replace").strip().splitlines()
+        raise RuntimeError(message[-1] if message else f"preview worker exited with {process.returncode}")
+    return json.loads(stdout)
+
+
+class PreviewGenerator:
+    """
+    Post-download stage that gives each video a poster JPEG, a small animated preview and probe data.
+
+    `process(path)` runs `build_previews` in a worker process (at most PREVIEW_WORKERS at a time, shared by
+    all generators), so decoding and encoding never run on the event loop or hold the GIL of the server.
+    The results go into the video catalog (listings return them from there) and back to the caller
+    for the tool result. Posters and previews need ffmpeg; without it only probe data is produced.
+    `backfill` does the same for catalogued videos that predate this stage.
+    """
+
+    def __init__(self, catalog=None, preview_dir: str = PREVIEW_DIR):
+        self.catalog = catalog
+        self.preview_dir = Path(preview_dir)
+        self.preview_dir.mkdir(exist_ok=True)
+        self.ffmpeg = shutil.which(FFMPEG_BINARY)
+        self.processed = 0
+        self.failed = 0
+        self.seconds = 0.0
+        if not self.ffmpeg:
+            logger.warning("⚠️ ffmpeg not found: videos get probe data but no poster or preview")
+
+    async def process(self, video_path: Union[str, Path], video_id: Optional[str] = None) -> Dict[str, Any]:
+        """Build and catalog the previews of a video (ID defaults to the file name); returns `preview_fields` ({} if probing failed)."""
+        video_id = video_id or Path(video_path).name
+        started = time.perf_counter()
+        try:
+            async with _worker_slots():
+                result = await _run_worker(
+                    video_path=str(video_path), preview_dir=str(self.preview_dir), ffmpeg=self.ffmpeg, video_id=video_id
+                )
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"⚠️ Could not build previews for {video_id}: {e}")
+            return {}
+        self.processed += 1
+        self.seconds += time.perf_counter() - started
+        for error in result.pop("errors"):
+            logger.warning(f"⚠️ {video_id} {error}")
+        if self.catalog is not None:
+            await asyncio.to_thread(self.catalog.annotate, [video_id], **result)
+        logger.info(f"🖼️ Previews ready for {video_id} ({time.perf_counter() - started:.2f}s)")
+        return preview_fields(result)
+
+    async def backfill(self) -> int:
+        """Build previews for catalogued videos that have none yet, a batch at a time. Returns how many were processed."""
+        if self.catalog is None:
+            return 0
+        # Let the startup reconciliation index files already on disk first
+        await asyncio.to_thread(self.catalog.reconciled.wait, 60)
+        done, seen = 0, set()
+        while True:
+            entries = await asyncio.to_thread(self.catalog.missing_previews, BACKFILL_BATCH, self.ffmpeg is not None)
+            entries = [entry for entry in entries if entry["filename"] not in seen]
+            if not entries:
+                break
+            for entry in entries:
+                seen.add(entry["filename"])
+                if await self.process(entry["local_path"], entry["filename"]):
+                    done += 1
+        if done:
+            logger.info(f"🖼️ Backfilled previews for {done} video(s)")
+        return done
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ffmpeg": self.ffmpeg is not None,
+            "workers": PREVIEW_WORKERS,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_seconds": round(self.seconds / self.processed, 3) if self.processed else None,
+        }
@@ -0,0 +1,139 @@
+"""Video generation shared functionality.
+
+A single poller owns every in-flight Veo operation started by the tools in
+this directory, instead of each background task running its own poll loop.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+
+from google import genai
+
+# Read configuration from environment variables
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+POLL_MIN_INTERVAL = float(os.environ.get("VEO_POLL_MIN_INTERVAL", "5"))
+POLL_MAX_INTERVAL = float(os.environ.get("VEO_POLL_MAX_INTERVAL", "30"))
+EXPECTED_GENERATION_SECONDS = float(os.environ.get("VEO_EXPECTED_GENERATION_SECONDS", "120"))
+MAX_CONCURRENT_POLLS = int(os.environ.get("VEO_MAX_CONCURRENT_POLLS", "16"))
+OPERATION_TIMEOUT_SECONDS = float(os.environ.get("VEO_OPERATION_TIMEOUT_SECONDS", "1200"))
+MAX_POLL_ERRORS = 8  # consecutive transient poll failures before an operation is given up
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient(error: Exception) -> bool:
+    """Worth polling again: 5xx / 429 / timeouts from the API, dropped connections."""
+    code = getattr(error, "code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return code in TRANSIENT_STATUS_CODES or isinstance(error, (ConnectionError, TimeoutError))
+
+
+def backoff_delay(errors: int) -> float:
+    """Full-jitter exponential backoff between POLL_MIN_INTERVAL and POLL_MAX_INTERVAL."""
+    return max(POLL_MIN_INTERVAL, random.uniform(0, min(POLL_MAX_INTERVAL, POLL_MIN_INTERVAL * 2 ** errors)))
+
+
+class OperationPoller:
+    """
+    Polls all in-flight operations from one loop on an adaptive, jittered schedule.
+
+    Transient poll errors are retried with backoff (up to MAX_POLL_ERRORS in a row); other errors
+    fail the wait. An operation still running after `timeout` seconds fails with TimeoutError.
+    """
+
+    def __init__(self, timeout: float = OPERATION_TIMEOUT_SECONDS) -> None:
+        self.expected_seconds = EXPECTED_GENERATION_SECONDS
+        self.timeout = timeout
+        self._schedule = []  # heap of (due_time, seq, operation, client, started_at, errors, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._polls = set()
+
+    def next_interval(self, elapsed: float) -> float:
+        """Slow at first, fast around the expected completion time, backing off for stragglers."""
+        expected = self.expected_seconds
+        if elapsed < 0.5 * expected:
+            interval = min(POLL_MAX_INTERVAL, 0.5 * expected - elapsed)
+        elif elapsed < 1.5 * expected:
+            interval = POLL_MIN_INTERVAL
+        else:
+            interval = POLL_MIN_INTERVAL * 2 ** ((elapsed - 1.5 * expected) / expected)
+        interval = max(POLL_MIN_INTERVAL, min(POLL_MAX_INTERVAL, interval))
+        return interval * random.uniform(0.8, 1.2)
+
+    async def wait(self, operation, client: genai.Client):
+        """Wait until the operation is done and return the final operation object."""
+        if operation.done:
+            return operation
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._push(operation, client, time.monotonic(), 0, future)
+        return await future
+
+    def _push(self, operation, client: genai.Client, started_at: float, errors: int, future: asyncio.Future, delay: float = None) -> None:
+        if delay is None:
+            delay = self.next_interval(time.monotonic() - started_at)
+        # Never sleep past the deadline: the last poll happens right at it
+        due = min(time.monotonic() + delay, started_at + self.timeout)
+        heapq.heappush(self._schedule, (due, next(self._seq), operation, client, started_at, errors, future))
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_POLLS)
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._schedule and self._schedule[0][0] <= now:
+                _, _, operation, client, started_at, errors, future = heapq.heappop(self._schedule)
+                if future.done():
+                    continue
+                task = asyncio.create_task(self._poll(operation, client, started_at, errors, future, semaphore))
+                self._polls.add(task)
+                task.add_done_callback(self._polls.discard)
+            timeout = self._schedule[0][0] - now if self._schedule else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, operation, client: genai.Client, started_at: float, errors: int, future: asyncio.Future, semaphore: asyncio.Semaphore) -> None:
+        try:
+            async with semaphore:
+                operation = await asyncio.to_thread(client.operations.get, operation)
+        except Exception as e:
+            errors += 1
+            if not is_transient(e) or errors >= MAX_POLL_ERRORS or time.monotonic() - started_at >= self.timeout:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            self._push(operation, client, started_at, errors, future, delay=backoff_delay(errors))
+            return
+        if operation.done:
+            self.expected_seconds = 0.8 * self.expected_seconds + 0.2 * (time.monotonic() - started_at)
+            if not future.done():
+                future.set_result(operation)
+        elif time.monotonic() - started_at >= self.timeout:
+            if not future.done():
+                future.set_exception(TimeoutError(f"Operation {operation.name} still running after {self.timeout:.0f}s"))
+        else:
+            self._push(operation, client, started_at, 0, future)
+
+
+_client = None
+
+
+def get_client() -> genai.Client:
+    """Shared Gemini client, created on first use so a missing key only fails the call."""
+    global _client
+    if _client is None:
+        _client = genai.Client(api_key=GEMINI_API_KEY)
+    return _client
+
+
+# Create a shared poller that can be imported by all tools in this directory
+operation_poller = OperationPoller()
@@ -3,12 +3,16 @@
 from typing import Annotated
 from pydantic import BaseModel, Field
 
-from google import genai
 from google.genai import types
 import asyncio
 
 import uuid
-import os
+
+try:
+    from .common import get_client, operation_poller
+except ImportError:
+    # Imported as a top-level module (test_generate_tool.py, running the tool as a script)
+    from common import get_client, operation_poller
 
 class Output(BaseModel):
     """Response from the video generation tool."""
@@ -18,8 +22,9 @@ class Output(BaseModel):
 
 async def _background_generate_video(task_id, prompt, aspect_ratio, person_generation):
     try:
-        client = genai.Client(api_key="")
-        operation = client.models.generate_videos(
+        client = get_client()
+        operation = await asyncio.to_thread(
+            client.models.generate_videos,
             model="veo-2.0-generate-001",
             prompt=prompt,
             config=types.GenerateVideosConfig(
@@ -27,10 +32,9 @@ async def _background_generate_video(task_id, prompt, aspect_ratio, person_gener
                 aspect_ratio=aspect_ratio,
             ),
         )
-        while not operation.done:
-            print(f"[{task_id}] Waiting for video generation to complete, 10 more seconds...")
-            await asyncio.sleep(10)
-            operation = client.operations.get(operation)
+        print(f"[{task_id}] Waiting for video generation to complete...")
+        # The shared poller owns all in-flight operations (adaptive schedule, no per-task loop)
+        operation = await operation_poller.wait(operation, client)
         for idx, gen in enumerate(operation.response.generated_videos):
             print(f"[{task_id}] Downloading video {idx + 1}/{len(operation.response.generated_videos)}...")
             filename = f"video_{task_id}_{idx}.mp4"
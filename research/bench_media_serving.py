@@ -0,0 +1,133 @@
+"""
+Benchmark: serving generated MP4s to clients that scrub through them.
+
+Compares the old StaticFiles mount, the MediaApp mount (media.py) and the dedicated sendfile
+MediaServer. Each client opens a video and then seeks: it fetches random 1 MiB byte ranges, the
+way a browser <video> element does while scrubbing. Every response body is checked against the
+file on disk.
+
+    python research/bench_media_serving.py --clients 32 --seeks 20 --size-mb 32
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.staticfiles import StaticFiles
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from media import MediaApp, MediaFiles, MediaServer  # noqa: E402
+
+RANGE_BYTES = 1024 * 1024
+
+
+class Catalog:
+    """Stands in for VideoCatalog: the sha256 a download would have recorded."""
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def get(self, filename):
+        if filename not in self.hashes:
+            return None
+        path, digest = self.hashes[filename]
+        return {"local_path": str(path), "sha256": digest, "size_bytes": path.stat().st_size}
+
+
+def start_uvicorn(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def scrub(client, url, data, seeks, latencies):
+    # Initial request: the player asks for the whole file and reads the first chunk
+    async with client.stream("GET", url, headers={"range": "bytes=0-"}) as response:
+        assert response.status_code in (200, 206), response.status_code
+        async for _ in response.aiter_bytes():
+            break
+    for _ in range(seeks):
+        start = random.randrange(0, len(data) - RANGE_BYTES)
+        started = time.perf_counter()
+        response = await client.get(url, headers={"range": f"bytes={start}-{start + RANGE_BYTES - 1}"})
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 206, response.status_code
+        assert response.content == data[start:start + RANGE_BYTES], "body mismatch"
+
+
+async def run(name, base_url, files, clients, seeks):
+    latencies = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # Warm up connections and the page cache
+        await client.get(f"/videos/{files[0][0]}", headers={"range": "bytes=0-1"})
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            scrub(client, f"/videos/{files[i % len(files)][0]}", files[i % len(files)][1], seeks, latencies)
+            for i in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    moved = len(latencies) * RANGE_BYTES / (1024 * 1024)
+    print(
+        f"{name:<22} {len(latencies) / elapsed:8.0f} req/s {moved / elapsed:9.0f} MiB/s"
+        f"   p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seeks", type=int, default=20, help="range requests per client")
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--videos", type=int, default=4)
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp(prefix="media-bench-"))
+    files, hashes = [], {}
+    for i in range(args.videos):
+        data = os.urandom(args.size_mb * 1024 * 1024)
+        path = directory / f"bench_{i}.mp4"
+        path.write_bytes(data)
+        files.append((path.name, data))
+        hashes[path.name] = (path, hashlib.sha256(data).hexdigest())
+
+    media_files = MediaFiles(str(directory), catalog=Catalog(hashes))
+    static_port, media_port = free_port(), free_port()
+    start_uvicorn(Starlette(routes=[Mount("/videos", StaticFiles(directory=directory))]), static_port)
+    start_uvicorn(Starlette(routes=[Mount("/videos", MediaApp(media_files))]), media_port)
+    sendfile_server = MediaServer(media_files, host="127.0.0.1", port=0)
+    sendfile_server.start()
+
+    print(f"{args.clients} clients x {args.seeks} random 1 MiB seeks over {args.videos} x {args.size_mb} MiB videos")
+    for name, port in (
+        ("StaticFiles (before)", static_port),
+        ("MediaApp (/videos)", media_port),
+        ("MediaServer sendfile", sendfile_server.port),
+    ):
+        asyncio.run(run(name, f"http://127.0.0.1:{port}", files, args.clients, args.seeks))
+
+
+if __name__ == "__main__":
+    main()
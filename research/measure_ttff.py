@@ -0,0 +1,168 @@
+"""
+Measure time-to-first-frame (TTFF) of generated videos before and after faststart.
+
+Each video is copied, the copy is faststart-ed (faststart.py) and both are served by the media server.
+A player is emulated over a throttled link: it streams the file from byte 0 and parses top-level boxes
+as they arrive. It can decode the first frame once it has the moov box and the first video sample.
+When it meets mdat before moov:
+  - "linear" players keep downloading until moov arrives (progressive download, no seeking);
+  - "range" players jump to the moov at the end with a Range request, then fetch the first sample.
+Every request also pays one round trip.
+
+    python research/measure_ttff.py                           # videos in generated_videos/
+    python research/measure_ttff.py a.mp4 --mbps 5 --rtt-ms 80
+"""
+
+import argparse
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from faststart import Box, chunk_offset_boxes, make_faststart, needs_faststart, parse_boxes  # noqa: E402
+from downloads import DownloadResult  # noqa: E402
+from media import MediaFiles, MediaServer  # noqa: E402
+
+READ_SIZE = 16 * 1024
+
+
+def find(boxes, kind):
+    for box in boxes:
+        if box.kind == kind:
+            return box
+        if box.children:
+            found = find(box.children, kind)
+            if found:
+                return found
+    return None
+
+
+def first_video_sample(moov_payload: bytes):
+    """(offset, size) of the first sample of the first video track."""
+    moov = parse_boxes(moov_payload)
+    for trak in (box for box in moov if box.kind == b"trak"):
+        hdlr = find([trak], b"hdlr")
+        # hdlr payload: version/flags, pre_defined, handler type
+        if hdlr is None or hdlr.payload[8:12] != b"vide":
+            continue
+        stbl = find([trak], b"stbl")
+        chunks = chunk_offset_boxes([Box(b"stbl", children=stbl.children)])[0]
+        wide = chunks.kind == b"co64"
+        offset = struct.unpack_from(">Q" if wide else ">I", chunks.payload, 8)[0]
+        stsz = next(child for child in stbl.children if child.kind == b"stsz")
+        size, count = struct.unpack_from(">II", stsz.payload, 4)
+        if size == 0 and count:
+            size = struct.unpack_from(">I", stsz.payload, 12)[0]
+        return offset, size
+    raise ValueError("no video track")
+
+
+class ThrottledPlayer:
+    def __init__(self, client: httpx.Client, url: str, bytes_per_second: float, rtt: float):
+        self.client = client
+        self.url = url
+        self.bytes_per_second = bytes_per_second
+        self.rtt = rtt
+        self.requests = 0
+        self.bytes = 0
+
+    def fetch(self, start: int, until=None):
+        """Stream from `start`, throttled; `until(buffer)` -> True stops the request early."""
+        self.requests += 1
+        time.sleep(self.rtt)
+        buffer = bytearray()
+        began = time.perf_counter()
+        with self.client.stream("GET", self.url, headers={"range": f"bytes={start}-"}) as response:
+            for chunk in response.iter_bytes(READ_SIZE):
+                buffer += chunk
+                self.bytes += len(chunk)
+                # Hold the pace of the emulated link
+                lag = len(buffer) / self.bytes_per_second - (time.perf_counter() - began)
+                if lag > 0:
+                    time.sleep(lag)
+                if until and until(buffer):
+                    break
+        return bytes(buffer)
+
+    def time_to_first_frame(self, seek: bool) -> float:
+        started = time.perf_counter()
+        state = {}
+
+        def have_first_frame(buffer) -> bool:
+            offset = 0
+            while offset + 8 <= len(buffer):
+                size, kind = struct.unpack_from(">I4s", buffer, offset)
+                if size == 1:
+                    if offset + 16 > len(buffer):
+                        return False
+                    size = struct.unpack_from(">Q", buffer, offset + 8)[0]
+                if kind == b"moov":
+                    if offset + size > len(buffer):
+                        return False
+                    header = 16 if struct.unpack_from(">I", buffer, offset)[0] == 1 else 8
+                    state["moov"] = bytes(buffer[offset + header:offset + size])
+                    sample_offset, sample_size = first_video_sample(state["moov"])
+                    state["sample_end"] = sample_offset + sample_size
+                    return len(buffer) >= state["sample_end"]
+                if kind == b"mdat" and seek and "moov" not in state:
+                    state["moov_at"] = offset + size
+                    return True
+                offset += size
+            return "sample_end" in state and len(buffer) >= state["sample_end"]
+
+        self.fetch(0, have_first_frame)
+        if "moov_at" in state and "moov" not in state:
+            # mdat first: jump over it to the moov, then come back for the first sample
+            moov = self.fetch(state["moov_at"], lambda buffer: len(buffer) >= 8 and len(buffer) >= struct.unpack_from(">I", buffer)[0])
+            sample_offset, sample_size = first_video_sample(moov[8:struct.unpack_from(">I", moov)[0]])
+            self.fetch(sample_offset, lambda buffer: len(buffer) >= sample_size)
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="*", help="MP4 files (default: the videos in generated_videos/)")
+    parser.add_argument("--mbps", type=float, default=20.0, help="emulated link speed in Mbit/s")
+    parser.add_argument("--rtt-ms", type=float, default=50.0, help="emulated round trip per request")
+    args = parser.parse_args()
+
+    # Flat files from before the sharded layout, then content-addressed ones (ab/cd/<sha256>.mp4)
+    videos = [Path(video) for video in args.videos] or sorted(Path("generated_videos").glob("*.mp4")) + sorted(Path("generated_videos").glob("??/??/*.mp4"))
+    if not videos:
+        sys.exit("No videos to measure")
+    directory = Path(tempfile.mkdtemp(prefix="ttff-"))
+    server = MediaServer(MediaFiles(str(directory)), host="127.0.0.1", port=0)
+    server.start()
+    client = httpx.Client(base_url=f"http://127.0.0.1:{server.port}", timeout=120)
+    bytes_per_second = args.mbps * 1e6 / 8
+
+    print(f"Link {args.mbps:g} Mbit/s, RTT {args.rtt_ms:g} ms")
+    print(f"{'video':<48} {'MB':>6} {'layout':<10} {'linear':>9} {'range':>9}")
+    try:
+        for video in videos:
+            before = directory / f"before_{video.name}"
+            after = directory / f"after_{video.name}"
+            shutil.copyfile(video, before)
+            shutil.copyfile(video, after)
+            make_faststart(DownloadResult(after, after.stat().st_size, ""))
+            for label, path in (("as saved", before), ("faststart", after)):
+                layout = f"{label}{'*' if needs_faststart(path) else ''}"
+                timings = []
+                for seek in (False, True):
+                    player = ThrottledPlayer(client, f"/videos/{path.name}", bytes_per_second, args.rtt_ms / 1000)
+                    timings.append(player.time_to_first_frame(seek))
+                print(f"{video.name[:48]:<48} {path.stat().st_size / 1e6:6.2f} {layout:<10} {timings[0]:8.2f}s {timings[1]:8.2f}s")
+    finally:
+        client.close()
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    print("* moov after mdat")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Local stand-in for the Files API download endpoint, and a benchmark of downloads.RangedDownloader against it.
+
+The stand-in serves one file with byte-range support (206 + Content-Range, ETag, If-Range) and can
+inject the faults seen on real downloads: connections dropped part-way through a body, 503s, and
+bodies cut short. Every request pays a fixed latency and each connection is throttled, the way a
+single TCP stream from a distant server is, so the benefit of fetching ranges concurrently shows up.
+
+    python research/range_server.py --size-mb 64 --mbps 100 --latency-ms 40
+    python research/range_server.py --drop 0.2 --errors 0.1     # resume under faults
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from downloads import RangedDownloader  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeServer:
+    """Serves `data` at any path, with optional latency, per-connection throttling and injected faults."""
+
+    def __init__(self, data: bytes, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, bytes_per_second: float = 0.0, ranges: bool = True, drop_rate: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.data = data
+        self.etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.ranges = ranges
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.faults = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://{host}:{self.port}/v1beta/files/video:download?alt=media"
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+    def _fault(self, rate: float) -> bool:
+        with self._lock:
+            hit = self.random.random() < rate
+            self.faults += hit
+            return hit
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:
+                    pass  # the client went away (an aborted download); not worth a traceback
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                try:
+                    self._serve()
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+            def _serve(self):
+                time.sleep(server.latency)
+                if server._fault(server.error_rate):
+                    self.send_response(503)
+                    self.send_header("content-length", "0")
+                    self.end_headers()
+                    return
+                data = server.data
+                status, start, end = 200, 0, len(data) - 1
+                match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("range", ""))
+                if_range = self.headers.get("if-range")
+                if server.ranges and match and (if_range is None or if_range == server.etag):
+                    status, start = 206, int(match.group(1))
+                    end = min(int(match.group(2)), len(data) - 1) if match.group(2) else len(data) - 1
+                self.send_response(status)
+                self.send_header("content-type", "video/mp4")
+                self.send_header("etag", server.etag)
+                if server.ranges:
+                    self.send_header("accept-ranges", "bytes")
+                if status == 206:
+                    self.send_header("content-range", f"bytes {start}-{end}/{len(data)}")
+                self.send_header("content-length", str(end - start + 1))
+                self.end_headers()
+
+                # Drop the connection somewhere in the body, as a reset or idle timeout would
+                cut = end + 1
+                if end > start and server._fault(server.drop_rate):
+                    cut = start + server.random.randrange(end - start)
+                offset = start
+                while offset < cut:
+                    chunk = data[offset:min(offset + CHUNK_SIZE, cut)]
+                    if server.bytes_per_second:
+                        time.sleep(len(chunk) / server.bytes_per_second)
+                    try:
+                        self.wfile.write(chunk)
+                    except ConnectionError:
+                        # The client stopped reading (the size probe, or an aborted download)
+                        self.close_connection = True
+                        return
+                    offset += len(chunk)
+                    with server._lock:
+                        server.bytes_sent += len(chunk)
+                if cut <= end:
+                    self.close_connection = True
+                    try:
+                        self.wfile.flush()
+                        self.connection.shutdown(2)
+                    except OSError:
+                        pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=64.0, help="size of the test video")
+    parser.add_argument("--mbps", type=float, default=100.0, help="throughput of one connection in Mbit/s (0 = unthrottled)")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="latency added to every request")
+    parser.add_argument("--chunk-mb", type=float, default=4.0, help="size of each range request")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--drop", type=float, default=0.0, help="fraction of responses cut off part-way")
+    parser.add_argument("--errors", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--attempts", type=int, default=50, help="download attempts before giving up (each resumes the last)")
+    args = parser.parse_args()
+
+    data = os.urandom(int(args.size_mb * 1024 * 1024))
+    digest = hashlib.sha256(data).hexdigest()
+    directory = Path(tempfile.mkdtemp(prefix="range-bench-"))
+    print(f"{args.size_mb:g} MB video, {args.chunk_mb:g} MB ranges, {args.mbps:g} Mbit/s per connection, {args.latency_ms:g} ms per request, {args.drop:.0%} dropped, {args.errors:.0%} 503s")
+    print(f"{'mode':>14} {'seconds':>8} {'Mbit/s':>8} {'attempts':>9} {'sent MB':>8} {'in flight':>10} {'verified':>9}")
+
+    runs = [("single stream", 1, False)] + [(f"{n} connections", n, True) for n in args.connections]
+    for label, connections, ranges in runs:
+        server = RangeServer(
+            data, latency=args.latency_ms / 1000, bytes_per_second=args.mbps * 1e6 / 8, ranges=ranges,
+            drop_rate=args.drop, error_rate=args.errors
+        )
+        server.start()
+        downloader = RangedDownloader(connections=connections, chunk_size=int(args.chunk_mb * 1024 * 1024))
+        target = directory / f"{connections}-{ranges}.mp4"
+        started = time.perf_counter()
+        result, attempts = None, 0
+        try:
+            # What the retry layer does: call again with the same target until it succeeds
+            while result is None and attempts < args.attempts:
+                attempts += 1
+                try:
+                    result = downloader.fetch(server.url, {}, target, len(data), digest)
+                except Exception:
+                    pass
+            elapsed = time.perf_counter() - started
+            verified = result is not None and hashlib.sha256(target.read_bytes()).hexdigest() == digest
+            rate = len(data) * 8 / 1e6 / elapsed if result else 0.0
+            print(f"{label:>14} {elapsed:8.2f} {rate:8.1f} {attempts:>9} {server.bytes_sent / (1024 * 1024):8.1f} {server.max_in_flight:>10} {str(verified):>9}")
+        finally:
+            server.stop()
+            for leftover in directory.iterdir():
+                leftover.unlink()
+    directory.rmdir()
+
+
+if __name__ == "__main__":
+    main()
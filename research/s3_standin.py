@@ -0,0 +1,223 @@
+"""
+Local S3 stand-in, and a benchmark of the S3 storage backend's parallel multipart uploads against it.
+
+The stand-in speaks the subset of the S3 REST API that storage.S3Storage uses (HEAD/GET/PUT/DELETE
+object, multipart create/upload part/complete/abort, path-style addressing; signatures are not
+checked). Every request pays a fixed latency and each connection is throttled, the way a single
+TCP stream to a distant object store is, so the benefit of uploading parts concurrently shows up.
+
+    python research/s3_standin.py --size-mb 64 --mbps 100 --latency-ms 40
+    python research/s3_standin.py --serve --port 9000     # run the stand-in for VIDEO_STORAGE=s3:
+        VIDEO_STORAGE=s3 S3_BUCKET=videos S3_ENDPOINT_URL=http://127.0.0.1:9000 \\
+        AWS_ACCESS_KEY_ID=test AWS_SECRET_ACCESS_KEY=test S3_REGION=us-east-1 python veo3_11.py
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from downloads import DownloadResult  # noqa: E402
+from storage import S3Storage  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+def decode_aws_chunked(body: bytes) -> bytes:
+    """Payload of an `aws-chunked` body (<hex size>;chunk-signature=...\\r\\n<data>\\r\\n ... 0\\r\\n<trailers>)."""
+    out, offset = bytearray(), 0
+    while True:
+        end = body.index(b"\r\n", offset)
+        size = int(body[offset:end].split(b";")[0], 16)
+        if size == 0:
+            return bytes(out)
+        out += body[end + 2:end + 2 + size]
+        offset = end + 2 + size + 2
+
+
+class S3StandIn:
+    """In-memory bucket store behind a threaded HTTP server."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, bytes_per_second: float = 0.0):
+        self.objects = {}
+        self.uploads = {}
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.requests = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.endpoint = f"http://{host}:{self.port}"
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _target(self):
+                url = urlsplit(self.path)
+                bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+                return bucket, key, {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+
+            def _pace(self, size: int) -> None:
+                with standin._lock:
+                    standin.requests += 1
+                    standin._in_flight += 1
+                    standin.max_in_flight = max(standin.max_in_flight, standin._in_flight)
+                time.sleep(standin.latency)
+                if standin.bytes_per_second:
+                    time.sleep(size / standin.bytes_per_second)
+                with standin._lock:
+                    standin._in_flight -= 1
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get("content-length", 0))
+                body = self.rfile.read(length)
+                if "aws-chunked" in self.headers.get("content-encoding", ""):
+                    body = decode_aws_chunked(body)
+                return body
+
+            def _reply(self, status: int, body: bytes = b"", headers=None, send_body: bool = True) -> None:
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                if send_body and body:
+                    self.wfile.write(body)
+
+            def do_HEAD(self):
+                self.do_GET(send_body=False)
+
+            def do_GET(self, send_body: bool = True):
+                bucket, key, _ = self._target()
+                data = standin.objects.get((bucket, key))
+                if data is None:
+                    self._pace(0)
+                    return self._reply(404, b"<Error><Code>NoSuchKey</Code></Error>", send_body=send_body)
+                status, headers, body = 200, {"etag": f'"{hashlib.md5(data).hexdigest()}"', "content-type": "video/mp4"}, data
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("range", ""))
+                if match:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else len(data) - 1
+                    status, body = 206, data[start:end + 1]
+                    headers["content-range"] = f"bytes {start}-{start + len(body) - 1}/{len(data)}"
+                self._pace(len(body) if send_body else 0)
+                self._reply(status, body, headers, send_body)
+
+            def do_PUT(self):
+                bucket, key, query = self._target()
+                body = self._body()
+                self._pace(len(body))
+                if "uploadId" in query:
+                    standin.uploads[query["uploadId"]]["parts"][int(query["partNumber"])] = body
+                else:
+                    standin.objects[(bucket, key)] = body
+                self._reply(200, headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+            def do_POST(self):
+                bucket, key, query = self._target()
+                body = self._body()
+                self._pace(0)
+                if "uploads" in query:
+                    upload_id = uuid.uuid4().hex
+                    standin.uploads[upload_id] = {"key": (bucket, key), "parts": {}}
+                    xml = f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                    return self._reply(200, xml.encode())
+                upload = standin.uploads.pop(query["uploadId"])
+                numbers = [int(number) for number in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)]
+                standin.objects[upload["key"]] = b"".join(upload["parts"][number] for number in numbers)
+                xml = f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>\"done\"</ETag></CompleteMultipartUploadResult>"
+                self._reply(200, xml.encode())
+
+            def do_DELETE(self):
+                bucket, key, query = self._target()
+                self._pace(0)
+                if "uploadId" in query:
+                    standin.uploads.pop(query["uploadId"], None)
+                else:
+                    standin.objects.pop((bucket, key), None)
+                self._reply(204)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=64.0, help="size of the test video")
+    parser.add_argument("--mbps", type=float, default=100.0, help="throughput of one connection in Mbit/s (0 = unthrottled)")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="latency added to every request")
+    parser.add_argument("--part-mb", type=float, default=8.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--serve", action="store_true", help="only run the stand-in")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    standin = S3StandIn(port=args.port, latency=args.latency_ms / 1000, bytes_per_second=args.mbps * 1e6 / 8)
+    standin.start()
+    if args.serve:
+        print(f"S3 stand-in on {standin.endpoint} (any bucket, signatures not checked)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+
+    directory = Path(tempfile.mkdtemp(prefix="s3-bench-"))
+    video = directory / "video.mp4"
+    with open(video, "wb") as f:
+        for _ in range(int(args.size_mb * 1024 * 1024) // CHUNK_SIZE):
+            f.write(os.urandom(CHUNK_SIZE))
+    digest = hashlib.sha256(video.read_bytes()).hexdigest()
+    download = DownloadResult(video, video.stat().st_size, digest)
+
+    print(f"{args.size_mb:g} MB video, {args.part_mb:g} MB parts, {args.mbps:g} Mbit/s per connection, {args.latency_ms:g} ms per request")
+    print(f"{'concurrency':>11} {'seconds':>8} {'Mbit/s':>8} {'in flight':>10} {'verified':>9}")
+    try:
+        for concurrency in args.concurrency:
+            storage = S3Storage(
+                bucket="videos", endpoint_url=standin.endpoint, region="us-east-1", prefix=f"c{concurrency}/",
+                part_size=int(args.part_mb * 1024 * 1024), multipart_threshold=0, concurrency=concurrency
+            )
+            standin.max_in_flight = 0
+            started = time.perf_counter()
+            key = storage.put(download)
+            elapsed = time.perf_counter() - started
+            # Read it back through a presigned URL, as a client would
+            body = httpx.get(storage.url("video.mp4", key), timeout=300).content
+            verified = hashlib.sha256(body).hexdigest() == digest
+            print(f"{concurrency:>11} {elapsed:8.2f} {download.size_bytes * 8 / 1e6 / elapsed:8.1f} {standin.max_in_flight:>10} {str(verified):>9}")
+            storage.delete(key)
+    finally:
+        standin.stop()
+        video.unlink()
+        directory.rmdir()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Resilience Layer
+Error classification, jittered exponential-backoff retries and per-backend circuit breakers for provider calls
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, Awaitable, Callable, Optional
+
+from key_pool import AUTH_ERROR, QUOTA_ERROR, classify_key_error
+
+logger = logging.getLogger(__name__)
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "30"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # consecutive transient failures
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "60"))  # open -> half-open after this long
+
+# Error classes
+TRANSIENT = "transient"  # worth retrying: 5xx, timeouts, dropped connections
+QUOTA = QUOTA_ERROR  # the key is out of quota; the key pool moves on to another key
+AUTH = AUTH_ERROR  # the key was rejected
+PERMANENT = "permanent"  # bad request, not found, ...: retrying won't help
+
+TRANSIENT_STATUS_CODES = {408, 500, 502, 503, 504}
+TRANSIENT_STATUSES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "ABORTED"}
+# Failures that prove a submission never started work at the provider (safe to submit again)
+NOT_ACCEPTED_STATUS_CODES = {429, 503}
+NOT_ACCEPTED_STATUSES = {"UNAVAILABLE", "RESOURCE_EXHAUSTED"}
+NOT_ACCEPTED_ERRORS = {"ConnectError", "ConnectTimeout", "PoolTimeout", "NewConnectionError", "NameResolutionError"}
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def classify_error(error: BaseException) -> str:
+    """Map an exception from the Gemini SDK, requests or httpx to TRANSIENT, QUOTA, AUTH or PERMANENT."""
+    key_error = classify_key_error(error)
+    if key_error:
+        return key_error
+    code = getattr(error, "code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if code in TRANSIENT_STATUS_CODES or str(getattr(error, "status", "") or "") in TRANSIENT_STATUSES:
+        return TRANSIENT
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return TRANSIENT
+    # requests / httpx / urllib3 connection and timeout errors, matched by name to avoid importing them all
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & {"ConnectionError", "Timeout", "TimeoutException", "TransportError", "ReadTimeout", "ConnectTimeout", "ProtocolError", "ChunkedEncodingError"}:
+        return TRANSIENT
+    return PERMANENT
+
+
+def was_not_accepted(error: BaseException) -> bool:
+    """
+    True if a failed submission provably never reached the provider (rate limited, unavailable, or no connection
+    was made). Timeouts and connection resets after the request was sent may have started a generation.
+    """
+    code = getattr(error, "code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if code in NOT_ACCEPTED_STATUS_CODES or str(getattr(error, "status", "") or "") in NOT_ACCEPTED_STATUSES:
+        return True
+    if isinstance(error, ConnectionRefusedError):
+        return True
+    return bool({cls.__name__ for cls in type(error).__mro__} & NOT_ACCEPTED_ERRORS)
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+    def __init__(self, backend: str, retry_in: float):
+        super().__init__(f"{backend} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.backend = backend
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker for one backend.
+
+    After `failure_threshold` consecutive transient failures the circuit opens and calls fail fast
+    with CircuitOpenError. After `reset_seconds` one probe call is let through (half-open): success
+    closes the circuit, failure opens it again. Thread safe.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (used by the router to skip the backend)."""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def release_probe(self) -> None:
+        """The half-open probe ended without an answer either way (e.g. cancelled): let the next call probe."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"🟢 Circuit for {self.name} closed again")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                logger.error(f"🔴 Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+                "retry_in_seconds": round(self.retry_in(), 1) if self.state == OPEN else 0.0,
+            }
+
+
+class Resilience:
+    """
+    Retry + circuit breaker wrapper for one backend's provider calls, with per-call-type metrics.
+
+        operation = await resilience.call("generate_videos", run_blocking, client.models.generate_videos, ...)
+
+    Transient errors are retried with full-jitter exponential backoff (up to `max_attempts` calls) and
+    count towards the breaker; quota/auth/permanent errors are raised immediately and don't.
+    Calls that start paid work go through `submit`, which only retries failures the provider never accepted.
+    """
+
+    def __init__(self, backend: str, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY, breaker: Optional[CircuitBreaker] = None):
+        self.backend = backend
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker(backend)
+        self._metrics: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def count(self, call: str, metric: str, amount: int = 1) -> None:
+        self._metrics[call][metric] += amount
+
+    async def call(self, call: str, run: Callable[..., Awaitable[Any]], func: Callable[..., Any], *args, **kwargs) -> Any:
+        """`await run(func, *args, **kwargs)` (e.g. run = generator._run_blocking) with retries and the breaker."""
+        return await self._call(call, None, run, func, *args, **kwargs)
+
+    async def submit(self, call: str, run: Callable[..., Awaitable[Any]], func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Like `call`, for submissions that start a (paid) generation: a transient error is only retried when
+        `was_not_accepted` proves nothing was started; a read timeout or dropped connection fails the call.
+        """
+        return await self._call(call, was_not_accepted, run, func, *args, **kwargs)
+
+    async def _call(self, call: str, retryable: Optional[Callable[[BaseException], bool]], run: Callable[..., Awaitable[Any]], func: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                self.count(call, "short_circuited")
+                raise CircuitOpenError(self.backend, self.breaker.retry_in())
+            probing = self.breaker.state == HALF_OPEN
+            self.count(call, "attempts")
+            try:
+                result = await run(func, *args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                self.count(call, f"{kind}_errors")
+                if kind != TRANSIENT:
+                    if probing:
+                        # The provider answered the probe, so it is up again
+                        self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if retryable and not retryable(e):
+                    # May have been accepted: submitting again could start a second generation
+                    self.count(call, "not_retried")
+                    raise
+                if attempt == self.max_attempts - 1:
+                    self.count(call, "gave_up")
+                    raise
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                if probing:
+                    # Cancelled mid-probe: don't leave the breaker half-open with nobody let through
+                    self.breaker.release_probe()
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+            self.count(call, "retries")
+            logger.warning(f"🔁 {self.backend} {call} failed ({error}); retry {attempt + 1}/{self.max_attempts - 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "breaker": self.breaker.stats(),
+            "calls": {call: dict(counts) for call, counts in self._metrics.items()},
+            "max_attempts": self.max_attempts,
+        }
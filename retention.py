@@ -0,0 +1,266 @@
+"""
+Disk Retention
+Keeps generated_videos/ within a byte budget: age and least-recently-served eviction, pinning and background compaction
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+from previews import PREVIEW_DIR
+
+logger = logging.getLogger(__name__)
+
+# Disk budget for generated videos (0 = unlimited) and the level eviction brings usage back down to
+RETENTION_MAX_BYTES = int(float(os.getenv("RETENTION_MAX_GB", "20")) * 1024 ** 3)
+RETENTION_LOW_WATERMARK = float(os.getenv("RETENTION_LOW_WATERMARK", "0.9"))
+# Delete unpinned videos older than this many days (0 = no age limit)
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL_SECONDS", "60"))
+# Videos younger than this are never evicted (their job may still be handing out the links)
+RETENTION_GRACE_SECONDS = float(os.getenv("RETENTION_GRACE_SECONDS", "3600"))
+COMPACT_INTERVAL = float(os.getenv("RETENTION_COMPACT_SECONDS", "3600"))
+# Temp files of downloads / rewrites that crashed mid-way (pending downloads keep theirs, see compact)
+STALE_TEMP_SECONDS = 6 * 3600
+EVICTION_BATCH = 100
+
+
+class RetentionManager:
+    """
+    Background eviction and cleanup for generated videos.
+
+    A daemon thread wakes every `interval` seconds. It records serve times collected by the tracked
+    MediaFiles, deletes unpinned videos past the age limit and, when the catalogued bytes exceed the
+    budget, evicts the least recently served (or created) unpinned videos until usage is back under the
+    low watermark. Every `COMPACT_INTERVAL` it also removes stale temp files and orphaned previews and
+    compacts the catalog database.
+
+    A video is deleted in one order everywhere: catalog row, generation cache entries, media lookup
+    cache, then the file (and its object in remote `storage`) and its poster/preview. Listings and the /videos mount stop handing it out
+    before the bytes go away, and responses that already opened the file finish normally. Request
+    handlers never wait on any of this; the generation cache sends its evictions here through
+    `remove_videos` so they respect pins too.
+
+    With a `job_store`, compaction leaves the staging files of pending downloads alone however old they
+    are: the download stage resumes their `.part` files until the provider's copy expires.
+    """
+
+    def __init__(self, catalog, cache=None, storage=None, job_store=None, preview_dir: str = PREVIEW_DIR, max_bytes: int = RETENTION_MAX_BYTES, max_age_days: float = RETENTION_MAX_AGE_DAYS, interval: float = RETENTION_INTERVAL):
+        self.catalog = catalog
+        self.cache = cache
+        self.storage = storage
+        self.job_store = job_store
+        self.preview_dir = Path(preview_dir)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.media: List[Any] = []
+        self._remove_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_compaction = 0.0
+        self.evicted = 0
+        self.expired = 0
+        self.bytes_freed = 0
+        self.temp_files_removed = 0
+        self.orphans_removed = 0
+        self.last_sweep: Optional[str] = None
+        self.last_compaction: Optional[str] = None
+
+    def track(self, media_files) -> None:
+        """Use a MediaFiles' serve times for LRU and drop its cached lookups of deleted videos."""
+        self.media.append(media_files)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="video-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    def nudge(self) -> None:
+        """Run a sweep now instead of at the next interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        # Let the startup reconciliation index what is on disk before judging usage
+        self.catalog.reconciled.wait(60)
+        while not self._stopping.is_set():
+            try:
+                self.sweep()
+                if time.time() - self._last_compaction >= COMPACT_INTERVAL:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"❌ Retention sweep failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sweep(self) -> Dict[str, int]:
+        """Record serve times, expire old videos and evict down to the budget. Returns what was removed."""
+        for media in self.media:
+            self.catalog.touch(media.drain_accessed())
+
+        now = time.time()
+        expired = 0
+        if self.max_age_days > 0:
+            cutoff = now - self.max_age_days * 86400
+            while True:
+                entries = self.catalog.expired(cutoff, EVICTION_BATCH)
+                if not entries:
+                    break
+                self._remove(entries)
+                expired += len(entries)
+            self.expired += expired
+
+        evicted = 0
+        usage = self.catalog.total_bytes()
+        if self.max_bytes and usage > self.max_bytes:
+            target = self.max_bytes * RETENTION_LOW_WATERMARK
+            while usage > target:
+                batch = []
+                for entry in self.catalog.eviction_candidates(now - RETENTION_GRACE_SECONDS, EVICTION_BATCH):
+                    if usage <= target:
+                        break
+                    batch.append(entry)
+                    usage -= entry["size_bytes"]
+                if not batch:
+                    logger.warning(
+                        f"⚠️ Videos use {usage / 1024 ** 3:.2f} GB (budget {self.max_bytes / 1024 ** 3:.2f} GB) "
+                        "but everything left is pinned or too recent to evict"
+                    )
+                    break
+                self._remove(batch)
+                evicted += len(batch)
+            self.evicted += evicted
+
+        self.last_sweep = datetime.now().isoformat()
+        if expired or evicted:
+            logger.info(f"🧹 Retention: {expired} expired, {evicted} evicted, {usage / 1024 ** 3:.2f} GB in use")
+        return {"expired": expired, "evicted": evicted}
+
+    def remove_videos(self, videos: List[Dict[str, Any]]) -> int:
+        """Delete video dicts evicted from the generation cache, skipping pinned ones. Returns how many were removed."""
+        entries, unknown = [], []
+        for video in videos:
+            entry = self.catalog.get(video.get("filename") or Path(video["local_path"]).name)
+            if entry is None:
+                unknown.append(video["local_path"])
+            elif not entry["pinned"]:
+                entries.append(entry)
+        for path in unknown:
+            self._delete_unreferenced(path)
+        self._remove(entries)
+        return len(entries) + len(unknown)
+
+    def _remove(self, entries: List[Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        with self._remove_lock:
+            for entry in entries:
+                self.catalog.remove(entry["filename"])
+            if self.cache is not None:
+                self.cache.forget(entry["local_path"] for entry in entries)
+            for entry in entries:
+                for media in self.media:
+                    media.forget(entry["filename"])
+                self._delete_unreferenced(entry["local_path"], entry.get("storage_key"))
+                for derived in (entry.get("poster"), entry.get("preview")):
+                    if derived:
+                        _unlink(self.preview_dir / derived)
+
+    def _delete_unreferenced(self, local_path: str, storage_key: Optional[str] = None) -> None:
+        """
+        Delete a video file (and its remote object) unless another video still uses it. Content-addressed
+        files can back several videos, the last one out deletes it; the check and the deletion happen under
+        the store's ingest lock so a download of the same bytes landing meanwhile keeps its file.
+        """
+        store = self.catalog.store
+        with store.lock:
+            if self.catalog.references(local_path) or store.claimed(local_path):
+                return
+            self.bytes_freed += _unlink(Path(local_path))
+            if storage_key and self.storage is not None:
+                try:
+                    self.storage.delete(storage_key)
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not delete {storage_key} from {self.storage.name} storage: {e}")
+
+    def compact(self) -> Dict[str, int]:
+        """Remove stale temp files and previews of deleted videos, then compact the catalog database."""
+        self._last_compaction = time.time()
+        now = time.time()
+        temp_files = 0
+        pending = set(self.job_store.pending_download_files()) if self.job_store is not None else set()
+        for directory in (self.catalog.video_dir, self.catalog.store.incoming, self.preview_dir):
+            if not directory.exists():
+                continue
+            staging = directory == self.catalog.store.incoming
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    # Anything left in staging that long belongs to a download that never finished
+                    leftover = entry.is_file() and (staging or (entry.name.startswith(".") and entry.name.endswith(".part")))
+                    if leftover and staging and _pending_download_file(entry.name, pending):
+                        continue
+                    if leftover and now - entry.stat().st_mtime > STALE_TEMP_SECONDS:
+                        _unlink(Path(entry.path))
+                        temp_files += 1
+
+        orphans = 0
+        if self.preview_dir.exists():
+            referenced = self.catalog.preview_files()
+            with os.scandir(self.preview_dir) as entries:
+                for entry in entries:
+                    # The preview stage writes files just before cataloguing them; the grace period covers that gap
+                    if (entry.is_file() and not entry.name.startswith(".") and entry.name not in referenced
+                            and now - entry.stat().st_mtime > RETENTION_GRACE_SECONDS):
+                        _unlink(Path(entry.path))
+                        orphans += 1
+
+        self.catalog.compact()
+        self.temp_files_removed += temp_files
+        self.orphans_removed += orphans
+        self.last_compaction = datetime.now().isoformat()
+        if temp_files or orphans:
+            logger.info(f"🧹 Compaction removed {temp_files} stale temp files and {orphans} orphaned previews")
+        return {"temp_files": temp_files, "orphaned_previews": orphans}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_gb": round(self.max_bytes / 1024 ** 3, 2) if self.max_bytes else None,
+            "max_age_days": self.max_age_days or None,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "freed_mb": round(self.bytes_freed / (1024 * 1024), 2),
+            "temp_files_removed": self.temp_files_removed,
+            "orphaned_previews_removed": self.orphans_removed,
+            "last_sweep": self.last_sweep,
+            "last_compaction": self.last_compaction,
+        }
+
+
+def _pending_download_file(name: str, pending: Set[str]) -> bool:
+    """Whether a staging file is `<filename>` of a pending download or one of its `.<filename>[.<tmp>].part*` siblings."""
+    if name in pending:
+        return True
+    if not (name.startswith(".") and ".part" in name):
+        return False
+    stem = name[1:name.index(".part")]
+    return stem in pending or stem.rsplit(".", 1)[0] in pending
+
+
+def _unlink(path: Path) -> int:
+    """Delete a file if it exists; returns the bytes freed."""
+    try:
+        size = path.stat().st_size
+        path.unlink()
+        return size
+    except FileNotFoundError:
+        return 0
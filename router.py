@@ -0,0 +1,210 @@
+"""
+Latency-Aware Backend Router
+Sends each generation request to the healthiest, fastest video backend that can handle it
+"""
+
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATS_WINDOW = int(os.getenv("ROUTER_STATS_WINDOW", "200"))  # recent requests kept per backend
+ERROR_PENALTY = float(os.getenv("ROUTER_ERROR_PENALTY", "4"))  # score multiplier per unit of error rate
+DEGRADED_ERROR_RATE = float(os.getenv("ROUTER_DEGRADED_ERROR_RATE", "0.5"))
+MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))  # before error rates are trusted
+EXPLORE_RATE = float(os.getenv("ROUTER_EXPLORE_RATE", "0.05"))  # share of requests sent to a non-best backend
+MAX_DECISIONS = 200
+
+
+class VideoBackend:
+    """
+    Interface for a generator the router can send requests to.
+
+    `generate` returns the multi-variation result shape of VideoGeneratorVeo3.generate_video_variations_async
+    (success, videos: [{variation, video_index, filename, local_path, url, ...}], prompt, ...) and reports
+    progress through `progress(variation, state, **info)` the same way.
+    """
+
+    name = "backend"
+    model = "unknown"  # model the backend's results (and their generation cache entries) are labelled with
+    aspect_ratios = ("16:9", "9:16")
+    text_input = True  # can generate from a prompt alone
+    image_input = False  # can animate an input image
+    expected_seconds = 120.0  # latency assumed until real samples exist
+
+    def supports(self, request: Dict[str, Any]) -> Optional[str]:
+        """None if the backend can serve the request, otherwise the reason it can't."""
+        if request.get("aspect_ratio", "16:9") not in self.aspect_ratios:
+            return f"aspect ratio {request.get('aspect_ratio')} not supported"
+        if request.get("image_path") and not self.image_input:
+            return "no image input"
+        if not request.get("image_path") and not self.text_input:
+            return "needs an input image"
+        return None
+
+    def available(self) -> bool:
+        """False while the backend's provider is known to be down (e.g. its circuit breaker is open)."""
+        return True
+
+    async def generate(self, request: Dict[str, Any], progress: Optional[Callable[..., None]] = None, resume: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class BackendStats:
+    """Sliding window of request latencies and outcomes for one backend"""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.samples = deque(maxlen=window)  # (seconds, success)
+        self.in_flight = 0
+        self.requests = 0
+
+    def record(self, seconds: float, success: bool) -> None:
+        self.samples.append((seconds, success))
+
+    def percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(seconds for seconds, success in self.samples if success)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, success in self.samples if not success) / len(self.samples)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "samples": len(self.samples),
+            "p50_seconds": round(p50, 2) if p50 is not None else None,
+            "p95_seconds": round(p95, 2) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+class BackendRouter:
+    """
+    Registry of video backends plus the routing policy.
+
+    Eligible backends (those whose capabilities match the request) are scored by their observed p50
+    latency, inflated by their recent error rate; backends whose error rate crosses
+    `degraded_error_rate` are only used when nothing else can take the request. A small share of
+    requests goes to a random eligible backend so stats of backends that fell out of favour stay fresh.
+    Every decision is kept (last MAX_DECISIONS) for GET /router.
+    """
+
+    def __init__(self, error_penalty: float = ERROR_PENALTY, degraded_error_rate: float = DEGRADED_ERROR_RATE, explore_rate: float = EXPLORE_RATE):
+        self.error_penalty = error_penalty
+        self.degraded_error_rate = degraded_error_rate
+        self.explore_rate = explore_rate
+        self.backends: Dict[str, VideoBackend] = {}
+        self.stats: Dict[str, BackendStats] = {}
+        self.decisions = deque(maxlen=MAX_DECISIONS)
+
+    def register(self, backend: VideoBackend) -> None:
+        self.backends[backend.name] = backend
+        self.stats.setdefault(backend.name, BackendStats())
+        logger.info(f"🧭 Registered video backend: {backend.name}")
+
+    def score(self, name: str) -> float:
+        """Lower is better: expected seconds for a successful result."""
+        stats = self.stats[name]
+        p50 = stats.percentile(0.5)
+        latency = p50 if p50 is not None else self.backends[name].expected_seconds
+        return latency * (1 + self.error_penalty * stats.error_rate())
+
+    def is_degraded(self, name: str) -> bool:
+        if not self.backends[name].available():
+            return True
+        stats = self.stats[name]
+        return len(stats.samples) >= MIN_SAMPLES and stats.error_rate() >= self.degraded_error_rate
+
+    def rejections(self, request: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """Backend name -> why it can't serve the request (None if it can)."""
+        return {name: backend.supports(request) for name, backend in self.backends.items()}
+
+    def can_serve(self, request: Dict[str, Any]) -> bool:
+        return any(reason is None for reason in self.rejections(request).values())
+
+    def choose(self, request: Dict[str, Any], resume: Optional[List[Dict[str, Any]]] = None) -> VideoBackend:
+        """Pick the backend for a request (raises ValueError if none can serve it)."""
+        # A resumed job stays on the backend its operations were submitted to
+        previous = next((entry.get("backend") for entry in resume or [] if entry.get("backend")), None)
+        if previous in self.backends:
+            self._record_decision(request, previous, "resume", {})
+            return self.backends[previous]
+
+        rejected = self.rejections(request)
+        eligible = [name for name, reason in rejected.items() if reason is None]
+        if not eligible:
+            raise ValueError(f"No video backend can serve this request: {rejected}")
+
+        healthy = [name for name in eligible if not self.is_degraded(name)] or eligible
+        scores = {name: round(self.score(name), 2) for name in eligible}
+        best = min(healthy, key=lambda name: scores[name])
+        reason = "lowest score"
+        if len(healthy) > 1 and random.random() < self.explore_rate:
+            best = random.choice([name for name in healthy if name != best])
+            reason = "exploration"
+        elif len(healthy) < len(eligible):
+            reason = "lowest score (degraded backends skipped)"
+        self._record_decision(request, best, reason, scores, {k: v for k, v in rejected.items() if v})
+        return self.backends[best]
+
+    async def generate(self, request: Dict[str, Any], progress: Optional[Callable[..., None]] = None, resume: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Route a request, run it on the chosen backend and record its latency/outcome."""
+        backend = self.choose(request, resume)
+        stats = self.stats[backend.name]
+        report = progress or (lambda *args, **kwargs: None)
+
+        def tagged_progress(variation: int, state: str, **info) -> None:
+            report(variation, state, backend=backend.name, **info)
+
+        stats.requests += 1
+        stats.in_flight += 1
+        started = time.monotonic()
+        success = False
+        try:
+            result = await backend.generate(request, tagged_progress, resume)
+            success = bool(result.get("success"))
+            result["backend"] = backend.name
+            return result
+        finally:
+            stats.in_flight -= 1
+            stats.record(time.monotonic() - started, success)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "backends": {
+                name: {
+                    **self.stats[name].snapshot(),
+                    "score": round(self.score(name), 2),
+                    "degraded": self.is_degraded(name),
+                    "aspect_ratios": list(backend.aspect_ratios),
+                    "image_input": backend.image_input,
+                    "text_input": backend.text_input,
+                }
+                for name, backend in self.backends.items()
+            },
+            "recent_decisions": list(self.decisions)[-20:],
+        }
+
+    def _record_decision(self, request: Dict[str, Any], chosen: str, reason: str, scores: Dict[str, float], rejected: Optional[Dict[str, str]] = None) -> None:
+        decision = {
+            "backend": chosen,
+            "reason": reason,
+            "scores": scores,
+            "rejected": rejected or {},
+            "aspect_ratio": request.get("aspect_ratio"),
+            "image_input": bool(request.get("image_path")),
+            "timestamp": datetime.now().isoformat(),
+        }
+        self.decisions.append(decision)
+        logger.info(f"🧭 Routing to {chosen} ({reason}) scores={scores}")
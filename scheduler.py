@@ -0,0 +1,151 @@
+"""
+Generation Scheduler
+Token bucket + concurrency limit in front of every generate_videos call, so bursts queue instead of hitting rate limits
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_PER_MINUTE = float(os.getenv("VEO_REQUESTS_PER_MINUTE", "10"))
+RATE_BURST = int(os.getenv("VEO_RATE_BURST", "2"))  # submissions allowed back to back before the rate applies
+MAX_CONCURRENT_OPERATIONS = int(os.getenv("VEO_MAX_CONCURRENT_OPERATIONS", "10"))
+
+
+class GenerationScheduler:
+    """
+    Admission control for generation requests.
+
+    A request first waits for one of `max_concurrent` operation slots (held until the operation has
+    finished; the download stage takes it from there), then for a token from a bucket refilled at
+    `requests_per_minute`. Waiters are served first come, first served. Nothing is ever rejected:
+    over the limit, requests simply queue, and the time they spent queued is returned to the caller.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = REQUESTS_PER_MINUTE,
+        burst: int = RATE_BURST,
+        max_concurrent: int = MAX_CONCURRENT_OPERATIONS,
+    ):
+        self.rate = max(requests_per_minute, 0.001) / 60.0  # tokens per second
+        self.capacity = max(1, burst)
+        self.max_concurrent = max(1, max_concurrent)
+        self._tokens = float(self.capacity)
+        self._refilled_at = time.monotonic()
+
+        # asyncio primitives are bound to the loop that created them (see _ensure_loop)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+
+        self.waiting = 0
+        self.active = 0
+        self.admitted = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, submit: bool = True) -> AsyncIterator[float]:
+        """
+        Hold an operation slot for the duration of the block; yields the seconds spent queued.
+        `submit=False` (resumed operations that are already running remotely) skips the rate limit
+        but still counts against the concurrency limit.
+        """
+        waited = await self.acquire(submit)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    async def acquire(self, submit: bool = True) -> float:
+        self._ensure_loop()
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+            try:
+                if submit:
+                    await self._take_token()
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.active += 1
+        self.admitted += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited >= 1:
+            logger.info(f"⏳ Generation request waited {waited:.1f}s for rate limit / capacity")
+        return waited
+
+    async def try_acquire(self, submit: bool = True) -> bool:
+        """
+        Take a slot (and, with `submit`, a rate-limit token) only if both are free right now, without queueing
+        behind other requests; for optional extra submissions such as hedges. Release it with `release()`.
+        """
+        self._ensure_loop()
+        if self._slots.locked():
+            return False
+        if submit:
+            if self._token_lock.locked():
+                return False
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+        # Not locked, so this returns without waiting
+        await self._slots.acquire()
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": round(self.rate * 60, 2),
+            "max_concurrent_operations": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "avg_wait_seconds": round(self.total_wait_seconds / self.admitted, 2) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 2),
+        }
+
+    # Internals
+
+    async def _take_token(self) -> None:
+        # The lock makes token waiters queue in arrival order
+        async with self._token_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _ensure_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First use, or a new event loop (e.g. a sync wrapper's asyncio.run): start with fresh primitives
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._token_lock = asyncio.Lock()
+        self.active = 0
+        self.waiting = 0
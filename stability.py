@@ -7,13 +7,27 @@ ElevenLabs Conversational AI + Stability AI
 import os
 import json
 import asyncio
-import requests
+import functools
 import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, List, Optional
+import httpx
+import requests
 from dotenv import load_dotenv
 
+from downloads import AtomicVideoWriter, DownloadResult
+from faststart import make_faststart
+from image_cache import ASPECT_SIZES, ImagePreprocessor
+from previews import PreviewGenerator, preview_fields
+from resilience import Resilience
+from storage import VideoStorage, create_storage
+from video_catalog import VideoCatalog
+
 # ElevenLabs imports  
 from elevenlabs.client import ElevenLabs
 
@@ -29,6 +43,16 @@ STABILITY_API_KEY = os.getenv("STABILITY_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY") 
 ELEVENLABS_AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID")
 
+# Threads available for blocking file work (image reads, video writes), shared by all requests
+HTTP_EXECUTOR_WORKERS = int(os.getenv("STABILITY_HTTP_WORKERS", "8"))
+# Keep-alive connection pool shared by every Stability API call
+MAX_CONNECTIONS = int(os.getenv("STABILITY_MAX_CONNECTIONS", "20"))
+# Result polling: first check after POLL_MIN_INTERVAL, backing off (x1.5, jittered) up to POLL_MAX_INTERVAL
+POLL_MIN_INTERVAL = float(os.getenv("STABILITY_POLL_MIN_INTERVAL", "5"))
+POLL_MAX_INTERVAL = float(os.getenv("STABILITY_POLL_MAX_INTERVAL", "20"))
+GENERATION_TIMEOUT_SECONDS = float(os.getenv("STABILITY_GENERATION_TIMEOUT_SECONDS", "600"))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 if not all([STABILITY_API_KEY, ELEVENLABS_API_KEY]):
     raise ValueError("Missing required API keys in environment variables")
 
@@ -36,36 +60,109 @@ if not all([STABILITY_API_KEY, ELEVENLABS_API_KEY]):
 elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
 
 class VideoGenerator:
-    """Handles Stability AI video generation"""
+    """Handles Stability AI video generation (image-to-video): submit, poll the result, stream the MP4"""
     
-    def __init__(self):
+    def __init__(self, catalog: Optional[VideoCatalog] = None, storage: Optional[VideoStorage] = None, previews: Optional[PreviewGenerator] = None):
         self.api_key = STABILITY_API_KEY
         self.base_url = "https://api.stability.ai/v2beta/image-to-video"
-        
-    def generate_video(self, prompt: str, image_path: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        self.model_name = "stable-video-diffusion"
+        self.output_dir = Path("generated_videos")
+        self.output_dir.mkdir(exist_ok=True)
+        # Blocking file reads/writes run here so the webhook event loop stays responsive
+        self.executor = ThreadPoolExecutor(max_workers=HTTP_EXECUTOR_WORKERS, thread_name_prefix="stability-http")
+        # Retries with jittered backoff + circuit breaker for every Stability API call
+        self.resilience = Resilience("stability")
+        # Input images resized/encoded once per (content, size) and uploaded from this cache
+        self.images = ImagePreprocessor()
+        # Index of downloaded videos (shared with the Veo servers' listings)
+        self.catalog = catalog or VideoCatalog()
+        # Content-addressed, sharded video files (generated_videos/ab/cd/<sha256>.mp4) behind public IDs
+        self.store = self.catalog.store
+        # Where finished videos are published and linked from (local /videos or S3-compatible storage)
+        self.storage = storage or create_storage()
+        # Poster / preview / probe data for each downloaded video, built in worker processes
+        self.previews = previews or PreviewGenerator(self.catalog)
+        # Pooled keep-alive client, created per event loop (see http)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking HTTP / file call in the bounded executor so the event loop stays free."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    @property
+    def http(self) -> httpx.AsyncClient:
         """
-        Generate video using Stability AI API (image-to-video).
-        If image_path is provided, uploads the image as part of the request.
+        Shared HTTP client: connections (and their TLS sessions) are reused across calls.
+        It carries no credentials, so it is also safe for HEAD checks of arbitrary video URLs.
         """
-        url = f"{self.base_url}"
-        headers = {
-            "authorization": f"Bearer {self.api_key}"
-        }
-
-        files = {}
-        if image_path:
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http_loop is not loop:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(300, connect=10),
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            )
+            self._http_loop = loop
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @property
+    def _auth(self) -> Dict[str, str]:
+        return {"authorization": f"Bearer {self.api_key}"}
+
+    @staticmethod
+    async def _await(func, *args, **kwargs):
+        """Runner for Resilience.call around coroutine functions."""
+        return await func(*args, **kwargs)
+
+    async def _submit(self, image: Path, data: Dict[str, Any]) -> str:
+        # The multipart body is streamed from the (cached) file; the handle is closed on every path
+        with open(image, "rb") as upload:
+            response = await self.http.post(
+                self.base_url,
+                headers=self._auth,
+                files={"image": (image.name, upload)},
+                data={key: str(value) for key, value in data.items()},
+            )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def _fetch_result(self, generation_id: str, filepath: Path) -> Optional[DownloadResult]:
+        """
+        One check of the result endpoint. Returns None while the video is still being generated;
+        once it is ready, streams it to `filepath` (temp file + atomic rename) and returns the download.
+        """
+        url = f"{self.base_url}/result/{generation_id}"
+        async with self.http.stream("GET", url, headers={**self._auth, "accept": "video/*"}) as response:
+            if response.status_code == 202:
+                return None
+            if response.status_code != 200:
+                await response.aread()
+                response.raise_for_status()
+            writer = await self._run_blocking(AtomicVideoWriter, filepath)
             try:
-                files["image"] = open(image_path, "rb")
-            except Exception as e:
-                logger.error(f"Error opening image file: {e}")
-                return {
-                    "success": False,
-                    "error": f"Error opening image file: {e}",
-                    "prompt": prompt,
-                    "timestamp": datetime.now().isoformat()
-                }
-
-        # Use data for non-file parameters
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    await self._run_blocking(writer.write, chunk)
+                download = await self._run_blocking(writer.commit)
+            except BaseException:
+                await self._run_blocking(writer.abort)
+                raise
+            return download
+
+    async def generate_video_async(self, prompt: str, image_path: Optional[str] = None, progress: Optional[Callable[..., None]] = None, resume: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Generate a video using Stability AI image-to-video and download it to generated_videos/.
+        Returns the same shape as the Veo 2 generator (video_urls / local_paths).
+        `progress(variation, state, **info)` and `resume` (job.variations) work as for the Veo generators.
+        """
+        report = progress or (lambda *args, **kwargs: None)
+        previous = resume[0] if resume else {}
+        started_at = time.monotonic()
         data = {
             "seed": kwargs.get("seed", 0),
             "cfg_scale": kwargs.get("cfg_scale", 1.8),
@@ -73,46 +170,115 @@ class VideoGenerator:
             # You can add more parameters as needed
         }
 
-        try:
-            logger.info(f"Generating video with prompt: {prompt} and image: {image_path}")
-            response = requests.post(url, headers=headers, files=files if files else None, data=data, timeout=300)
-
-            if files:
-                files["image"].close()
+        def failure(error: str) -> Dict[str, Any]:
+            report(1, "failed", error=error)
+            return {"success": False, "error": error, "prompt": prompt, "timestamp": datetime.now().isoformat()}
 
-            response.raise_for_status()
-            result = response.json()
-            generation_id = result.get('id')
+        try:
+            if previous.get("state") == "completed" and previous.get("videos"):
+                # Already downloaded and catalogued by an earlier run: don't fetch a second copy
+                return {
+                    "success": True,
+                    "generation_id": previous.get("operation"),
+                    "video_urls": previous["videos"],
+                    "local_paths": previous.get("local_paths", []),
+                    "video_ids": previous.get("video_ids", []),
+                    "storage_keys": previous.get("storage_keys", []),
+                    "previews": previous.get("previews", []),
+                    "prompt": prompt,
+                    "parameters": data,
+                    "model": self.model_name,
+                    "timestamp": datetime.now().isoformat()
+                }
 
-            logger.info(f"Video generation started. Generation ID: {generation_id}")
+            if previous.get("operation") and previous.get("state") != "failed":
+                generation_id = previous["operation"]
+                logger.info(f"Resuming Stability generation {generation_id}")
+            elif not image_path:
+                return failure("Stability image-to-video needs an input image (image_path)")
+            else:
+                logger.info(f"Generating video with prompt: {prompt} and image: {image_path}")
+                image = await self._run_blocking(self.images.prepare, image_path, target_size(**kwargs))
+                generation_id = await self.resilience.submit("submit", self._await, self._submit, image, data)
+                logger.info(f"Video generation started. Generation ID: {generation_id}")
+                report(1, "generating", operation=generation_id, model=self.model_name)
+
+            filename = f"stability_video_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.mp4"
+            # Downloaded to staging, then moved to its content address in the store
+            filepath = self.store.staging_path(filename)
+            interval = POLL_MIN_INTERVAL
+            polls = 0
+            deadline = time.monotonic() + GENERATION_TIMEOUT_SECONDS
+            while True:
+                await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+                download = await self.resilience.call("result", self._await, self._fetch_result, generation_id, filepath)
+                polls += 1
+                if download is not None:
+                    break
+                report(1, "generating", polls=polls)
+                if time.monotonic() >= deadline:
+                    return failure(f"Video generation timed out after {GENERATION_TIMEOUT_SECONDS / 60:.0f} minutes")
+                interval = min(POLL_MAX_INTERVAL, interval * 1.5)
+
+            # Move the moov box to the front so browsers can start playback right away
+            download = await self._run_blocking(make_faststart, download)
+            download = await self._run_blocking(self.store.ingest, download)
+            logger.info(f"Video saved to: {download.path} ({download.size_mb:.2f} MB)")
+            try:
+                # Published to the storage backend (no-op for local storage; S3 uploads in parallel parts)
+                storage_key = await self._run_blocking(self.storage.publish, download)
+                await asyncio.to_thread(
+                    self.catalog.record, str(download.path), filename=filename, backend="stability", model=self.model_name,
+                    aspect_ratio=kwargs.get("aspect_ratio"), prompt=prompt, sha256=download.sha256, size_bytes=download.size_bytes,
+                    storage_key=storage_key
+                )
+            finally:
+                # Catalogued: retention may delete the blob again once nothing references it
+                self.store.release(download.path)
+            previews = [await self.previews.process(download.path, filename)]
+            video_urls = [self.storage.url(filename, storage_key)]
+            local_paths = [str(download.path)]
+            report(1, "completed", videos=video_urls, local_paths=local_paths, video_ids=[filename], storage_keys=[storage_key], previews=previews)
             return {
                 "success": True,
                 "generation_id": generation_id,
+                "video_urls": video_urls,
+                "local_paths": local_paths,
+                "video_ids": [filename],
+                "storage_keys": [storage_key],
+                "previews": previews,
                 "prompt": prompt,
                 "parameters": data,
+                "model": self.model_name,
+                "generation_time_minutes": round((time.monotonic() - started_at) / 60, 2),
                 "timestamp": datetime.now().isoformat()
             }
 
-        except requests.exceptions.RequestException as e:
+        except Exception as e:
             logger.error(f"Error generating video: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "prompt": prompt,
-                "timestamp": datetime.now().isoformat()
-            }
+            return failure(str(e))
+
+    def generate_video(self, prompt: str, image_path: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Blocking wrapper around generate_video_async for scripts and other sync callers."""
+        return asyncio.run(self.generate_video_async(prompt, image_path, **kwargs))
+
+def target_size(aspect_ratio: str = "16:9", width: Optional[int] = None, height: Optional[int] = None, **_) -> tuple:
+    """Upload size for a request: explicit width/height (quality presets) or the aspect ratio's default."""
+    if width and height:
+        return int(width), int(height)
+    return ASPECT_SIZES.get(aspect_ratio, ASPECT_SIZES["16:9"])
 
 # Initialize video generator
 video_gen = VideoGenerator()
 
 # Tool Functions - These are called by the webhook handler
 
-def generate_video_basic_tool(prompt: str) -> str:
-    """Generate a video from a text prompt using default settings."""
-    result = video_gen.generate_video(prompt)
+async def generate_video_basic_tool(prompt: str, image_path: str = "") -> str:
+    """Animate the image at `image_path` guided by a text prompt, using default settings."""
+    result = await video_gen.generate_video_async(prompt, image_path or None)
     return json.dumps(result, indent=2)
 
-def generate_video_advanced_tool(prompt: str, style: str = "cinematic", duration: str = "short", quality: str = "high") -> str:
+async def generate_video_advanced_tool(prompt: str, style: str = "cinematic", duration: str = "short", quality: str = "high", image_path: str = "") -> str:
     """Generate a video with advanced settings based on style preferences."""
     
     # Map style to parameters
@@ -153,13 +319,13 @@ def generate_video_advanced_tool(prompt: str, style: str = "cinematic", duration
     
     enhanced_prompt = style_prompts.get(style, prompt)
     
-    result = video_gen.generate_video(enhanced_prompt, **params)
+    result = await video_gen.generate_video_async(enhanced_prompt, image_path or None, **params)
     return json.dumps(result, indent=2)
 
 class VoiceVideoAgent:
     """Main orchestrator for voice-controlled video generation"""
     
-    def __init__(self):
+    def __init__(self, catalog: Optional[VideoCatalog] = None, storage: Optional[VideoStorage] = None, previews: Optional[PreviewGenerator] = None):
         self.agent_id = ELEVENLABS_AGENT_ID
         
     def create_agent_config(self) -> Dict[str, Any]:
@@ -193,12 +359,12 @@ Always be helpful, creative, and provide clear explanations of what you're doing
         tools = [
             {
                 "name": "generate_video_basic",
-                "description": "Generate a video from a text prompt using default settings",
+                "description": "Animate an image (image_path) into a video guided by a text prompt, using default settings",
                 "webhook_url": "http://localhost:8000/tools/generate_video_basic"
             },
             {
                 "name": "generate_video_advanced", 
-                "description": "Generate a video with specific style and quality settings",
+                "description": "Animate an image (image_path) into a video with specific style and quality settings",
                 "webhook_url": "http://localhost:8000/tools/generate_video_advanced"
             },
             {
@@ -264,7 +430,7 @@ async def start_webhook_server():
             # Call the actual functions directly (not the FastMCP wrapped versions)
             if tool_name == "generate_video_basic":
                 prompt = parameters.get("prompt", "")
-                result = video_gen.generate_video(prompt)
+                result = await video_gen.generate_video_async(prompt, parameters.get("image_path") or None)
                 result_json = json.dumps(result, indent=2)
                 
             elif tool_name == "generate_video_advanced":
@@ -310,13 +476,14 @@ async def start_webhook_server():
                 }
                 
                 enhanced_prompt = style_prompts.get(style, prompt)
-                result = video_gen.generate_video(enhanced_prompt, **params)
+                result = await video_gen.generate_video_async(enhanced_prompt, parameters.get("image_path") or None, **params)
                 result_json = json.dumps(result, indent=2)
                 
             elif tool_name == "get_video_status":
                 video_url = parameters.get("video_url", "")
                 try:
-                    response = requests.head(video_url, timeout=10)
+                    # Pooled keep-alive client: repeated checks against the same host reuse the connection
+                    response = await video_gen.http.head(video_url, timeout=10)
                     status = {
                         "video_url": video_url,
                         "status": "available" if response.status_code == 200 else "unavailable",
@@ -334,9 +501,28 @@ async def start_webhook_server():
                     }, indent=2)
                     
             elif tool_name == "list_recent_videos":
+                entries, next_cursor = await asyncio.to_thread(
+                    video_gen.catalog.list,
+                    limit=int(parameters.get("limit", 10)),
+                    cursor=parameters.get("cursor") or None,
+                    model=parameters.get("model") or "stability",
+                    since=parameters.get("since") or None,
+                    until=parameters.get("until") or None
+                )
                 recent_videos = {
-                    "message": "Recent videos would be listed here",
-                    "note": "In production, this would query a database of user's videos",
+                    "videos": [
+                        {
+                            "filename": entry["filename"],
+                            "url": video_gen.storage.url(entry["filename"], entry["storage_key"]),
+                            "size_mb": round(entry["size_bytes"] / (1024 * 1024), 2),
+                            "created": datetime.fromtimestamp(entry["created_at"]).isoformat(),
+                            "prompt": entry["prompt"],
+                            **preview_fields(entry)
+                        }
+                        for entry in entries
+                    ],
+                    "count": len(entries),
+                    "next_cursor": next_cursor,
                     "timestamp": datetime.now().isoformat()
                 }
                 result_json = json.dumps(recent_videos, indent=2)
@@ -352,12 +538,21 @@ async def start_webhook_server():
     
     @app.get("/health")
     async def health_check():
-        return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+        return {
+            "status": "healthy",
+            "resilience": video_gen.resilience.metrics(),
+            "image_cache": video_gen.images.stats(),
+            "previews": video_gen.previews.stats(),
+            "timestamp": datetime.now().isoformat()
+        }
     
     # Start server
     config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
     server = uvicorn.Server(config)
-    await server.serve()
+    try:
+        await server.serve()
+    finally:
+        await video_gen.aclose()
 
 async def main():
     """Main application entry point"""
@@ -389,16 +584,14 @@ def generate_video_from_image(image_path, seed=0, cfg_scale=1.8, motion_bucket_i
     headers = {
         "authorization": f"Bearer {STABILITY_API_KEY}"
     }
-    files = {
-        "image": open(image_path, "rb")
-    }
     data = {
         "seed": seed,
         "cfg_scale": cfg_scale,
         "motion_bucket_id": motion_bucket_id
     }
-    response = requests.post(url, headers=headers, files=files, data=data)
-    files["image"].close()
+    image = video_gen.images.prepare(image_path)
+    with open(image, "rb") as upload:
+        response = requests.post(url, headers=headers, files={"image": upload}, data=data)
 
     if response.status_code == 200:
         result = response.json()
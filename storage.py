@@ -0,0 +1,249 @@
+"""
+Video Storage
+Where published videos live and the URLs clients fetch them from: local disk (served by /videos) or an
+S3-compatible bucket with parallel multipart uploads and presigned / CDN URLs
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
+
+from downloads import DownloadResult
+
+try:  # boto3 is optional: only the S3 backend needs it
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+    Config = None
+    ClientError = None
+
+logger = logging.getLogger(__name__)
+
+# "local" (this server's /videos mount) or "s3" (any S3-compatible object store)
+VIDEO_STORAGE = os.getenv("VIDEO_STORAGE", "local").lower()
+# Public address of this server, used for /videos and /previews links
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
+
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+# Custom endpoint for S3-compatible stores (MinIO, R2, a local stand-in); unset = AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION") or None
+S3_PREFIX = os.getenv("S3_PREFIX", "videos/")
+# CDN / public bucket address; unset = presigned URLs
+S3_PUBLIC_BASE_URL = os.getenv("S3_PUBLIC_BASE_URL", "").rstrip("/")
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", str(24 * 3600)))
+S3_PART_SIZE = int(float(os.getenv("S3_PART_SIZE_MB", "8")) * 1024 * 1024)
+S3_MULTIPART_THRESHOLD = int(float(os.getenv("S3_MULTIPART_THRESHOLD_MB", "16")) * 1024 * 1024)
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+# S3 limits: parts other than the last must be at least 5 MiB, and an upload has at most 10,000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def local_url(video_id: str) -> str:
+    """The /videos link of a video on this server."""
+    return f"{PUBLIC_BASE_URL}/videos/{quote(video_id)}"
+
+
+class VideoStorage:
+    """
+    Interface for where videos are published once they are in the local store.
+
+    The download stage hands every finished video to `publish` and records the key it returns; tool
+    results, listings and the /videos mount get links from `url`. Keys are content addressed, so
+    videos with identical bytes share one stored object. A video without a key (local storage, or an
+    upload that failed) is served from this server's /videos mount.
+    """
+
+    name = "storage"
+    # True when the bytes are served from somewhere other than this server
+    remote = False
+
+    def put(self, download: DownloadResult) -> Optional[str]:
+        """Store a file of the local video store; returns its key (None when there is nothing to upload)."""
+        return None
+
+    def publish(self, download: DownloadResult) -> Optional[str]:
+        """`put` for a just-downloaded video: a failure is logged (the video stays served locally), not raised."""
+        try:
+            return self.put(download)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not publish {download.path} to {self.name} storage: {e}")
+            return None
+
+    def url(self, video_id: str, key: Optional[str] = None) -> str:
+        return local_url(video_id)
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class LocalStorage(VideoStorage):
+    """Videos stay in generated_videos/ and are served by /videos (and the optional sendfile server)."""
+
+    name = "local"
+
+
+class S3Storage(VideoStorage):
+    """
+    Videos uploaded to an S3-compatible bucket under `<prefix>ab/cd/<sha256>.mp4`.
+
+    Files at or above the multipart threshold go up in `part_size` parts, `concurrency` at a time.
+    Each part is read from the file by the worker that uploads it, so memory use is bounded by
+    `part_size * concurrency` whatever the video size; a failed upload is aborted so no orphaned
+    parts are billed. Objects that already exist (identical bytes) are not uploaded again.
+
+    Links are `S3_PUBLIC_BASE_URL/<key>` when a CDN or public bucket is configured, otherwise
+    presigned GETs valid for S3_PRESIGN_SECONDS. Set `endpoint_url` to use MinIO, R2 or a local
+    stand-in; credentials come from the usual boto3 sources (AWS_ACCESS_KEY_ID, profiles, roles).
+    Blocking; call it from an executor.
+    """
+
+    name = "s3"
+    remote = True
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: Optional[str] = S3_ENDPOINT_URL, region: Optional[str] = S3_REGION, prefix: str = S3_PREFIX, public_base_url: str = S3_PUBLIC_BASE_URL, part_size: int = S3_PART_SIZE, multipart_threshold: int = S3_MULTIPART_THRESHOLD, concurrency: int = S3_UPLOAD_CONCURRENCY, client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("VIDEO_STORAGE=s3 needs boto3 (pip install boto3)")
+            if not bucket:
+                raise RuntimeError("VIDEO_STORAGE=s3 needs S3_BUCKET")
+            # One connection per concurrent part, plus headroom for presigning / HEADs from other threads
+            client = boto3.client(
+                "s3", endpoint_url=endpoint_url, region_name=region,
+                config=Config(max_pool_connections=max(10, concurrency * 2), retries={"mode": "adaptive", "max_attempts": 5})
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_base_url = public_base_url.rstrip("/")
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.multipart_threshold = max(self.part_size, multipart_threshold)
+        self.concurrency = max(1, concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="s3-upload")
+        # Per-key [lock, users]: videos with identical bytes finishing together are uploaded once. An
+        # entry is dropped by its last user, so the dict only holds keys being published right now
+        self._key_locks: Dict[str, List] = {}
+        self._locks_lock = threading.Lock()
+        self.uploads = 0
+        self.skipped = 0
+        self.bytes_uploaded = 0
+        self.upload_seconds = 0.0
+
+    def key_for(self, sha256: str) -> str:
+        return f"{self.prefix}{sha256[:2]}/{sha256[2:4]}/{sha256}.mp4"
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put(self, download: DownloadResult) -> Optional[str]:
+        key = self.key_for(download.sha256)
+        with self._locks_lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if self._exists(key):
+                    self.skipped += 1
+                    return key
+                self._upload(download, key)
+                return key
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def _upload(self, download: DownloadResult, key: str) -> None:
+        started = time.perf_counter()
+        extra = {"ContentType": "video/mp4", "Metadata": {"sha256": download.sha256}}
+        if download.size_bytes < self.multipart_threshold:
+            with open(download.path, "rb") as body:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=body, **extra)
+        else:
+            self._multipart(download, key, extra)
+        elapsed = time.perf_counter() - started
+        self.uploads += 1
+        self.bytes_uploaded += download.size_bytes
+        self.upload_seconds += elapsed
+        logger.info(f"☁️ Uploaded {download.path.name} ({download.size_mb:.2f} MB) to s3://{self.bucket}/{key} in {elapsed:.2f}s")
+
+    def _multipart(self, download: DownloadResult, key: str, extra: Dict[str, Any]) -> None:
+        size = download.size_bytes
+        part_size = max(self.part_size, math.ceil(size / MAX_PARTS))
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra)["UploadId"]
+        fd = os.open(download.path, os.O_RDONLY)
+
+        def upload_part(number: int) -> Dict[str, Any]:
+            offset = (number - 1) * part_size
+            body = os.pread(fd, min(part_size, size - offset), offset)
+            response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+            return {"PartNumber": number, "ETag": response["ETag"]}
+
+        try:
+            parts = list(self._executor.map(upload_part, range(1, math.ceil(size / part_size) + 1)))
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+        except BaseException:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not abort multipart upload of {key}: {e}")
+            raise
+        finally:
+            os.close(fd)
+
+    def url(self, video_id: str, key: Optional[str] = None) -> str:
+        if key is None:
+            return local_url(video_id)
+        if self.public_base_url:
+            return f"{self.public_base_url}/{quote(key)}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket, "Key": key,
+                # Downloads are named by the video ID rather than the content hash
+                "ResponseContentDisposition": f'inline; filename="{video_id}"',
+            },
+            ExpiresIn=S3_PRESIGN_SECONDS
+        )
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "bucket": self.bucket,
+            "endpoint": S3_ENDPOINT_URL,
+            "uploads": self.uploads,
+            "already_stored": self.skipped,
+            "uploaded_mb": round(self.bytes_uploaded / (1024 * 1024), 2),
+            "upload_mbps": round(self.bytes_uploaded * 8 / 1e6 / self.upload_seconds, 1) if self.upload_seconds else None,
+        }
+
+
+def create_storage(backend: str = VIDEO_STORAGE) -> VideoStorage:
+    """The storage backend selected by VIDEO_STORAGE."""
+    if backend == "s3":
+        storage = S3Storage()
+        logger.info(f"☁️ Publishing videos to s3://{storage.bucket}/{storage.prefix} ({S3_ENDPOINT_URL or 'AWS'})")
+        return storage
+    if backend != "local":
+        logger.warning(f"⚠️ Unknown VIDEO_STORAGE={backend!r}, storing videos locally")
+    return LocalStorage()
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from google.genai import types
+
+from download_stage import COMPLETED, EXPIRED, FAILED, DownloadExpired, DownloadFailed, DownloadStage, DownloadTask
+from job_store import JobStore
+from resilience import CircuitOpenError
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def make_task(name="video_1.mp4"):
+    return DownloadTask(f"operations/1:{name}", "veo3", "operations/1", 0, types.Video(uri=f"files/{name}"), name)
+
+
+def make_stage(*answers, store=None, lookup_expiry=None):
+    """A stage whose process() raises the queued errors, then saves the video."""
+    answers = list(answers)
+    calls = []
+
+    async def process(task):
+        calls.append(task.attempts)
+        if answers:
+            raise answers.pop(0)
+        return {"filename": task.filename}
+
+    stage = DownloadStage("veo3", process, lookup_expiry, store=store, workers=2, retry_base=0.01, retry_max=0.02)
+    return stage, calls
+
+
+def download(stage, task):
+    async def run():
+        return await (await stage.submit(task))
+    return asyncio.run(run())
+
+
+def test_transient_errors_and_an_open_breaker_are_retried():
+    stage, calls = make_stage(ApiError(503), CircuitOpenError("veo3-downloads", 1), ConnectionResetError())
+    assert download(stage, make_task()) == {"filename": "video_1.mp4"}
+    assert calls == [1, 2, 3, 4]
+    assert stage.stats()["retries"] == 3
+    assert stage.stats()["recovered_after_retry"] == 1
+
+
+def test_permanent_errors_fail_right_away(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    stage, calls = make_stage(ApiError(400), store=store)
+    task = make_task()
+    with pytest.raises(DownloadFailed, match="HTTP 400"):
+        download(stage, task)
+    assert calls == [1]
+    store.flush()
+    row = store.load_download(task.download_id)
+    assert row["state"] == FAILED
+    assert "HTTP 400" in row["error"]
+
+    # Submitting it again reports the failure instead of downloading again
+    with pytest.raises(DownloadFailed):
+        download(make_stage(store=store)[0], make_task())
+    store.close()
+
+
+def test_a_file_the_provider_dropped_expires_the_download():
+    async def gone(task):
+        raise DownloadExpired("file deleted")
+
+    stage, calls = make_stage(ApiError(503), lookup_expiry=gone)
+    with pytest.raises(DownloadExpired):
+        download(stage, make_task())
+    assert calls == [1]
+    assert stage.stats()["expired"] == 1
+
+
+def test_retries_stop_at_the_provider_deadline():
+    async def expiring(task):
+        return datetime.now(timezone.utc) + timedelta(milliseconds=5)
+
+    stage, _ = make_stage(*[ApiError(503)] * 100, lookup_expiry=expiring)
+    with pytest.raises(DownloadExpired):
+        download(stage, make_task())
+
+
+def test_completed_downloads_are_not_fetched_again(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    stage, _ = make_stage(store=store)
+    download(stage, make_task())
+    store.flush()
+    assert store.load_download(make_task().download_id)["state"] == COMPLETED
+
+    stage, calls = make_stage(store=store)
+    assert download(stage, make_task()) == {"filename": "video_1.mp4"}
+    assert calls == []
+    store.close()
+
+
+def test_pending_downloads_resume_after_a_restart(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    task = make_task()
+    task.attempts = 2
+    store.save_download(task.to_record())
+    store.save_download({**make_task("inline.mp4").to_record(), "video": {"uri": None, "mime_type": None}})
+    store.flush()
+
+    stage, calls = make_stage(store=store)
+
+    async def resume():
+        resumed = await stage.resume_pending()
+        await stage._futures[task.download_id]
+        return resumed
+
+    assert asyncio.run(resume()) == 1
+    assert calls == [3]
+    store.flush()
+    assert store.load_download(task.download_id)["state"] == COMPLETED
+    assert store.load_download(make_task("inline.mp4").download_id)["state"] == EXPIRED
+    store.close()
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+import httpx
+import pytest
+
+from downloads import READ_SIZE, DownloadVerificationError, RangedDownloader
+from research.range_server import RangeServer
+
+ERROR, DROP = 0.5, 0.25  # the server's fault rates, only used to tell its two fault checks apart
+
+
+@pytest.fixture
+def data():
+    return os.urandom(6 * READ_SIZE)
+
+
+@pytest.fixture
+def downloader():
+    # One connection: ranges are requested in order, so faults can be aimed at given requests
+    downloader = RangedDownloader(connections=1, chunk_size=READ_SIZE)
+    yield downloader
+    downloader.http.close()
+    downloader._executor.shutdown()
+
+
+def faulty_server(data, faults):
+    """A RangeServer that injects `faults` ({request number: "drop" | "503" | callable}) instead of random ones."""
+    server = RangeServer(data, error_rate=ERROR, drop_rate=DROP)
+
+    def fault(rate):
+        with server._lock:
+            planned = faults.get(server.requests)
+        if callable(planned):
+            planned(server)
+            return False
+        return (rate == ERROR and planned == "503") or (rate == DROP and planned == "drop")
+
+    server._fault = fault
+    server.start()
+    return server
+
+
+def test_fetch_resumes_from_the_sidecar_after_drops_and_503s(tmp_path, data, downloader):
+    # 1: size probe, 2: range 0 cut off mid-body, 3: range 0 again, 4: range 1, 5-7: range 2 answered 503 until it gives up
+    faults = {2: "drop", 5: "503", 6: "503", 7: "503"}
+    server = faulty_server(data, faults)
+    target = tmp_path / "video.mp4"
+    sidecar = tmp_path / ".video.mp4.part.json"
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            downloader.fetch(server.url, {}, target, len(data), digest)
+        assert not target.exists()
+        done = json.loads(sidecar.read_text())["done"]
+        # Ranges 0 and 1 made it; range 3 may have started before the failure stopped the queue
+        assert {0, READ_SIZE} <= set(done) and 2 * READ_SIZE not in done
+
+        # What the retry layer does: call again with the same target
+        faults.clear()
+        result = downloader.fetch(server.url, {}, target, len(data), digest)
+    finally:
+        server.stop()
+
+    assert result.sha256 == digest and result.size_bytes == len(data)
+    assert hashlib.sha256(target.read_bytes()).hexdigest() == digest
+    assert not sidecar.exists() and not (tmp_path / ".video.mp4.part").exists()
+    stats = downloader.stats()
+    assert stats["resumed"] == 1 and stats["reused_mb"] == round(len(done) * READ_SIZE / (1024 * 1024), 2)
+    assert stats["failed_ranges"] == 4
+
+
+def test_file_changing_mid_download_fails_verification(tmp_path, data, downloader):
+    def replace_file(server):
+        server.etag = '"new-version"'  # If-Range no longer matches: the server answers 200 with the whole file
+
+    server = faulty_server(data, {2: replace_file})
+    target = tmp_path / "video.mp4"
+    try:
+        with pytest.raises(DownloadVerificationError, match="answered with 200"):
+            downloader.fetch(server.url, {}, target, len(data))
+    finally:
+        server.stop()
+    assert not target.exists()
+
+
+def test_wrong_checksum_discards_the_partial_file(tmp_path, data, downloader):
+    server = faulty_server(data, {})
+    target = tmp_path / "video.mp4"
+    try:
+        with pytest.raises(DownloadVerificationError, match="sha256"):
+            downloader.fetch(server.url, {}, target, len(data), "0" * 64)
+    finally:
+        server.stop()
+    assert list(tmp_path.iterdir()) == []
+    assert downloader.stats()["verification_failures"] == 1
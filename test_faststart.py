@@ -0,0 +1,113 @@
+import hashlib
+import struct
+
+import pytest
+
+from downloads import DownloadResult
+from faststart import Box, make_faststart, needs_faststart, parse_boxes, rewrite, shift_chunk_offsets, top_level_boxes
+
+
+def box(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I4s", len(body) + 8, kind) + body
+
+
+def moov(offsets, wide=False) -> bytes:
+    table = struct.pack(f">I{len(offsets)}{'Q' if wide else 'I'}", len(offsets), *offsets)
+    chunk_offsets = box(b"co64" if wide else b"stco", b"\0\0\0\0" + table)
+    stbl = box(b"stbl", box(b"stsz", bytes(12)) + chunk_offsets)
+    trak = box(b"trak", box(b"tkhd", bytes(84)) + box(b"mdia", box(b"minf", stbl)))
+    return box(b"moov", box(b"mvhd", bytes(100)) + trak)
+
+
+def chunk(number: int) -> bytes:
+    return f"<chunk {number:03d}>".encode() * 8
+
+
+def mp4_moov_last(tmp_path, chunks=3, trailing_mdat=False, wide=False):
+    """
+    ftyp, mdat, moov (and optionally a second mdat after it) with stco entries pointing at each chunk.
+    Returns the path and the chunks in chunk offset table order.
+    """
+    ftyp = box(b"ftyp", b"isom\0\0\2\0isomiso2mp41")
+    offsets, media, chunks_in_order = [], b"", []
+    for i in range(chunks):
+        offsets.append(len(ftyp) + 8 + len(media))
+        media += chunk(i)
+        chunks_in_order.append(chunk(i))
+    mdat = box(b"mdat", media)
+    late = box(b"mdat", chunk(99)) if trailing_mdat else b""
+    if trailing_mdat:
+        moov_size = len(moov(offsets + [0], wide))
+        offsets.append(len(ftyp) + len(mdat) + moov_size + 8)
+        chunks_in_order.append(chunk(99))
+    data = ftyp + mdat + moov(offsets, wide) + late
+    path = tmp_path / "video.mp4"
+    path.write_bytes(data)
+    return path, chunks_in_order
+
+
+def chunk_offsets(path):
+    with open(path, "rb") as f:
+        boxes = top_level_boxes(f)
+        moov_box = next(b for b in boxes if b.kind == b"moov")
+        f.seek(moov_box.offset + 8)
+        children = parse_boxes(f.read(moov_box.size - 8))
+    stbl = children[1].children[1].children[0].children[0]
+    table = stbl.children[1]
+    count = struct.unpack_from(">I", table.payload, 4)[0]
+    return table.kind, list(struct.unpack_from(f">{count}{'Q' if table.kind == b'co64' else 'I'}", table.payload, 8))
+
+
+def assert_offsets_point_at_chunks(path, chunks):
+    data = path.read_bytes()
+    _, offsets = chunk_offsets(path)
+    assert len(offsets) == len(chunks)
+    for offset, content in zip(offsets, chunks):
+        assert data[offset:offset + len(content)] == content
+
+
+@pytest.mark.parametrize("wide", [False, True])
+def test_rewrite_moves_moov_first_and_shifts_chunk_offsets(tmp_path, wide):
+    path, chunks = mp4_moov_last(tmp_path, wide=wide)
+    assert needs_faststart(path)
+    size, sha256 = rewrite(path)
+
+    with open(path, "rb") as f:
+        assert [b.kind for b in top_level_boxes(f)] == [b"ftyp", b"moov", b"mdat"]
+    assert not needs_faststart(path)
+    assert size == path.stat().st_size
+    assert sha256 == hashlib.sha256(path.read_bytes()).hexdigest()
+    assert_offsets_point_at_chunks(path, chunks)
+
+
+def test_media_after_the_old_moov_shifts_by_the_difference(tmp_path):
+    path, chunks = mp4_moov_last(tmp_path, trailing_mdat=True)
+    rewrite(path)
+    with open(path, "rb") as f:
+        assert [b.kind for b in top_level_boxes(f)] == [b"ftyp", b"moov", b"mdat", b"mdat"]
+    assert_offsets_point_at_chunks(path, chunks)
+
+
+def test_offsets_past_4gb_turn_stco_into_co64():
+    table = box(b"stco", b"\0\0\0\0" + struct.pack(">I2I", 2, 100, 0xFFFFFF00))
+    moov_box = Box(b"moov", children=parse_boxes(box(b"trak", box(b"mdia", box(b"minf", box(b"stbl", table))))))
+    shift_chunk_offsets(moov_box, lambda offset: offset + 0x1000)
+    stco = moov_box.children[0].children[0].children[0].children[0].children[0]
+    assert stco.kind == b"co64"
+    assert struct.unpack_from(">I2Q", stco.payload, 4) == (2, 100 + 0x1000, 0xFFFFFF00 + 0x1000)
+
+
+def test_make_faststart_leaves_faststarted_and_unparseable_files_alone(tmp_path):
+    path, _ = mp4_moov_last(tmp_path)
+    rewrite(path)
+    download = DownloadResult(path, path.stat().st_size, "abc")
+    assert make_faststart(download) is download
+
+    junk = tmp_path / "junk.mp4"
+    junk.write_bytes(b"\0\0\0\x02xxxx")
+    download = DownloadResult(junk, junk.stat().st_size, "def")
+    assert make_faststart(download) is download
+
+    path, _ = mp4_moov_last(tmp_path)
+    faststarted = make_faststart(DownloadResult(path, path.stat().st_size, "stale"))
+    assert faststarted.sha256 == hashlib.sha256(path.read_bytes()).hexdigest()
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from hedging import HedgePolicy
+
+
+def operation(error=None):
+    return SimpleNamespace(done=True, error=error)
+
+
+def test_no_threshold_until_enough_samples_or_when_disabled():
+    policy = HedgePolicy(enabled=True, percentile=0.9, min_samples=3)
+    policy.record_latency(10)
+    policy.record_latency(20)
+    assert policy.threshold() is None
+
+    policy.record_latency(30)
+    assert policy.threshold() is not None
+
+    disabled = HedgePolicy(enabled=False, min_samples=1)
+    disabled.record_latency(10)
+    assert disabled.threshold() is None
+
+
+def test_threshold_is_the_configured_percentile_of_recent_latencies():
+    policy = HedgePolicy(enabled=True, percentile=0.9, min_samples=1)
+    for seconds in range(1, 101):
+        policy.record_latency(seconds)
+    assert policy.threshold() == 91
+
+    policy.percentile = 0.5
+    assert policy.threshold() == 51
+
+
+def test_hedges_stay_within_the_budget():
+    policy = HedgePolicy(enabled=True, budget=0.1)
+    for _ in range(20):
+        policy.record_submission()
+
+    assert policy.try_hedge() and policy.try_hedge()
+    assert not policy.try_hedge()
+    assert policy.stats()["hedges"] == 2 and policy.stats()["skipped_over_budget"] == 1
+
+    # A hedge that found no capacity gives its share of the budget back
+    policy.release_no_capacity()
+    assert policy.try_hedge()
+    assert policy.stats()["skipped_no_capacity"] == 1
+
+
+def race(policy, primary_outcome, hedge_outcome, hedge_first=True):
+    abandoned, wins = [], []
+
+    async def finish(outcome, delay):
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def main():
+        primary = asyncio.ensure_future(finish(primary_outcome, 0.05 if hedge_first else 0.01))
+        hedge = asyncio.ensure_future(finish(hedge_outcome, 0.01 if hedge_first else 0.05))
+        pending = {primary: ("primary-key", "operations/primary"), hedge: ("hedge-key", "operations/hedge")}
+        result = await policy.race(pending, 0.0, abandoned.append, lambda key, name: wins.append((key, name)))
+        return result, primary, hedge
+
+    (final, key), primary, hedge = asyncio.run(main())
+    return final, key, primary, hedge, abandoned, wins
+
+
+def test_winning_hedge_repoints_the_operation_and_abandons_the_primary():
+    policy = HedgePolicy(enabled=True)
+    won = operation()
+
+    final, key, primary, _, abandoned, wins = race(policy, operation(), won)
+
+    assert final is won and key == "hedge-key"
+    assert wins == [("hedge-key", "operations/hedge")]
+    assert abandoned == ["operations/primary"] and primary.cancelled()
+    assert policy.stats()["hedge_wins"] == 1
+
+
+def test_primary_finishing_first_abandons_the_hedge():
+    policy = HedgePolicy(enabled=True)
+    won = operation()
+
+    final, key, _, hedge, abandoned, wins = race(policy, won, operation(), hedge_first=False)
+
+    assert final is won and key == "primary-key"
+    assert wins == [] and abandoned == ["operations/hedge"] and hedge.cancelled()
+
+
+def test_a_failed_hedge_leaves_the_primary_to_finish():
+    policy = HedgePolicy(enabled=True)
+    won = operation()
+
+    final, key, _, _, abandoned, wins = race(policy, won, operation(error="hedge failed"))
+
+    assert final is won and key == "primary-key"
+    assert wins == [] and abandoned == []
+
+
+def test_when_both_fail_the_primary_outcome_is_returned():
+    policy = HedgePolicy(enabled=True)
+    failed = operation(error="primary failed")
+
+    final, key, _, _, _, wins = race(policy, failed, operation(error="hedge failed"))
+    assert final is failed and key == "primary-key" and wins == []
+
+    with pytest.raises(RuntimeError, match="primary"):
+        race(policy, RuntimeError("primary"), RuntimeError("hedge"))
@@ -0,0 +1,46 @@
+import os
+import shutil
+import time
+
+import image_cache
+from image_cache import ImagePreprocessor
+
+
+def copying_preprocessor(tmp_path, monkeypatch, max_bytes):
+    """An ImagePreprocessor whose resize is a plain copy, so the cache logic runs without Pillow."""
+    monkeypatch.setattr(ImagePreprocessor, "_resize", staticmethod(lambda source, target, size: shutil.copyfile(source, target)))
+    images = ImagePreprocessor(str(tmp_path / "cache"), max_bytes=max_bytes)
+    images.enabled = True
+    return images
+
+
+def source_image(tmp_path, name, size=1000):
+    path = tmp_path / name
+    path.write_bytes(name.encode() * (size // len(name)))
+    return str(path)
+
+
+def test_the_cache_directory_stays_under_budget(tmp_path, monkeypatch):
+    images = copying_preprocessor(tmp_path, monkeypatch, max_bytes=2500)
+    first = images.prepare(source_image(tmp_path, "a.png"))
+    second = images.prepare(source_image(tmp_path, "b.png"))
+    old = time.time() - 60
+    os.utime(first, (old, old))
+    os.utime(second, (old - 60, old - 60))
+
+    assert images.prepare(source_image(tmp_path, "a.png")) == first  # a hit makes `first` the most recent
+    third = images.prepare(source_image(tmp_path, "c.png"))
+
+    assert first.exists() and third.exists()
+    assert not second.exists()
+    assert images.stats()["evicted"] == 1
+    assert images.stats()["cache_bytes"] <= 2500
+    assert images._locks == {}
+
+
+def test_hash_memo_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "MAX_HASH_ENTRIES", 3)
+    images = ImagePreprocessor(str(tmp_path / "cache"))
+    for i in range(5):
+        images.content_hash(source_image(tmp_path, f"{i}.png"))
+    assert len(images._hashes) == 3
@@ -0,0 +1,56 @@
+from job_store import JobStore
+
+
+def job_record(job_id, state="running", **fields):
+    return {
+        "job_id": job_id, "tool": "generate_video", "parameters": {"prompt": "a cat"}, "state": state,
+        "variations": [], "result": None, "error": None,
+        "created_at": "2026-01-01T00:00:00", "updated_at": "2026-01-01T00:00:00", **fields
+    }
+
+
+def download_record(download_id, state="pending", **fields):
+    return {
+        "download_id": download_id, "backend": "veo3", "operation_name": "op1", "video_index": 0,
+        "video": {"uri": "files/1"}, "filename": f"{download_id}.mp4", "api_key": None, "variation": 1,
+        "metadata": {}, "state": state, "attempts": 0, "error": None, "expires_at": None, "result": None,
+        "created_at": "2026-01-01T00:00:00", "updated_at": "2026-01-01T00:00:00", **fields
+    }
+
+
+def test_jobs_round_trip_and_collapse_to_the_latest_update(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.save_job(job_record("job1"))
+    store.save_job(job_record("job1", state="completed", result={"videos": 1}))
+    store.save_job(job_record("job2"))
+    store.flush()
+
+    assert store.load_job("job1")["state"] == "completed"
+    assert store.load_job("job1")["result"] == {"videos": 1}
+    assert [job["job_id"] for job in store.unfinished_jobs()] == ["job2"]
+    store.close()
+
+
+def test_operations_keep_their_state_history(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.save_operation("operations/1", "job1", 1, "veo-3", {}, "running")
+    store.save_operation("operations/1", "job1", 1, "veo-3", {}, "failed", error="quota")
+    store.flush()
+
+    assert [event["state"] for event in store.operation_history("operations/1")] == ["running", "failed"]
+    store.close()
+
+
+def test_a_bad_row_only_loses_itself(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.save_download(download_record("good1"))
+    store.save_download(download_record("bad", filename=None))  # violates NOT NULL
+    store.save_job(job_record("job1"))
+    store.save_download(download_record("good2"))
+    store.flush()
+
+    assert store.load_download("bad") is None
+    assert store.load_job("job1") is not None
+    assert [row["download_id"] for row in store.pending_downloads("veo3")] == ["good1", "good2"]
+    assert sorted(store.pending_download_files()) == ["good1.mp4", "good2.mp4"]
+    store.close()
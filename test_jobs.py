@@ -0,0 +1,97 @@
+import asyncio
+
+from job_store import JobStore
+from jobs import COMPLETED, FAILED, JobManager
+
+
+def run_job(manager, run, **kwargs):
+    async def main():
+        job = manager.submit("generate_video", {"prompt": "a cat"}, run, **kwargs)
+        await job.task
+        return job
+    return asyncio.run(main())
+
+
+def test_operations_are_persisted_when_they_change_without_a_state_change(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    manager = JobManager(store=store)
+
+    async def generate(job):
+        job.update_variation(1, "generating", operation="operations/primary", model="veo-3")
+        # The hedge wins: same state, different operation
+        job.update_variation(1, "generating", operation="operations/hedge", model="veo-3-fast")
+        job.update_variation(1, "completed")
+        return {"success": True}
+
+    job = run_job(manager, generate)
+    store.flush()
+
+    assert job.state == COMPLETED
+    assert [event["state"] for event in store.operation_history("operations/primary")] == ["generating"]
+    assert [event["state"] for event in store.operation_history("operations/hedge")] == ["generating", "completed"]
+    store.close()
+
+
+def test_identical_requests_share_one_job():
+    manager = JobManager()
+    started = []
+
+    async def generate(job):
+        started.append(job.job_id)
+        await asyncio.sleep(0.01)
+        return {"success": True}
+
+    async def main():
+        first = manager.submit("generate_video", {"prompt": "a cat"}, generate, dedupe_key="a cat")
+        second = manager.submit("generate_video", {"prompt": "a cat"}, generate, dedupe_key="a cat")
+        await first.task
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first is second and first.job_id == second.job_id
+    assert len(started) == 1
+    assert manager.coalesced == 1
+    assert manager.inflight == {}
+
+
+def test_a_request_after_the_job_finished_starts_a_new_job():
+    manager = JobManager()
+    started = []
+
+    async def generate(job):
+        started.append(job.job_id)
+        return {"success": True}
+
+    async def main():
+        first = manager.submit("generate_video", {"prompt": "a cat"}, generate, dedupe_key="a cat")
+        await first.task
+        second = manager.submit("generate_video", {"prompt": "a cat"}, generate, dedupe_key="a cat")
+        await second.task
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.job_id != second.job_id
+    assert started == [first.job_id, second.job_id]
+    assert manager.coalesced == 0
+
+
+def test_a_failure_reaches_every_coalesced_caller():
+    manager = JobManager()
+
+    async def generate(job):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def main():
+        job_ids = [
+            manager.submit("generate_video", {"prompt": "a cat"}, generate, dedupe_key="a cat").job_id
+            for _ in range(3)
+        ]
+        await manager.get(job_ids[0]).task
+        return job_ids
+
+    job_ids = asyncio.run(main())
+    assert len(set(job_ids)) == 1 and manager.coalesced == 2
+    for job_id in job_ids:
+        status = manager.get(job_id).to_dict()
+        assert status["status"] == FAILED and status["error"] == "provider down"
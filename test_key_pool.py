@@ -0,0 +1,128 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from key_pool import AUTH_ERROR, QUOTA_ERROR, KEY_REQUESTS_PER_MINUTE, ApiKey, ApiKeyPool, classify_key_error
+
+
+class ApiError(Exception):
+    def __init__(self, code, status=""):
+        super().__init__(f"HTTP {code} {status}")
+        self.code = code
+        self.status = status
+
+
+class FakeClient:
+    """Stands in for genai.Client: generate_videos returns an operation or raises the queued error."""
+
+    def __init__(self, name, errors=()):
+        self.name = name
+        self.errors = list(errors)
+        self.calls = 0
+        self.models = SimpleNamespace(generate_videos=self.generate_videos)
+
+    def generate_videos(self, **request):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"operation-from-{self.name}"
+
+
+async def run(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def pool_of(*clients, rpm=10, **kwargs):
+    return ApiKeyPool([ApiKey(f"key-{client.name}", rpm, client=client) for client in clients], **kwargs)
+
+
+def test_from_env_parses_key_and_requests_per_minute(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEYS", "first-key:30, second-key ,")
+    pool = ApiKeyPool.from_env()
+
+    assert [key.label for key in pool.keys] == ["…-key", "…-key"]
+    assert [key.requests_per_minute for key in pool.keys] == [30, KEY_REQUESTS_PER_MINUTE]
+    assert pool.keys[0].key_id != pool.keys[1].key_id
+
+
+def test_from_env_falls_back_to_the_single_key(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEYS", raising=False)
+    monkeypatch.setenv("GEMINI_API_KEY", "only-key")
+    assert len(ApiKeyPool.from_env().keys) == 1
+
+
+def test_classify_key_error():
+    assert classify_key_error(ApiError(429)) == QUOTA_ERROR
+    assert classify_key_error(ApiError(400, "RESOURCE_EXHAUSTED")) == QUOTA_ERROR
+    assert classify_key_error(ApiError(403)) == AUTH_ERROR
+    assert classify_key_error(ApiError(500)) is None
+
+
+def test_acquire_picks_the_key_with_the_most_quota_left():
+    a, b = FakeClient("a"), FakeClient("b")
+    pool = ApiKeyPool([ApiKey("key-a", 3, client=a), ApiKey("key-b", 2, client=b)])
+
+    picked = [pool.acquire().client.name for _ in range(5)]
+
+    assert picked.count("a") == 3 and picked.count("b") == 2
+    assert picked[0] == "a"
+
+
+def test_acquire_avoids_the_given_key_while_another_is_usable():
+    pool = pool_of(FakeClient("a"), FakeClient("b"))
+    first = pool.keys[0]
+    assert pool.acquire(avoid=first) is pool.keys[1]
+
+
+def test_quota_error_rests_the_key_and_tries_the_next_one():
+    a, b = FakeClient("a", errors=[ApiError(429)]), FakeClient("b")
+    pool = pool_of(a, b, rpm=10)
+    pool.keys[1]._recent.append(time.monotonic())  # b has less quota left, so a is tried first
+
+    operation, key = asyncio.run(pool.generate_videos(run, model="veo"))
+
+    assert operation == "operation-from-b" and key is pool.keys[1]
+    assert (a.calls, b.calls) == (1, 1)
+    stats = {entry["label"]: entry for entry in pool.stats()}
+    assert stats["…ey-a"]["cooldown_reason"] == QUOTA_ERROR and stats["…ey-a"]["quota_errors"] == 1
+    # The rested key is skipped by the next submission
+    assert pool.acquire() is pool.keys[1]
+
+
+def test_auth_error_rotates_to_another_key():
+    a, b = FakeClient("a", errors=[ApiError(401)]), FakeClient("b")
+    pool = pool_of(a, b)
+
+    _, key = asyncio.run(pool.generate_videos(run))
+
+    assert key is pool.keys[1]
+    assert pool.keys[0].auth_errors == 1 and pool.keys[0].cooldown_reason == AUTH_ERROR
+
+
+def test_other_errors_are_raised_without_rotating():
+    a, b = FakeClient("a", errors=[ApiError(400)]), FakeClient("b")
+    pool = pool_of(a, b)
+
+    with pytest.raises(ApiError):
+        asyncio.run(pool.generate_videos(run))
+    assert b.calls == 0 and pool.keys[0].other_errors == 1
+    assert pool.keys[0].cooldown_reason is None
+
+
+def test_every_key_cooling_down_uses_the_one_that_recovers_first():
+    pool = pool_of(FakeClient("a"), FakeClient("b"), quota_cooldown=60, auth_cooldown=900)
+    pool.report_error(pool.keys[0], ApiError(403))
+    pool.report_error(pool.keys[1], ApiError(429))
+
+    assert pool.acquire() is pool.keys[1]
+
+
+def test_last_key_error_is_raised_when_every_key_fails():
+    a, b = FakeClient("a", errors=[ApiError(429)]), FakeClient("b", errors=[ApiError(429)])
+    pool = pool_of(a, b)
+
+    with pytest.raises(ApiError):
+        asyncio.run(pool.generate_videos(run))
+    assert (a.calls, b.calls) == (1, 1)
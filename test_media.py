@@ -0,0 +1,87 @@
+import http.client
+import threading
+import time
+
+import pytest
+
+from media import MediaFiles, MediaServer, parse_range
+
+
+@pytest.mark.parametrize("value, span", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=0-0", (0, 0)),
+])
+def test_parse_range(value, span):
+    assert parse_range(value, 1000) == span
+
+
+@pytest.mark.parametrize("value", ["bytes=0-9,20-29", "items=0-9", "bytes=abc-", "bytes=-", "bytes=50-10", "bytes 0-9"])
+def test_parse_range_ignores_ranges_it_does_not_serve(value):
+    assert parse_range(value, 1000) is None
+
+
+@pytest.mark.parametrize("value", ["bytes=1000-", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable_ranges(value):
+    with pytest.raises(ValueError):
+        parse_range(value, 1000)
+
+
+def video_files(tmp_path):
+    (tmp_path / "clip.mp4").write_bytes(bytes(range(256)) * 4)
+    return MediaFiles(str(tmp_path))
+
+
+def test_respond_plans_partial_conditional_and_unsatisfiable_responses(tmp_path):
+    files = video_files(tmp_path)
+    media = files.lookup("clip.mp4")
+
+    partial = files.respond(media, "GET", {"range": "bytes=10-19"})
+    assert (partial.status, partial.offset, partial.length) == (206, 10, 10)
+    assert partial.headers["content-range"] == "bytes 10-19/1024"
+
+    assert files.respond(media, "GET", {"if-none-match": media.etag}).status == 304
+    assert files.respond(media, "GET", {"range": "bytes=5000-"}).status == 416
+    # A stale If-Range validator gets the whole file
+    assert files.respond(media, "GET", {"range": "bytes=10-19", "if-range": '"old"'}).status == 200
+    assert files.respond(None, "GET", {}).status == 404
+    assert files.lookup("../clip.mp4") is None
+
+
+def test_media_server_serves_ranges_and_keeps_slow_lookups_off_its_loop(tmp_path):
+    files = video_files(tmp_path)
+    lookup = files.lookup
+
+    def slow_lookup(filename):
+        if filename == "slow.mp4":
+            time.sleep(0.5)
+        return lookup(filename)
+
+    files.lookup = slow_lookup
+    server = MediaServer(files, host="127.0.0.1", port=0)
+    server.start()
+    try:
+        def get(path, headers=None):
+            conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+            conn.request("GET", path, headers=headers or {})
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            return response.status, body
+
+        slow = threading.Thread(target=get, args=("/videos/slow.mp4",))
+        slow.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        status, body = get("/videos/clip.mp4", {"range": "bytes=256-259"})
+        elapsed = time.monotonic() - started
+        slow.join()
+
+        assert status == 206
+        assert body == bytes([0, 1, 2, 3])
+        assert elapsed < 0.4  # not stuck behind the slow lookup
+    finally:
+        server.stop()
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from poller import OperationPoller
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Resilience
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def operation(name="operations/op1", done=False):
+    return SimpleNamespace(name=name, done=done, error=None, response=None)
+
+
+class FakeClient:
+    """operations.get answers with the queued results (an exception is raised) and then `done`."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.polls = 0
+        self.operations = SimpleNamespace(get=self.get)
+
+    def get(self, op):
+        self.polls += 1
+        answer = self.answers.pop(0) if self.answers else operation(op.name, done=True)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def make_poller(breaker=None, **kwargs):
+    resilience = Resilience("test", breaker=breaker or CircuitBreaker("test"))
+    return OperationPoller(min_interval=0.01, max_interval=0.02, expected_seconds=0.01, resilience=resilience, **kwargs)
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60  # reset period over: the next call is the probe
+    return breaker
+
+
+def test_wait_polls_until_done():
+    client = FakeClient(operation(), operation())
+    poller = make_poller()
+    final = asyncio.run(poller.wait(operation(), client))
+    assert final.done
+    assert client.polls == 3
+    assert poller.stats()["completed"] == 1
+
+
+def test_transient_errors_are_retried():
+    client = FakeClient(ApiError(503), ApiError(503))
+    poller = make_poller()
+    assert asyncio.run(poller.wait(operation(), client)).done
+    assert poller.resilience.metrics()["calls"]["operations.get"]["retries"] == 2
+
+
+def test_permanent_error_fails_the_operation():
+    client = FakeClient(ApiError(404))
+    with pytest.raises(ApiError):
+        asyncio.run(make_poller().wait(operation(), client))
+    assert client.polls == 1
+
+
+def test_timeout_returns_the_last_snapshot():
+    client = FakeClient(*[operation() for _ in range(100)])
+    final = asyncio.run(make_poller(timeout_seconds=0.05).wait(operation(), client))
+    assert not final.done
+
+
+def test_permanent_error_on_half_open_probe_closes_the_breaker():
+    breaker = half_open_breaker()
+    client = FakeClient(ApiError(404))
+    with pytest.raises(ApiError):
+        asyncio.run(make_poller(breaker).wait(operation(), client))
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_transient_error_on_half_open_probe_reopens_the_breaker():
+    breaker = half_open_breaker()
+    client = FakeClient(ApiError(503))
+    poller = make_poller(breaker)
+
+    async def probe_once():
+        future = poller.track(operation(), client)
+        await asyncio.sleep(0.05)  # the probe fails; the next poll waits for the breaker's reset
+        state = breaker.state
+        poller.abandon("operations/op1")
+        return state, future
+
+    state, _ = asyncio.run(probe_once())
+    assert state == OPEN
+
+
+def test_cancelled_probe_releases_the_breaker():
+    breaker = half_open_breaker()
+
+    async def cancel_probe():
+        started = asyncio.Event()
+
+        class SlowOps:
+            def get(self, op):
+                loop.call_soon_threadsafe(started.set)
+                time.sleep(0.2)
+                return operation(op.name, done=True)
+
+        loop = asyncio.get_running_loop()
+        poller = make_poller(breaker)
+        poller.track(operation(), SimpleNamespace(operations=SlowOps()))
+        await started.wait()
+        for poll in list(poller._polls_in_flight):
+            poll.cancel()
+        await asyncio.sleep(0)
+
+    asyncio.run(cancel_probe())
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_second_caller_gets_its_own_future_timeout_and_callback():
+    client = FakeClient(*[operation() for _ in range(5)])
+    poller = make_poller()
+    polls = {"first": [], "second": []}
+
+    async def main():
+        first = poller.track(operation(), client, on_poll=lambda op, n: polls["first"].append(n))
+        second = poller.track(operation(), client, timeout=0.0, on_poll=lambda op, n: polls["second"].append(n))
+        assert first is not second
+        assert not (await second).done  # its own (immediate) timeout: the last snapshot
+        return await first
+
+    assert asyncio.run(main()).done
+    assert polls["first"] == [1, 2, 3, 4, 5, 6] and polls["second"] == []
+    assert client.polls == 6  # one poll schedule for both callers
+    stats = poller.stats()
+    assert stats["completed"] == 1 and stats["timed_out"] == 1 and stats["in_flight"] == 0
+
+
+def test_cancelling_one_caller_keeps_polling_for_the_other():
+    client = FakeClient(operation(), operation())
+    poller = make_poller()
+
+    async def main():
+        first = poller.track(operation(), client)
+        second = poller.track(operation(), client)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()).done
+    assert client.polls == 3
+
+
+def test_polling_stops_once_every_caller_is_gone():
+    client = FakeClient(*[operation() for _ in range(100)])
+    poller = make_poller()
+
+    async def main():
+        waiters = [poller.track(operation(), client) for _ in range(2)]
+        await asyncio.sleep(0.03)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.sleep(0.05)  # a poll already under way may still finish
+        polls = client.polls
+        await asyncio.sleep(0.1)
+        return polls
+
+    assert asyncio.run(main()) == client.polls > 0
+    assert poller.stats()["in_flight"] == 0
@@ -0,0 +1,61 @@
+import asyncio
+import struct
+
+import pytest
+
+import previews
+from previews import PreviewGenerator
+from video_catalog import VideoCatalog
+
+
+def box(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I4s", len(body) + 8, kind) + body
+
+
+def mp4(seconds=8, width=1280, height=720, frames=192) -> bytes:
+    """ftyp, mdat and a moov with one H.264 video track: just enough for `probe`."""
+    timescale = 1000
+    mvhd = box(b"mvhd", struct.pack(">4xIIII", 0, 0, timescale, seconds * timescale) + bytes(80))
+    tkhd = box(b"tkhd", bytes(76) + struct.pack(">II", width << 16, height << 16))
+    mdhd = box(b"mdhd", struct.pack(">4xIIII", 0, 0, timescale, seconds * timescale) + bytes(4))
+    hdlr = box(b"hdlr", bytes(8) + b"vide" + bytes(12))
+    stsd = box(b"stsd", struct.pack(">4xII4s", 1, 16, b"avc1"))
+    stsz = box(b"stsz", struct.pack(">4xII", 0, frames))
+    mdia = box(b"mdia", mdhd + hdlr + box(b"minf", box(b"stbl", stsd + stsz)))
+    moov = box(b"moov", mvhd + box(b"trak", tkhd + mdia))
+    return box(b"ftyp", b"isom\0\0\2\0isomiso2mp41") + box(b"mdat", b"\0" * 64) + moov
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return VideoCatalog(str(tmp_path / "catalog.db"), str(tmp_path / "videos"))
+
+
+@pytest.fixture
+def generator(tmp_path, catalog, monkeypatch):
+    monkeypatch.setattr(previews.shutil, "which", lambda binary: None)  # probe data only, with or without ffmpeg here
+    return PreviewGenerator(catalog, preview_dir=str(tmp_path / "previews"))
+
+
+def test_process_returns_probe_fields_and_annotates_the_catalog(catalog, generator):
+    path = catalog.video_dir / "veo3_a.mp4"
+    path.write_bytes(mp4())
+    catalog.add(str(path), filename=path.name)
+
+    fields = asyncio.run(generator.process(path))
+
+    assert fields == {
+        "poster_url": None, "preview_url": None,
+        "duration_seconds": 8.0, "width": 1280, "height": 720, "codec": "avc1",
+    }
+    entry = catalog.get(path.name)
+    assert (entry["duration_seconds"], entry["width"], entry["height"], entry["codec"]) == (8.0, 1280, 720, "avc1")
+    assert generator.stats()["processed"] == 1
+
+
+def test_unreadable_video_is_counted_as_failed(catalog, generator):
+    path = catalog.video_dir / "broken.mp4"
+    path.write_bytes(b"not an mp4")
+
+    assert asyncio.run(generator.process(path)) == {}
+    assert generator.stats()["failed"] == 1 and generator.stats()["processed"] == 0
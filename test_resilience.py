@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import pytest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, PERMANENT, TRANSIENT, CircuitBreaker, CircuitOpenError, Resilience, classify_error, was_not_accepted
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+async def run(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def fail(error):
+    def call():
+        raise error
+    return call
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60  # reset period over: the next call is the probe
+    return breaker
+
+
+def test_classify_error():
+    assert classify_error(ApiError(503)) == TRANSIENT
+    assert classify_error(ConnectionResetError()) == TRANSIENT
+    assert classify_error(ApiError(400)) == PERMANENT
+    assert classify_error(ValueError("bad request")) == PERMANENT
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_reset():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.is_open()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()  # the probe
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = half_open_breaker()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 0
+
+    breaker = half_open_breaker()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+
+def test_released_probe_lets_the_next_call_probe():
+    breaker = half_open_breaker()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_call_retries_transient_errors():
+    resilience = Resilience("test", max_attempts=3, base_delay=0, max_delay=0)
+    answers = [ApiError(503), ApiError(502), "ok"]
+
+    def flaky():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert asyncio.run(resilience.call("op", run, flaky)) == "ok"
+    assert resilience.metrics()["calls"]["op"]["retries"] == 2
+    assert resilience.breaker.state == CLOSED
+
+
+def test_was_not_accepted():
+    class ConnectTimeout(Exception):
+        pass
+
+    class ReadTimeout(Exception):
+        pass
+
+    assert was_not_accepted(ApiError(503)) and was_not_accepted(ApiError(429))
+    assert was_not_accepted(ConnectionRefusedError()) and was_not_accepted(ConnectTimeout())
+    assert not was_not_accepted(ApiError(504))
+    assert not was_not_accepted(ReadTimeout()) and not was_not_accepted(ConnectionResetError())
+
+
+def test_submit_retries_only_failures_that_were_not_accepted():
+    resilience = Resilience("test", max_attempts=3, base_delay=0, max_delay=0)
+    answers = [ApiError(503), "operation"]
+
+    def flaky():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert asyncio.run(resilience.submit("submit", run, flaky)) == "operation"
+    assert resilience.metrics()["calls"]["submit"]["retries"] == 1
+
+    # The request may have reached the provider: submitting again could start a second generation
+    with pytest.raises(TimeoutError):
+        asyncio.run(resilience.submit("submit", run, fail(TimeoutError())))
+    counts = resilience.metrics()["calls"]["submit"]
+    assert counts["attempts"] == 3 and counts["not_retried"] == 1
+    assert resilience.breaker.consecutive_failures == 1
+
+
+def test_call_raises_permanent_errors_without_retrying():
+    resilience = Resilience("test", max_attempts=3, base_delay=0, max_delay=0)
+    with pytest.raises(ApiError):
+        asyncio.run(resilience.call("op", run, fail(ApiError(400))))
+    assert resilience.metrics()["calls"]["op"]["attempts"] == 1
+    assert resilience.breaker.consecutive_failures == 0
+
+
+def test_call_fails_fast_while_open():
+    resilience = Resilience("test", max_attempts=1, breaker=CircuitBreaker("test", failure_threshold=1, reset_seconds=60))
+    with pytest.raises(ApiError):
+        asyncio.run(resilience.call("op", run, fail(ApiError(503))))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(resilience.call("op", run, lambda: "ok"))
+
+
+def test_permanent_error_on_probe_closes_the_breaker():
+    resilience = Resilience("test", max_attempts=1, breaker=half_open_breaker())
+    with pytest.raises(ApiError):
+        asyncio.run(resilience.call("op", run, fail(ApiError(404))))
+    assert resilience.breaker.state == CLOSED
+
+
+def test_cancelled_probe_is_released():
+    resilience = Resilience("test", max_attempts=1, breaker=half_open_breaker())
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(resilience.call("op", hang, None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert resilience.breaker.state == HALF_OPEN
+    assert resilience.breaker.allow()
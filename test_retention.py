@@ -0,0 +1,79 @@
+import os
+import time
+
+from downloads import DownloadResult
+from image_cache import file_sha256
+from job_store import JobStore
+from retention import STALE_TEMP_SECONDS, RetentionManager
+from video_catalog import VideoCatalog
+
+
+def age(path, seconds):
+    when = time.time() - seconds
+    os.utime(path, (when, when))
+
+
+def download_record(filename, state="pending"):
+    now = "2026-01-01T00:00:00"
+    return {
+        "download_id": f"op1:{filename}", "backend": "veo3", "operation_name": "op1", "video_index": 0,
+        "video": {}, "filename": filename, "api_key": None, "variation": 1, "metadata": {}, "state": state,
+        "attempts": 1, "error": None, "expires_at": None, "result": None, "created_at": now, "updated_at": now,
+    }
+
+
+def test_compact_keeps_the_partial_files_of_pending_downloads(tmp_path):
+    catalog = VideoCatalog(str(tmp_path / "catalog.db"), str(tmp_path / "videos"))
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.save_download(download_record("pending.mp4"))
+    store.save_download(download_record("done.mp4", state="completed"))
+    store.flush()
+
+    incoming = catalog.store.incoming
+    kept = [".pending.mp4.part", ".pending.mp4.part.json", ".pending.mp4.0badc0de.part", "pending.mp4"]
+    removed = [".done.mp4.part", ".done.mp4.part.json", "crashed.mp4"]
+    for name in kept + removed:
+        (incoming / name).write_bytes(b"x")
+        age(incoming / name, STALE_TEMP_SECONDS + 60)
+    (incoming / ".fresh.mp4.part").write_bytes(b"x")
+
+    result = RetentionManager(catalog, job_store=store, preview_dir=str(tmp_path / "previews")).compact()
+
+    assert result["temp_files"] == len(removed)
+    assert sorted(os.listdir(incoming)) == sorted(kept + [".fresh.mp4.part"])
+    store.close()
+
+
+def blob_download(store, content=b"same bytes"):
+    staged = store.staging_path(f"video_{len(list(store.incoming.iterdir()))}.mp4")
+    staged.write_bytes(content)
+    return DownloadResult(staged, len(content), file_sha256(staged))
+
+
+def test_removing_a_video_keeps_a_blob_being_ingested_with_the_same_bytes(tmp_path):
+    catalog = VideoCatalog(str(tmp_path / "catalog.db"), str(tmp_path / "videos"))
+    store = catalog.store
+    first = store.ingest(blob_download(store))
+    catalog.add(str(first.path), filename="old.mp4")
+    store.release(first.path)
+
+    # A new video with the same bytes lands before it is catalogued ...
+    second = store.ingest(blob_download(store))
+    assert second.path == first.path
+    # ... while retention removes the old one
+    RetentionManager(catalog, preview_dir=str(tmp_path / "previews"))._remove([catalog.get("old.mp4")])
+    assert second.path.exists()
+
+    catalog.add(str(second.path), filename="new.mp4")
+    store.release(second.path)
+    assert catalog.get("new.mp4") is not None
+
+
+def test_reconcile_skips_blobs_still_being_catalogued(tmp_path):
+    catalog = VideoCatalog(str(tmp_path / "catalog.db"), str(tmp_path / "videos"))
+    download = catalog.store.ingest(blob_download(catalog.store))
+    assert catalog.reconcile(grace_seconds=0)["added"] == 0
+    catalog.store.release(download.path)
+    assert catalog.reconcile()["added"] == 0  # younger than the grace period
+    age(download.path, 3600)
+    assert catalog.reconcile()["added"] == 1
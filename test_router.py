@@ -0,0 +1,126 @@
+import asyncio
+import random
+
+import pytest
+
+from router import MIN_SAMPLES, BackendRouter, VideoBackend
+
+
+class StubBackend(VideoBackend):
+    def __init__(self, name, expected_seconds=100.0, up=True, success=True, **capabilities):
+        self.name = name
+        self.expected_seconds = expected_seconds
+        self.up = up
+        self.success = success
+        self.calls = 0
+        for attribute, value in capabilities.items():
+            setattr(self, attribute, value)
+
+    def available(self):
+        return self.up
+
+    async def generate(self, request, progress=None, resume=None):
+        self.calls += 1
+        if progress:
+            progress(1, "generating")
+        return {"success": self.success}
+
+
+def router_with(*backends, **kwargs):
+    router = BackendRouter(explore_rate=0.0, **kwargs)
+    for backend in backends:
+        router.register(backend)
+    return router
+
+
+def record(router, name, seconds, successes, failures=0):
+    for _ in range(successes):
+        router.stats[name].record(seconds, True)
+    for _ in range(failures):
+        router.stats[name].record(seconds, False)
+
+
+def test_score_is_p50_inflated_by_the_error_rate():
+    router = router_with(StubBackend("fast", expected_seconds=50), error_penalty=4)
+    assert router.score("fast") == 50  # no samples yet: the expected latency
+
+    record(router, "fast", 20, successes=3, failures=1)
+    assert router.score("fast") == pytest.approx(20 * (1 + 4 * 0.25))
+
+
+def test_lowest_score_wins():
+    router = router_with(StubBackend("a"), StubBackend("b"))
+    record(router, "a", 90, successes=5)
+    record(router, "b", 60, successes=4, failures=1)  # 60 * 1.8 = 108
+
+    assert router.choose({"prompt": "x"}).name == "a"
+    assert router.decisions[-1]["reason"] == "lowest score"
+
+
+def test_degraded_backends_are_skipped_unless_nothing_else_can_serve():
+    router = router_with(StubBackend("flaky", expected_seconds=10), StubBackend("slow", expected_seconds=500), degraded_error_rate=0.5)
+    record(router, "flaky", 10, successes=MIN_SAMPLES - 3, failures=3)
+
+    assert router.is_degraded("flaky")
+    assert router.choose({"prompt": "x"}).name == "slow"
+    assert router.decisions[-1]["reason"] == "lowest score (degraded backends skipped)"
+
+    # Only the degraded backend takes image input: it still gets the request
+    router.backends["flaky"].image_input = True
+    assert router.choose({"prompt": "x", "image_path": "in.png"}).name == "flaky"
+
+
+def test_a_backend_with_an_open_breaker_counts_as_degraded():
+    router = router_with(StubBackend("down", expected_seconds=10, up=False), StubBackend("up", expected_seconds=500))
+    assert router.choose({"prompt": "x"}).name == "up"
+
+
+def test_requests_no_backend_can_serve_are_rejected():
+    router = router_with(StubBackend("veo", aspect_ratios=("16:9",)))
+    with pytest.raises(ValueError, match="aspect ratio"):
+        router.choose({"prompt": "x", "aspect_ratio": "1:1"})
+
+
+def test_exploration_sends_some_requests_to_another_healthy_backend(monkeypatch):
+    router = router_with(StubBackend("best", expected_seconds=10), StubBackend("other", expected_seconds=100))
+    router.explore_rate = 0.5
+    monkeypatch.setattr(random, "random", lambda: 0.1)
+
+    assert router.choose({"prompt": "x"}).name == "other"
+    assert router.decisions[-1]["reason"] == "exploration"
+
+    monkeypatch.setattr(random, "random", lambda: 0.9)
+    assert router.choose({"prompt": "x"}).name == "best"
+
+
+def test_resumed_jobs_stay_on_their_backend():
+    router = router_with(StubBackend("fast", expected_seconds=10), StubBackend("slow", expected_seconds=500))
+    assert router.choose({"prompt": "x"}, resume=[{"backend": "slow"}]).name == "slow"
+    assert router.decisions[-1]["reason"] == "resume"
+
+
+def test_generate_records_outcomes_and_tags_results():
+    ok, failing = StubBackend("ok", expected_seconds=10), StubBackend("failing", expected_seconds=1, success=False)
+    router = router_with(ok, failing)
+    progress = []
+
+    result = asyncio.run(router.generate({"prompt": "x"}, progress=lambda *args, **info: progress.append(info)))
+
+    assert result == {"success": False, "backend": "failing"}
+    assert progress == [{"backend": "failing"}]
+    assert router.stats["failing"].error_rate() == 1.0 and router.stats["failing"].in_flight == 0
+
+
+def test_snapshot():
+    router = router_with(StubBackend("veo", expected_seconds=10), StubBackend("stability", text_input=False, image_input=True))
+    record(router, "veo", 30, successes=3, failures=1)
+    router.choose({"prompt": "x"})
+
+    snapshot = router.snapshot()
+
+    veo = snapshot["backends"]["veo"]
+    assert veo["samples"] == 4 and veo["p50_seconds"] == 30 and veo["error_rate"] == 0.25
+    assert veo["score"] == round(router.score("veo"), 2) and not veo["degraded"]
+    assert snapshot["backends"]["stability"]["image_input"] and not snapshot["backends"]["stability"]["text_input"]
+    decision = snapshot["recent_decisions"][-1]
+    assert decision["backend"] == "veo" and decision["rejected"] == {"stability": "needs an input image"}
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+from scheduler import GenerationScheduler
+
+
+def test_concurrency_is_capped_and_slots_are_released():
+    scheduler = GenerationScheduler(requests_per_minute=60000, burst=100, max_concurrent=2)
+    running, peak = 0, 0
+
+    async def generate():
+        nonlocal running, peak
+        async with scheduler.slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(generate() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert scheduler.stats()["admitted"] == 6
+    assert scheduler.stats()["active"] == 0
+
+
+def test_submissions_past_the_burst_wait_for_tokens():
+    scheduler = GenerationScheduler(requests_per_minute=600, burst=2, max_concurrent=10)  # a token every 0.1s
+
+    async def main():
+        started = time.monotonic()
+        waits = [await scheduler.acquire() for _ in range(4)]
+        return waits, time.monotonic() - started
+
+    waits, elapsed = asyncio.run(main())
+    assert waits[0] < 0.05 and waits[1] < 0.05
+    assert elapsed == pytest.approx(0.2, abs=0.08)
+
+
+def test_resumed_operations_skip_the_rate_limit():
+    scheduler = GenerationScheduler(requests_per_minute=1, burst=1, max_concurrent=10)
+
+    async def main():
+        await scheduler.acquire()
+        return await asyncio.wait_for(scheduler.acquire(submit=False), 0.5)
+
+    assert asyncio.run(main()) < 0.1
+
+
+def test_a_cancelled_waiter_gives_its_slot_back():
+    scheduler = GenerationScheduler(requests_per_minute=1, burst=1, max_concurrent=1)
+
+    async def main():
+        await scheduler.acquire()
+        scheduler.release()
+        waiter = asyncio.ensure_future(scheduler.acquire())  # holds the slot, waits for a token
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await asyncio.wait_for(scheduler.acquire(submit=False), 0.5)
+
+    asyncio.run(main())
+    assert scheduler.stats()["waiting"] == 0
+
+
+def test_try_acquire_only_takes_free_capacity():
+    scheduler = GenerationScheduler(requests_per_minute=1, burst=1, max_concurrent=2)
+
+    async def main():
+        assert await scheduler.try_acquire()  # the only token
+        assert not await scheduler.try_acquire()  # slot free, but no token
+        assert await scheduler.try_acquire(submit=False)
+        assert not await scheduler.try_acquire(submit=False)  # both slots taken
+        scheduler.release()
+        scheduler.release()
+
+    asyncio.run(main())
+    assert scheduler.stats()["active"] == 0 and scheduler.stats()["admitted"] == 2
+
+
+def test_works_across_event_loops():
+    scheduler = GenerationScheduler(requests_per_minute=60000, burst=10, max_concurrent=1)
+
+    async def once():
+        async with scheduler.slot():
+            pass
+
+    asyncio.run(once())
+    asyncio.run(once())
+    assert scheduler.stats()["admitted"] == 2
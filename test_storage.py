@@ -0,0 +1,51 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from downloads import DownloadResult
+from storage import S3Storage
+
+botocore = pytest.importorskip("botocore.exceptions")
+
+
+class FakeS3:
+    """head_object / put_object against a dict; uploads are slow enough for publishes to overlap."""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+        self.lock = threading.Lock()
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise botocore.ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {}
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        data = Body.read()
+        time.sleep(0.02)
+        with self.lock:
+            self.puts += 1
+            self.objects[Key] = data
+
+
+def test_identical_videos_published_together_are_uploaded_once(tmp_path):
+    path = Path(tmp_path / "video.mp4")
+    path.write_bytes(b"video bytes")
+    download = DownloadResult(path, path.stat().st_size, "ab" * 32)
+    client = FakeS3()
+    storage = S3Storage(bucket="videos", client=client)
+
+    keys = []
+    threads = [threading.Thread(target=lambda: keys.append(storage.put(download))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.puts == 1
+    assert set(keys) == {storage.key_for(download.sha256)}
+    assert storage.skipped == 7
+    assert storage._key_locks == {}
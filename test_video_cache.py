@@ -0,0 +1,71 @@
+import os
+
+from video_cache import GenerationCache, make_cache_key
+
+
+def video(tmp_path, name, size=100):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return {"filename": name, "local_path": str(path)}
+
+
+def cache_entry(cache, key, tmp_path, *names, backend="veo3", model="veo-3"):
+    cache.store(key, "a prompt", "16:9", "dont_allow", model, backend, [video(tmp_path, name) for name in names])
+
+
+def test_cache_key_ignores_case_and_whitespace_of_the_prompt():
+    key = make_cache_key("A  cat\non a\tboat ", "16:9", "dont_allow", "veo-3", "veo3")
+
+    assert key == make_cache_key("a cat on a boat", "16:9", "dont_allow", "veo-3", "veo3")
+    assert key != make_cache_key("a cat on a boat", "9:16", "dont_allow", "veo-3", "veo3")
+    assert key != make_cache_key("a cat on a boat", "16:9", "allow_adult", "veo-3", "veo3")
+    # Same model name, different backend: a separate entry
+    assert key != make_cache_key("a cat on a boat", "16:9", "dont_allow", "veo-3", "veo2")
+
+
+def test_lookup_returns_the_first_key_with_enough_videos_and_its_producer(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache.db"))
+    cache_entry(cache, "veo2-key", tmp_path, "a.mp4", "b.mp4", backend="veo2", model="veo-2")
+
+    cached = cache.lookup(["veo3-key", "veo2-key"], n_videos=2)
+
+    assert cached["backend"] == "veo2" and cached["model"] == "veo-2"
+    assert [entry["filename"] for entry in cached["videos"]] == ["a.mp4", "b.mp4"]
+    assert cache.lookup(["veo2-key"], n_videos=3) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lookup_forgets_an_entry_whose_files_are_gone(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache.db"))
+    cache_entry(cache, "key", tmp_path, "a.mp4")
+    os.unlink(tmp_path / "a.mp4")
+
+    assert cache.lookup(["key"]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_eviction_drops_least_recently_used_entries_through_remove_videos(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache.db"), budget_bytes=250)
+    removed = []
+    cache.remove_videos = lambda videos: removed.extend(entry["filename"] for entry in videos)
+    cache_entry(cache, "old", tmp_path, "old.mp4")
+    cache_entry(cache, "used", tmp_path, "used.mp4")
+    assert cache.lookup(["old"])  # now the most recently used
+
+    cache_entry(cache, "new", tmp_path, "new.mp4")
+
+    assert removed == ["used.mp4"]
+    assert cache.lookup(["used"]) is None
+    assert cache.lookup(["old"]) and cache.lookup(["new"])
+    assert cache.stats()["size_mb"] == round(200 / (1024 * 1024), 2)
+
+
+def test_entries_within_the_budget_are_kept(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache.db"), budget_bytes=300)
+    removed = []
+    cache.remove_videos = removed.extend
+    cache_entry(cache, "one", tmp_path, "a.mp4", "b.mp4")
+    cache_entry(cache, "two", tmp_path, "c.mp4")
+
+    assert cache.evict_to_budget() == 0
+    assert removed == [] and cache.stats()["entries"] == 2
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import pytest
+
+from video_catalog import VideoCatalog, decode_cursor, search_terms
+
+DAY = 24 * 3600
+START = datetime(2026, 3, 1).timestamp()
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return VideoCatalog(str(tmp_path / "catalog.db"), str(tmp_path / "videos"))
+
+
+def add_video(catalog, name, created_at, **metadata):
+    path = catalog.video_dir / name
+    path.write_bytes(b"video")
+    catalog.add(str(path), filename=name, created_at=created_at, **metadata)
+    return path
+
+
+def names(videos):
+    return [video["filename"] for video in videos]
+
+
+def test_pages_follow_the_cursor_newest_first(catalog):
+    for i in range(5):
+        add_video(catalog, f"v{i}.mp4", START + i)
+
+    first, cursor = catalog.list(limit=2)
+    second, cursor = catalog.list(limit=2, cursor=cursor)
+    last, end = catalog.list(limit=2, cursor=cursor)
+
+    assert names(first) == ["v4.mp4", "v3.mp4"]
+    assert names(second) == ["v2.mp4", "v1.mp4"]
+    assert names(last) == ["v0.mp4"] and end is None
+
+
+def test_exactly_full_last_page_has_no_next_cursor(catalog):
+    for i in range(4):
+        add_video(catalog, f"v{i}.mp4", START + i)
+
+    _, cursor = catalog.list(limit=2)
+    page, end = catalog.list(limit=2, cursor=cursor)
+    assert names(page) == ["v1.mp4", "v0.mp4"] and end is None
+
+
+def test_cursor_is_stable_across_inserts_and_ties(catalog):
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        add_video(catalog, name, START)  # same timestamp: the filename breaks the tie
+
+    first, cursor = catalog.list(limit=2)
+    assert names(first) == ["c.mp4", "b.mp4"] and decode_cursor(cursor) == (START, "b.mp4")
+
+    # A newer video lands between the two requests: the next page neither repeats nor skips anything
+    add_video(catalog, "new.mp4", START + 10)
+    rest, end = catalog.list(limit=2, cursor=cursor)
+    assert names(rest) == ["a.mp4"] and end is None
+
+
+def test_deleted_files_are_dropped_without_shortening_the_page(catalog):
+    for i in range(4):
+        add_video(catalog, f"v{i}.mp4", START + i)
+    (catalog.video_dir / "v2.mp4").unlink()
+
+    page, cursor = catalog.list(limit=2)
+
+    assert names(page) == ["v3.mp4", "v1.mp4"] and cursor is not None
+    assert catalog.get("v2.mp4") is None
+
+
+def test_list_filters_by_model_or_backend_aspect_ratio_and_dates(catalog):
+    add_video(catalog, "veo3_a.mp4", START, model="veo-3.0", aspect_ratio="16:9")
+    add_video(catalog, "gemini_b.mp4", START + DAY, model="veo-2.0", aspect_ratio="9:16")
+    add_video(catalog, "stability_c.mp4", START + 2 * DAY, model="stable-video-diffusion", aspect_ratio="16:9")
+
+    assert names(catalog.list(model="veo-2.0")[0]) == ["gemini_b.mp4"]
+    assert names(catalog.list(model="veo3")[0]) == ["veo3_a.mp4"]  # backend from the filename prefix
+    assert names(catalog.list(aspect_ratio="16:9")[0]) == ["stability_c.mp4", "veo3_a.mp4"]
+    assert names(catalog.list(since="2026-03-02")[0]) == ["stability_c.mp4", "gemini_b.mp4"]
+    assert names(catalog.list(since="2026-03-02", until="2026-03-03")[0]) == ["gemini_b.mp4"]
+
+
+def test_search_terms_drop_stop_words_and_punctuation():
+    assert search_terms("Find the OCEAN clips we made last week!") == ["ocean"]
+    # Nothing but stop words: search for them rather than for nothing
+    assert search_terms("the video") == ["the", "video"]
+
+
+def test_search_matches_every_word_with_stemming_and_prefixes(catalog):
+    add_video(catalog, "surf.mp4", START, prompt="Surfers riding waves at sunset")
+    add_video(catalog, "city.mp4", START + 1, prompt="A city at night")
+    add_video(catalog, "dog.mp4", START + 2, prompt="A dog riding a skateboard")
+
+    assert names(catalog.search("surfer ride wave")) == ["surf.mp4"]
+    assert names(catalog.search("sun")) == ["surf.mp4"]
+    assert set(names(catalog.search("show me the videos of riding"))) == {"surf.mp4", "dog.mp4"}
+    assert catalog.search("surfers city") == []
+
+
+def test_search_ranks_better_matches_first(catalog):
+    if not catalog.full_text:
+        pytest.skip("SQLite built without FTS5")
+    add_video(catalog, "once.mp4", START + 1, prompt="ocean waves crashing on rocks near the lighthouse by the cliffs")
+    add_video(catalog, "often.mp4", START, prompt="ocean ocean ocean")
+
+    assert names(catalog.search("ocean")) == ["often.mp4", "once.mp4"]
+
+
+def test_search_combines_text_and_filters(catalog):
+    add_video(catalog, "a.mp4", START, prompt="forest in fog", aspect_ratio="16:9")
+    add_video(catalog, "b.mp4", START + DAY, prompt="forest in fog", aspect_ratio="9:16")
+    catalog.annotate(["a.mp4"], style="Cinematic")
+
+    assert names(catalog.search("forest", aspect_ratio="9:16")) == ["b.mp4"]
+    assert names(catalog.search("forest", style="cinematic")) == ["a.mp4"]
+    assert names(catalog.search("forest", since="2026-03-02")) == ["b.mp4"]
+
+
+def test_full_text_index_follows_annotate_and_delete(catalog):
+    add_video(catalog, "a.mp4", START, prompt="mountain lake")
+    assert catalog.search("noir") == []
+
+    catalog.annotate(["a.mp4"], style="noir")
+    assert names(catalog.search("noir")) == ["a.mp4"]
+
+    catalog.annotate(["a.mp4"], prompt="desert road")
+    assert catalog.search("mountain") == [] and names(catalog.search("desert")) == ["a.mp4"]
+
+    catalog.remove("a.mp4")
+    assert catalog.search("desert") == []
+    if catalog.full_text:
+        rows = catalog._conn.execute("SELECT rowid FROM videos_fts WHERE videos_fts MATCH 'desert'").fetchall()
+        assert rows == []
@@ -8,16 +8,27 @@ Updated and Complete Implementation
 import os
 import json
 import asyncio
-import requests
+import functools
 import logging
 import time
+import uuid
 from datetime import datetime
-from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, List, Optional
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
+from jobs import Job, JobManager
+from job_store import JobStore
+from hedging import HedgePolicy
+from download_stage import DownloadTask
+from video_cache import GenerationCache, make_cache_key
+from router import BackendRouter
+from backends import Veo3Backend, load_backends
+from retention import RetentionManager
+from veo_generator import VeoGenerator
+from video_tools import VideoLibrary, is_true
+
 # ElevenLabs imports  
 from elevenlabs.client import ElevenLabs
 
@@ -32,38 +43,255 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Global configuration
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEYS")  # single key or comma-separated pool
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY") 
 ELEVENLABS_AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID")
 
+# Max number of variations polled/downloaded in parallel per request
+MAX_CONCURRENT_VARIATIONS = int(os.getenv("VEO_MAX_CONCURRENT_VARIATIONS", "5"))
+
 if not all([GEMINI_API_KEY, ELEVENLABS_API_KEY]):
     raise ValueError("Missing required API keys in environment variables")
 
 # Initialize clients
 elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
 
-class VideoGeneratorVeo3:
+def single_video_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Reshape a successful multi-variation result into the single-video result (video_urls / local_paths)."""
+    if not (result.get("success") and result.get("videos")):
+        return result
+    video = result["videos"][0]
+    single = {
+        "success": True,
+        "video_urls": [video["url"]],
+        "local_paths": [video["local_path"]],
+        "prompt": result["prompt"],
+        "aspect_ratio": result["aspect_ratio"],
+        "person_generation": result.get("person_generation"),
+        "model": result["model"],
+        "queue_wait_seconds": result.get("queue_wait_seconds", 0.0),
+        "timestamp": result["timestamp"]
+    }
+    if "backend" in result:
+        single["backend"] = result["backend"]
+    return single
+
+class VideoGeneratorVeo3(VeoGenerator):
     """Handles Google Gemini Veo 3 video generation"""
 
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.output_dir = Path("generated_videos")
-        self.output_dir.mkdir(exist_ok=True)
+    def __init__(self, max_concurrent_variations: int = MAX_CONCURRENT_VARIATIONS, job_store=None):
+        super().__init__("veo3", job_store=job_store)
+        self.max_concurrent_variations = max(1, max_concurrent_variations)
+        # Opt-in duplicate requests for operations stuck in the latency tail (VEO_HEDGE_ENABLED)
+        self.hedging = HedgePolicy()
         
         # Veo 3 model identifier - CONFIRMED WORKING as of June 2025
         self.model_name = "veo-2.0-generate-001"  #"veo-3.0-generate-preview"  # Official Veo 3 model name
 
+        # Model used for hedge requests (same model on another key by default)
+        self.hedge_model = os.getenv("VEO_HEDGE_MODEL", self.model_name)
+
         logger.info(f"Initialized Veo 3 Video Generator with model: {self.model_name}")
 
-    def generate_video_variations(self, prompt: str, n_variations: int = 2, aspect_ratio: str = "16:9", person_generation: str = "dont_allow") -> Dict[str, Any]:
+    async def _wait_for_operation(self, variation: int, operation, key, prompt: str, aspect_ratio: str, person_generation: str, report: Callable[..., None], hedgeable: bool = True):
+        """
+        Wait for an operation through the shared poller. Returns (final operation, key it ran on).
+
+        With hedging enabled, an operation still running after the hedge threshold (a percentile of
+        recent generation times) gets a duplicate on another API key / VEO_HEDGE_MODEL, budget
+        permitting. The first of the two to succeed is used; the other one stops being polled and
+        its result is never downloaded (the Veo API has no way to cancel an operation).
+        """
+        started = time.monotonic()
+        on_poll = lambda op, polls: report(variation, "generating", polls=polls)
+        primary = asyncio.ensure_future(self.poller.wait(operation, key.client, on_poll=on_poll))
+
+        threshold = self.hedging.threshold() if hedgeable else None
+        if threshold is not None:
+            done, _ = await asyncio.wait({primary}, timeout=threshold)
+            if not done:
+                hedge = await self._try_hedge(variation, key, prompt, aspect_ratio, person_generation)
+                if hedge:
+                    return await self._race(variation, {primary: (key, operation.name), hedge[0]: (hedge[1], hedge[2])}, started, report)
+
+        final = await primary
+        if final.done and not final.error:
+            self.hedging.record_latency(time.monotonic() - started)
+        return final, key
+
+    async def _try_hedge(self, variation: int, key, prompt: str, aspect_ratio: str, person_generation: str):
+        """
+        Start a hedge if a rate-limit token and an operation slot are free right now and the budget allows it.
+        The hedge is a generation like any other: it holds its slot until its operation is done or abandoned.
+        """
+        if not self.hedging.try_hedge():
+            return None
+        if not await self.scheduler.try_acquire():
+            self.hedging.release_no_capacity()
+            return None
+        try:
+            hedge = await self._start_hedge(variation, key, prompt, aspect_ratio, person_generation)
+        except BaseException:
+            self.scheduler.release()
+            raise
+        if not hedge:
+            self.scheduler.release()
+            return None
+        hedge[0].add_done_callback(lambda _: self.scheduler.release())
+        return hedge
+
+    async def _start_hedge(self, variation: int, key, prompt: str, aspect_ratio: str, person_generation: str):
+        """Submit the duplicate operation; returns (wait future, key, operation name) or None if that failed."""
+        try:
+            operation, hedge_key = await self.key_pool.generate_videos(
+                functools.partial(self.resilience.submit, "generate_videos", self._run_blocking),
+                avoid=key,
+                model=self.hedge_model,
+                prompt=prompt,
+                config=types.GenerateVideosConfig(
+                    person_generation=person_generation,
+                    aspect_ratio=aspect_ratio,
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not start hedge for variation {variation}: {e}")
+            return None
+        logger.info(f"🪁 Variation {variation} is slow, hedging with {operation.name} on key {hedge_key.label}")
+        return asyncio.ensure_future(self.poller.wait(operation, hedge_key.client)), hedge_key, operation.name
+
+    async def _race(self, variation: int, pending: Dict[asyncio.Future, Any], started: float, report: Callable[..., None]):
+        """First successful operation wins; the loser is abandoned. If both fail, the primary's outcome is returned."""
+
+        def hedge_won(key, name: str) -> None:
+            logger.info(f"🪁 Hedge won for variation {variation}: {name}")
+            # Point the job (and any later resume) at the operation that actually produced the video
+            report(variation, "generating", operation=name, api_key=key.key_id, hedged=True)
+
+        return await self.hedging.race(pending, started, self.poller.abandon, hedge_won)
+
+    async def _generate_variation(self, variation: int, n_variations: int, prompt: str, aspect_ratio: str, person_generation: str, progress: Optional[Callable[..., None]] = None, previous: Optional[Dict[str, Any]] = None) -> List[asyncio.Future]:
+        """
+        Generate and poll a single variation, then hand its videos to the download stage.
+        Returns the download stage's futures for its videos (empty list if the variation failed); the
+        operation slot is free again as soon as they are handed off.
+        `progress(variation, state, **info)` is called on every state change if given.
+        `previous` is the recorded state of this variation from an earlier run (see resume).
+        """
+        report = progress or (lambda *args, **kwargs: None)
+        previous = previous or {}
+
+        try:
+            # Queue for a rate-limit token and an operation slot (held until the operation has finished);
+            # resumed operations are already running remotely and only need the slot
+            async with self.scheduler.slot(submit=not previous.get("operation")) as queue_wait:
+                queue_wait = round(queue_wait, 2)
+                if previous.get("operation"):
+                    # Operation was already submitted before a restart: keep polling it instead of paying again
+                    operation = types.GenerateVideosOperation(name=previous["operation"])
+                    key = self.key_pool.get(previous.get("api_key"))
+                    logger.info(f"♻️ Resuming variation {variation}/{n_variations}. Operation ID: {operation.name}")
+                else:
+                    logger.info(f"\n🎬 Generating variation {variation}/{n_variations}")
+                    # Start video generation with Veo 3 (includes native audio)
+                    operation, key = await self.key_pool.generate_videos(
+                        functools.partial(self.resilience.submit, "generate_videos", self._run_blocking),
+                        model=self.model_name,
+                        prompt=prompt,
+                        config=types.GenerateVideosConfig(
+                            person_generation=person_generation,
+                            aspect_ratio=aspect_ratio,
+                            # Generate 1 video per API call for better error handling
+                            # (Your loop-based approach is superior to batch generation)
+                        ),
+                    )
+                    self.hedging.record_submission()
+
+                    logger.info(f"Variation {variation} started. Operation ID: {operation.name}")
+                    report(variation, "generating", operation=operation.name, model=self.model_name, queue_wait_seconds=queue_wait, api_key=key.key_id)
+
+                # Hand the operation to the shared poller and wait (max ~20 minutes for Veo 3),
+                # hedging it with a duplicate if it runs into the latency tail
+                operation, key = await self._wait_for_operation(
+                    variation, operation, key, prompt, aspect_ratio, person_generation, report,
+                    hedgeable=not previous.get("operation")
+                )
+
+                if not operation.done:
+                    logger.error(f"❌ Variation {variation} timed out after 20 minutes")
+                    report(variation, "failed", error="Timed out after 20 minutes")
+                    return []
+
+                # Check for errors
+                if hasattr(operation, 'error') and operation.error:
+                    logger.error(f"❌ Variation {variation} failed: {operation.error}")
+                    report(variation, "failed", error=str(operation.error))
+                    return []
+
+                if not (operation.response and hasattr(operation.response, 'generated_videos') and operation.response.generated_videos):
+                    logger.error(f"❌ No videos generated for variation {variation}")
+                    report(variation, "failed", error="No videos were generated")
+                    return []
+
+                # Hand the generated videos to the download stage; they are saved (and retried) from there
+                tasks = []
+                for vid_idx, generated_video in enumerate(operation.response.generated_videos):
+                    # Public ID of the video (URLs, tool results); the bytes live at their content address
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    filename = f"veo3_variation_{variation}_video_{vid_idx+1}_{timestamp}_{uuid.uuid4().hex[:6]}.mp4"
+                    tasks.append(DownloadTask(
+                        f"{operation.name}#{vid_idx+1}", "veo3", operation.name, vid_idx + 1, generated_video.video, filename,
+                        api_key=key.key_id, variation=variation,
+                        metadata={"model": self.model_name, "prompt": prompt, "aspect_ratio": aspect_ratio, "person_generation": person_generation, "queue_wait_seconds": queue_wait}
+                    ))
+                downloads = [await self.download_stage.submit(task) for task in tasks]
+                report(variation, "downloading", downloads=[task.download_id for task in tasks])
+                return downloads
+
+        except Exception as e:
+            logger.error(f"❌ Error generating variation {variation}: {e}")
+            report(variation, "failed", error=str(e))
+            return []
+
+    async def _collect_variation(self, variation: int, downloads: List[asyncio.Future], progress: Optional[Callable[..., None]] = None) -> List[Dict[str, Any]]:
+        """Wait for a variation's videos to come out of the download stage, then report it completed or failed."""
+        if not downloads:
+            return []
+        report = progress or (lambda *args, **kwargs: None)
+        videos, errors = [], []
+        # Shielded: a cancelled job must not cancel downloads the stage would otherwise keep retrying
+        for outcome in await asyncio.gather(*(asyncio.shield(download) for download in downloads), return_exceptions=True):
+            if isinstance(outcome, BaseException):
+                logger.error(f"❌ Error saving variation {variation}: {outcome}")
+                errors.append(str(outcome))
+            else:
+                # Fresh link: a video recorded by an earlier run may carry an expired presigned URL
+                videos.append({**outcome, "url": self.storage.url(outcome["filename"], outcome.get("storage_key"))})
+
+        if videos:
+            report(variation, "completed", videos=videos)
+        else:
+            report(variation, "failed", error=errors[0] if errors else "No videos were saved")
+        return videos
+
+    async def generate_video_variations_async(self, prompt: str, n_variations: int = 2, aspect_ratio: str = "16:9", person_generation: str = "dont_allow", progress: Optional[Callable[..., None]] = None, resume: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         Generate multiple variations of a single video concept using Veo 3.
+
+        All variations are submitted at once and polled concurrently (at most
+        `max_concurrent_variations` at a time), so the total latency is roughly
+        that of the slowest variation rather than the sum. Finished videos go to
+        the download stage, which frees the variation's slot for the next one and
+        retries failed downloads on its own. Waiting yields to the event loop and
+        blocking SDK calls run in the generator's executor.
         
         Args:
             prompt: Text description for video generation
             n_variations: Number of video variations to generate (default 2)
             aspect_ratio: "16:9" (landscape) or "9:16" (portrait)
             person_generation: "dont_allow" or "allow_adult"
+            progress: Optional callback `progress(variation, state, **info)` for job tracking
+            resume: Per-variation state recorded by a previous run (job.variations); submitted
+                operations are polled again and completed variations are reused
         """
         try:
             logger.info(f"🎬 Generating {n_variations} variations with Gemini Veo 3:")
@@ -71,81 +299,24 @@ class VideoGeneratorVeo3:
             logger.info(f"  Aspect ratio: {aspect_ratio}")
             logger.info(f"  Person generation: {person_generation}")
             
-            all_videos = []
-            
-            for i in range(n_variations):
-                logger.info(f"\n🎬 Generating variation {i+1}/{n_variations}")
-                
-                try:
-                    # Start video generation with Veo 3 (includes native audio)
-                    operation = self.client.models.generate_videos(
-                        model=self.model_name,
-                        prompt=prompt,
-                        config=types.GenerateVideosConfig(
-                            person_generation=person_generation,
-                            aspect_ratio=aspect_ratio,
-                            # Generate 1 video per API call for better error handling
-                            # (Your loop-based approach is superior to batch generation)
-                        ),
-                    )
+            semaphore = asyncio.Semaphore(self.max_concurrent_variations)
 
-                    logger.info(f"Video generation started. Operation ID: {operation.name}")
-                    
-                    # Poll until done with increased timeout for Veo 3
-                    poll_count = 0
-                    max_polls = 60  # Max ~20 minutes (60 * 20 seconds) for Veo 3
-                    
-                    while not operation.done and poll_count < max_polls:
-                        poll_count += 1
-                        logger.info(f"⏳ Waiting for generation... (attempt {poll_count}/{max_polls})")
-                        time.sleep(20)  # Wait 20 seconds between polls
-                        operation = self.client.operations.get(operation)
-
-                    if not operation.done:
-                        logger.error(f"❌ Variation {i+1} timed out after 20 minutes")
-                        continue
-
-                    # Check for errors
-                    if hasattr(operation, 'error') and operation.error:
-                        logger.error(f"❌ Variation {i+1} failed: {operation.error}")
-                        continue
-
-                    # Save generated videos
-                    if operation.response and hasattr(operation.response, 'generated_videos') and operation.response.generated_videos:
-                        for vid_idx, generated_video in enumerate(operation.response.generated_videos):
-                            try:
-                                # Download video file
-                                video_data = self.client.files.download(file=generated_video.video)
-                                
-                                # Create filename
-                                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                                filename = f"veo3_variation_{i+1}_video_{vid_idx+1}_{timestamp}.mp4"
-                                filepath = self.output_dir / filename
-                                
-                                # Save video file
-                                with open(filepath, 'wb') as f:
-                                    f.write(video_data)
-                                
-                                all_videos.append({
-                                    "variation": i+1,
-                                    "video_index": vid_idx+1,
-                                    "filename": filename,
-                                    "local_path": str(filepath),
-                                    "url": f"http://localhost:8000/videos/{filename}",
-                                    "size_mb": round(len(video_data) / (1024 * 1024), 2)
-                                })
-                                
-                                logger.info(f"✅ Saved variation {i+1}, video {vid_idx+1}: {filename}")
-                                
-                            except Exception as e:
-                                logger.error(f"❌ Error saving variation {i+1}, video {vid_idx}: {e}")
-                                continue
-                    else:
-                        logger.error(f"❌ No videos generated for variation {i+1}")
-                        
-                except Exception as e:
-                    logger.error(f"❌ Error generating variation {i+1}: {e}")
-                    continue
+            async def run_variation(variation: int) -> List[Dict[str, Any]]:
+                previous = resume[variation - 1] if resume and variation <= len(resume) else {}
+                if previous.get("state") == "completed":
+                    return list(previous.get("videos", []))
+                if previous.get("state") == "failed":
+                    return []
+                # Only generation counts against the limit; downloads are waited for outside it
+                async with semaphore:
+                    downloads = await self._generate_variation(variation, n_variations, prompt, aspect_ratio, person_generation, progress, previous)
+                return await self._collect_variation(variation, downloads, progress)
+
+            results = await asyncio.gather(*(run_variation(i + 1) for i in range(n_variations)))
+            all_videos = [video for videos in results for video in videos]
+
+            # Keep the response ordered by variation regardless of completion order
+            all_videos.sort(key=lambda v: (v["variation"], v["video_index"]))
 
             if not all_videos:
                 return {
@@ -164,6 +335,8 @@ class VideoGeneratorVeo3:
                 "aspect_ratio": aspect_ratio,
                 "person_generation": person_generation,
                 "model": self.model_name,
+                # Longest time a variation spent queued behind the rate limit / concurrency cap
+                "queue_wait_seconds": max(video.get("queue_wait_seconds", 0.0) for video in all_videos),
                 "timestamp": datetime.now().isoformat()
             }
 
@@ -176,51 +349,165 @@ class VideoGeneratorVeo3:
                 "timestamp": datetime.now().isoformat()
             }
 
-    def generate_video(self, prompt: str, aspect_ratio: str = "16:9", person_generation: str = "dont_allow", **kwargs) -> Dict[str, Any]:
+
+    def generate_video_variations(self, prompt: str, n_variations: int = 2, aspect_ratio: str = "16:9", person_generation: str = "dont_allow") -> Dict[str, Any]:
+        """
+        Blocking wrapper around generate_video_variations_async for scripts and other sync callers.
+        Must not be called from inside a running event loop.
+        """
+        return asyncio.run(self.generate_video_variations_async(prompt, n_variations, aspect_ratio, person_generation))
+
+    async def generate_video_async(self, prompt: str, aspect_ratio: str = "16:9", person_generation: str = "dont_allow", progress: Optional[Callable[..., None]] = None, resume: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Dict[str, Any]:
         """
         Generate single video using Google Gemini Veo 3 API.
         For compatibility with existing code.
         """
-        result = self.generate_video_variations(prompt, n_variations=1, aspect_ratio=aspect_ratio, person_generation=person_generation)
-        
-        if result["success"] and result["videos"]:
-            video = result["videos"][0]
-            return {
-                "success": True,
-                "video_urls": [video["url"]],
-                "local_paths": [video["local_path"]],
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,
-                "person_generation": person_generation,
-                "model": self.model_name,
-                "timestamp": result["timestamp"]
-            }
-        else:
-            return result
+        result = await self.generate_video_variations_async(prompt, n_variations=1, aspect_ratio=aspect_ratio, person_generation=person_generation, progress=progress, resume=resume)
+        return single_video_result(result)
+
+    def generate_video(self, prompt: str, aspect_ratio: str = "16:9", person_generation: str = "dont_allow", **kwargs) -> Dict[str, Any]:
+        """Blocking wrapper around generate_video_async."""
+        return asyncio.run(self.generate_video_async(prompt, aspect_ratio, person_generation, **kwargs))
+
+# Initialize background job tracking, video generator and backend routing
+job_manager = JobManager(store=JobStore())
+# Pending downloads are persisted next to the jobs, so they are retried after a restart
+video_gen_veo3 = VideoGeneratorVeo3(job_store=job_manager.store)
+# Veo 3 is always available; the other backends are loaded when the server starts (see load_backends)
+backend_router = BackendRouter()
+backend_router.register(Veo3Backend(video_gen_veo3))
+generation_cache = GenerationCache()
+# Disk budget / age limits for generated_videos/ (cache evictions go through it so pinned videos stay)
+retention = RetentionManager(video_gen_veo3.catalog, cache=generation_cache, storage=video_gen_veo3.storage, job_store=job_manager.store)
+generation_cache.remove_videos = retention.remove_videos
+
+def _generation_cache_key(params: Dict[str, Any], backend: str = "", model: str = "") -> str:
+    return make_cache_key(
+        params["prompt"],
+        params.get("aspect_ratio", "16:9"),
+        params.get("person_generation", "dont_allow"),
+        model,
+        backend
+    )
+
+def _cache_keys(params: Dict[str, Any]) -> List[str]:
+    """Cache keys of the request for every backend that could serve it (cached videos are keyed by their producer)."""
+    request = {"prompt": params["prompt"], "aspect_ratio": params.get("aspect_ratio", "16:9")}
+    return [
+        _generation_cache_key(params, name, backend.model)
+        for name, backend in backend_router.backends.items()
+        if backend.supports(request) is None
+    ]
+
+def _inflight_key(tool: str, params: Dict[str, Any], n_variations: int) -> str:
+    """Identical requests in flight at the same time share one job, whichever backend runs it (single-video results have their own shape)."""
+    shape = "single" if tool == "generate_video_single" else "variations"
+    return f"{_generation_cache_key(params)}:{params.get('image_path', '')}:{n_variations}:{shape}"
+
+async def run_generation_job(job: Job) -> Dict[str, Any]:
+    """
+    Run a generate job from its recorded parameters.
+    Used for new jobs and for jobs resumed after a restart (job.variations carries their progress).
+    """
+    params = job.parameters
+    request = {
+        "prompt": params["prompt"],
+        "aspect_ratio": params.get("aspect_ratio", "16:9"),
+        "person_generation": params.get("person_generation", "dont_allow"),
+        "image_path": params.get("image_path"),
+        "n_variations": len(job.variations)
+    }
+    # The router picks the backend (Veo 3, Veo 2, Stability) from live latency / error stats
+    result = await backend_router.generate(request, progress=job.update_variation, resume=job.variations)
+    if job.tool == "generate_video_single":
+        result = single_video_result(result)
+
+    if result.get("success"):
+        # Request-level metadata the generators don't see: style, originating tool/job, end-to-end time
+        await asyncio.to_thread(
+            video_gen_veo3.catalog.annotate,
+            [video["filename"] for entry in job.variations for video in entry.get("videos", [])],
+            style=params.get("style"),
+            tool=job.tool,
+            job_id=job.job_id,
+            generation_seconds=round((datetime.now() - job.created_at).total_seconds(), 1)
+        )
+
+    if result.get("success") and generation_cache.enabled and not request["image_path"]:
+        videos = [video for entry in job.variations for video in entry.get("videos", [])]
+        await asyncio.to_thread(
+            generation_cache.store,
+            _generation_cache_key(params, result["backend"], result["model"]),
+            request["prompt"],
+            request["aspect_ratio"],
+            request["person_generation"],
+            result["model"],
+            result["backend"],
+            videos
+        )
+    return result
+
+def _cached_result(tool: str, params: Dict[str, Any], cached: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the same result a finished job would have produced, from a cache entry (labelled with the backend that made it)."""
+    common = {
+        "prompt": params["prompt"],
+        "aspect_ratio": params.get("aspect_ratio", "16:9"),
+        "person_generation": params.get("person_generation", "dont_allow"),
+        "model": cached["model"],
+        "backend": cached["backend"],
+        "cache_hit": True,
+        "queue_wait_seconds": 0.0,
+        "timestamp": datetime.now().isoformat()
+    }
+    # Fresh links: presigned storage URLs in the cached entries may have expired
+    videos = [{**video, "url": video_gen_veo3.storage.url(video["filename"], video.get("storage_key"))} for video in cached["videos"]]
+    if tool == "generate_video_single":
+        return {"success": True, "video_urls": [videos[0]["url"]], "local_paths": [videos[0]["local_path"]], **common}
+    return {"success": True, "total_videos": len(videos), "variations_requested": len(videos), "videos": videos, **common}
 
-# Initialize video generator
-video_gen_veo3 = VideoGeneratorVeo3()
+async def submit_generation(tool: str, params: Dict[str, Any], n_variations: int = 1, fresh: bool = False) -> Dict[str, Any]:
+    """
+    Answer from the generation cache when an identical request was already generated,
+    otherwise enqueue a background job (or join the identical one already in flight).
+    `fresh=True` skips the cache and always generates new videos.
+    """
+    if generation_cache.enabled and not fresh and not params.get("image_path"):
+        cached = await asyncio.to_thread(generation_cache.lookup, _cache_keys(params), n_variations)
+        if cached:
+            logger.info(f"⚡ Cache hit for {tool}: '{params['prompt']}' ({cached['backend']})")
+            return _cached_result(tool, params, cached)
+
+    job = job_manager.submit(
+        tool, params, run_generation_job,
+        n_variations=n_variations,
+        dedupe_key=_inflight_key(tool, params, n_variations)
+    )
+    return job_manager.accepted_response(job)
 
 # Enhanced Tool Functions
+# Generate tools enqueue a background job and return its job_id right away;
+# progress and final video URLs are available from GET /jobs/{job_id} or get_video_status.
 
-def generate_video_basic_tool(prompt: str) -> str:
+async def generate_video_basic_tool(prompt: str, fresh: str = "no") -> str:
     """Generate 2 video variations from a text prompt using Veo 3 default settings."""
-    result = video_gen_veo3.generate_video_variations(prompt, n_variations=2)
+    result = await submit_generation("generate_video_basic", {"prompt": prompt}, n_variations=2, fresh=is_true(fresh))
     return json.dumps(result, indent=2)
 
-def generate_video_single_tool(prompt: str) -> str:
+async def generate_video_single_tool(prompt: str, fresh: str = "no") -> str:
     """Generate a single video from a text prompt using Veo 3."""
-    result = video_gen_veo3.generate_video(prompt)
+    result = await submit_generation("generate_video_single", {"prompt": prompt}, fresh=is_true(fresh))
     return json.dumps(result, indent=2)
 
-def generate_video_advanced_tool(
+async def generate_video_advanced_tool(
     prompt: str, 
     style: str = "cinematic", 
     format_type: str = "landscape", 
     allow_people: str = "no",
-    variations: str = "2"
+    variations: str = "2",
+    fresh: str = "no",
+    image_path: str = ""
 ) -> str:
-    """Generate videos with advanced settings using Veo 3."""
+    """Generate videos with advanced settings using Veo 3 (or animate `image_path` on an image-to-video backend)."""
     
     # Map format to aspect ratio
     aspect_ratio_map = {
@@ -229,7 +516,8 @@ def generate_video_advanced_tool(
         "vertical": "9:16",
         "horizontal": "16:9",
         "wide": "16:9",
-        "mobile": "9:16"
+        "mobile": "9:16",
+        "square": "1:1"
     }
     
     # Map people setting
@@ -268,11 +556,27 @@ def generate_video_advanced_tool(
     logger.info(f"Advanced Veo 3 generation: style={style}, format={format_type}, people={allow_people}, variations={n_variations}")
     logger.info(f"Mapped to: aspect_ratio={aspect_ratio}, person_generation={person_generation}")
     
-    result = video_gen_veo3.generate_video_variations(
-        prompt=enhanced_prompt,
+    params = {
+        "prompt": enhanced_prompt,
+        "style": style,
+        "aspect_ratio": aspect_ratio,
+        "person_generation": person_generation
+    }
+    if image_path:
+        params["image_path"] = image_path
+    if not backend_router.can_serve(params):
+        return json.dumps({
+            "success": False,
+            "error": f"No video backend can handle this request: {backend_router.rejections(params)}",
+            "prompt": prompt,
+            "timestamp": datetime.now().isoformat()
+        }, indent=2)
+
+    result = await submit_generation(
+        "generate_video_advanced",
+        params,
         n_variations=n_variations,
-        aspect_ratio=aspect_ratio,
-        person_generation=person_generation
+        fresh=is_true(fresh)
     )
     return json.dumps(result, indent=2)
 
@@ -304,99 +608,28 @@ def extract_video_prompt_from_speech(text: str) -> str:
     logger.info(f"Speech to Veo 3 prompt: '{text}' -> '{enhanced_prompt}'")
     return enhanced_prompt
 
-def generate_from_speech_tool(speech_text: str, style: str = "cinematic", format_type: str = "landscape") -> str:
+async def generate_from_speech_tool(speech_text: str, style: str = "cinematic", format_type: str = "landscape", fresh: str = "no") -> str:
     """Generate 2 video variations from speech input using Veo 3."""
     
     # Extract and enhance the prompt from speech
     prompt = extract_video_prompt_from_speech(speech_text)
     
     # Generate 2 variations by default for Veo 3
-    return generate_video_advanced_tool(
+    return await generate_video_advanced_tool(
         prompt=prompt,
         style=style,
         format_type=format_type,
         allow_people="no",
-        variations="2"
+        variations="2",
+        fresh=fresh
     )
 
-def get_video_status_tool(video_path: str) -> str:
-    """Check the status of a generated video file."""
-    try:
-        if video_path.startswith("file://"):
-            file_path = video_path.replace("file://", "")
-        elif video_path.startswith("http://localhost:8000/videos/"):
-            filename = video_path.split("/")[-1]
-            file_path = str(Path("generated_videos") / filename)
-        else:
-            file_path = video_path
-            
-        if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
-            status = {
-                "video_path": video_path,
-                "status": "available",
-                "file_size_mb": round(file_size / (1024 * 1024), 2),
-                "exists": True,
-                "model": "veo-3",
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            status = {
-                "video_path": video_path,
-                "status": "not_found",
-                "exists": False,
-                "timestamp": datetime.now().isoformat()
-            }
-        return json.dumps(status, indent=2)
-    except Exception as e:
-        return json.dumps({
-            "video_path": video_path,
-            "status": "error",
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }, indent=2)
-
-def list_recent_videos_tool() -> str:
-    """List recently generated videos from the output directory."""
-    try:
-        output_dir = Path("generated_videos")
-        if not output_dir.exists():
-            return json.dumps({
-                "videos": [],
-                "count": 0,
-                "message": "No videos generated yet",
-                "timestamp": datetime.now().isoformat()
-            }, indent=2)
-        
-        video_files = list(output_dir.glob("*.mp4"))
-        video_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-        
-        videos = []
-        for video_file in video_files[:10]:  # Last 10 videos
-            stat = video_file.stat()
-            videos.append({
-                "filename": video_file.name,
-                "path": str(video_file.absolute()),
-                "size_mb": round(stat.st_size / (1024 * 1024), 2),
-                "created": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                "url": f"http://localhost:8000/videos/{video_file.name}",
-                "model": "veo-3" if "veo3" in video_file.name else "unknown"
-            })
-        
-        return json.dumps({
-            "videos": videos,
-            "count": len(videos),
-            "total_files": len(video_files),
-            "output_directory": str(output_dir.absolute()),
-            "model": "veo-3",
-            "timestamp": datetime.now().isoformat()
-        }, indent=2)
-        
-    except Exception as e:
-        return json.dumps({
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }, indent=2)
+# Status, listing, search and pinning of generated videos (shared with the other servers)
+library = VideoLibrary(video_gen_veo3.catalog, video_gen_veo3.storage, job_manager, default_model="veo-3")
+get_video_status_tool = library.get_video_status
+list_recent_videos_tool = library.list_recent_videos
+pin_video_tool = library.pin_video
+search_videos_tool = library.search_videos
 
 class VoiceVideoAgent:
     """Main orchestrator for voice-controlled video generation with Veo 3"""
@@ -416,6 +649,8 @@ When users speak to you about creating videos:
 2. Ask clarifying questions about style, mood, and format if needed
 3. Generate 2 video variations by default (users love having options!)
 4. Explain that Veo 3 creates exceptional quality videos but may take 3-15 minutes per generation
+5. Generation runs in the background: the generate tools return a job_id right away, use get_video_status with that job_id to check progress and get the video links
+6. Repeated requests are answered instantly from previously generated videos; pass fresh="yes" only if the user explicitly wants new takes
 
 Key Features of Veo 3:
 - Superior video quality and realism
@@ -428,8 +663,10 @@ Available tools:
 - generate_video_single: Creates just 1 video if specifically requested
 - generate_video_advanced: Creates videos with specific style, format, people settings, and custom variation count
 - generate_from_speech: Optimized for processing natural speech input into video prompts
-- get_video_status: Check video file status
+- get_video_status: Check a generation job (by job_id) or a video file status
 - list_recent_videos: Show recent creations
+- search_videos: Find past videos by what they show, style or date (e.g. "the cinematic ocean clips from last week")
+- pin_video: Keep a video the user loves; older unpinned videos are cleaned up automatically when disk space runs low
 
 Default behavior: Generate 2 variations in 16:9 landscape format, cinematic style, no people allowed.
 
@@ -449,7 +686,7 @@ Be conversational, creative, and help users refine their video ideas. Suggest im
             },
             {
                 "name": "generate_video_advanced", 
-                "description": "Generate videos with specific style, format (landscape/portrait), people settings, and variation count using Veo 3",
+                "description": "Generate videos with specific style, format (landscape/portrait/square), people settings, and variation count using Veo 3; pass image_path to animate an image",
                 "webhook_url": "http://localhost:8000/tools/generate_video_advanced"
             },
             {
@@ -459,13 +696,23 @@ Be conversational, creative, and help users refine their video ideas. Suggest im
             },
             {
                 "name": "get_video_status",
-                "description": "Check the status and details of a generated video file",
+                "description": "Check the progress of a generation job (pass its job_id) or the details of a generated video file",
                 "webhook_url": "http://localhost:8000/tools/get_video_status"
             },
             {
                 "name": "list_recent_videos",
-                "description": "List recently generated videos with details",
+                "description": "List recently generated videos with details, newest first; optional limit, model, aspect_ratio, since/until (ISO dates) filters and cursor (next_cursor of the previous page)",
                 "webhook_url": "http://localhost:8000/tools/list_recent_videos"
+            },
+            {
+                "name": "search_videos",
+                "description": "Search past videos by what their prompt described (e.g. query 'ocean', style 'cinematic', days 7 for last week); optional model, aspect_ratio, since/until filters",
+                "webhook_url": "http://localhost:8000/tools/search_videos"
+            },
+            {
+                "name": "pin_video",
+                "description": "Keep a video permanently (exempt from automatic disk cleanup); pass its filename or URL as video_path, pinned 'no' to unpin",
+                "webhook_url": "http://localhost:8000/tools/pin_video"
             }
         ]
         
@@ -505,7 +752,6 @@ async def start_webhook_server():
     """Start webhook server to handle tool calls from ElevenLabs agent"""
     from fastapi import FastAPI, Request, HTTPException
     from fastapi.middleware.cors import CORSMiddleware
-    from fastapi.staticfiles import StaticFiles
     from fastapi.responses import JSONResponse
     import uvicorn
     
@@ -520,12 +766,8 @@ async def start_webhook_server():
         allow_headers=["*"],
     )
     
-    # Serve generated videos as static files
-    if Path("generated_videos").exists():
-        app.mount("/videos", StaticFiles(directory="generated_videos"), name="videos")
-    else:
-        Path("generated_videos").mkdir(exist_ok=True)
-        app.mount("/videos", StaticFiles(directory="generated_videos"), name="videos")
+    # /videos, /previews, /jobs, /catalog and /search
+    media_files, media_server = library.mount(app, retention)
     
     @app.post("/tools/{tool_name}")
     async def handle_tool_call(tool_name: str, request: Request):
@@ -542,14 +784,14 @@ async def start_webhook_server():
                 if not prompt:
                     result_json = json.dumps({"error": "No prompt provided"}, indent=2)
                 else:
-                    result_json = generate_video_basic_tool(prompt)
+                    result_json = await generate_video_basic_tool(prompt, parameters.get("fresh", "no"))
                 
             elif tool_name == "generate_video_single":
                 prompt = parameters.get("prompt", "")
                 if not prompt:
                     result_json = json.dumps({"error": "No prompt provided"}, indent=2)
                 else:
-                    result_json = generate_video_single_tool(prompt)
+                    result_json = await generate_video_single_tool(prompt, parameters.get("fresh", "no"))
                 
             elif tool_name == "generate_video_advanced":
                 prompt = parameters.get("prompt", "")
@@ -561,7 +803,7 @@ async def start_webhook_server():
                 if not prompt:
                     result_json = json.dumps({"error": "No prompt provided"}, indent=2)
                 else:
-                    result_json = generate_video_advanced_tool(prompt, style, format_type, allow_people, variations)
+                    result_json = await generate_video_advanced_tool(prompt, style, format_type, allow_people, variations, parameters.get("fresh", "no"), parameters.get("image_path", ""))
                 
             elif tool_name == "generate_from_speech":
                 speech_text = parameters.get("speech_text", "")
@@ -571,14 +813,10 @@ async def start_webhook_server():
                 if not speech_text:
                     result_json = json.dumps({"error": "No speech text provided"}, indent=2)
                 else:
-                    result_json = generate_from_speech_tool(speech_text, style, format_type)
+                    result_json = await generate_from_speech_tool(speech_text, style, format_type, parameters.get("fresh", "no"))
                 
-            elif tool_name == "get_video_status":
-                video_path = parameters.get("video_path", "")
-                result_json = get_video_status_tool(video_path)
-                    
-            elif tool_name == "list_recent_videos":
-                result_json = list_recent_videos_tool()
+            elif tool_name in VideoLibrary.TOOLS:
+                result_json = await library.call_tool(tool_name, parameters)
                 
             else:
                 result_json = json.dumps({"error": f"Unknown tool: {tool_name}"}, indent=2)
@@ -590,12 +828,25 @@ async def start_webhook_server():
             logger.error(f"❌ Error handling tool call {tool_name}: {e}")
             return {"error": str(e)}
     
+    @app.get("/router")
+    async def router_stats():
+        """Per-backend p50/p95 latency, error rate and score, plus the most recent routing decisions"""
+        return {**backend_router.snapshot(), "timestamp": datetime.now().isoformat()}
+    
     @app.get("/health")
     async def health_check():
         return {
             "status": "healthy", 
             "service": "Gemini Veo 3 Voice Video Generator",
             "model": "veo-3.0-generate-001",
+            **video_gen_veo3.stats(),
+            "catalog": await asyncio.to_thread(video_gen_veo3.catalog.stats),
+            "media": media_server.stats() if media_server else media_files.stats(),
+            "retention": retention.stats(),
+            "hedging": video_gen_veo3.hedging.stats(),
+            "cache": await asyncio.to_thread(generation_cache.stats),
+            "coalesced_requests": job_manager.coalesced,
+            "backends": list(backend_router.backends),
             "timestamp": datetime.now().isoformat()
         }
     
@@ -610,10 +861,46 @@ async def start_webhook_server():
             "endpoints": {
                 "health": "/health",
                 "tools": "/tools/{tool_name}",
-                "videos": "/videos/ (static file serving)"
+                "jobs": "/jobs/{job_id}",
+                "catalog": "/catalog",
+                "search": "/search?q=...",
+                "router": "/router",
+                "videos": "/videos/{filename} (range requests, ETags; redirects to object storage when VIDEO_STORAGE=s3)",
+                "previews": "/previews/{poster or preview filename}"
             }
         }
     
+    # Register the other generators (Veo 2, Stability) so the router can spread load across them
+    # One job store, catalog, storage and preview pool per process: the backends' generators share these
+    load_backends(
+        backend_router,
+        catalog=video_gen_veo3.catalog,
+        storage=video_gen_veo3.storage,
+        previews=video_gen_veo3.previews,
+        job_store=job_manager.store
+    )
+    logger.info(f"🧭 Video backends: {', '.join(backend_router.backends)}")
+    
+    # Index videos already on disk (and, with VIDEO_CATALOG_RECONCILE_SECONDS, keep re-checking) in the background
+    video_gen_veo3.catalog.start_watcher()
+    # Posters / previews for videos from before the preview stage existed (worker processes, in the background)
+    backfill = asyncio.create_task(video_gen_veo3.previews.backfill())
+    # Evict / expire videos over the disk budget and clean up leftovers in a background thread
+    retention.start()
+    
+    # Retry downloads that were still failing when the server last stopped (Veo 3 and the other Veo backends)
+    for generator in {video_gen_veo3, *(backend.generator for backend in backend_router.backends.values())}:
+        if isinstance(generator, VeoGenerator):
+            await generator.download_stage.resume_pending()
+    
+    # Pick up jobs whose operations were still in flight when the server last stopped
+    resumed = job_manager.resume_unfinished(
+        run_generation_job,
+        dedupe_key=lambda job: _inflight_key(job.tool, job.parameters, len(job.variations))
+    )
+    if resumed:
+        logger.info(f"♻️ Resumed {len(resumed)} unfinished job(s) from the job store")
+    
     # Start server
     logger.info("🚀 Starting Gemini Veo 3 webhook server on http://localhost:8000")
     logger.info("🎬 Default: Generate 2 video variations per request")
@@ -621,7 +908,14 @@ async def start_webhook_server():
     
     config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
     server = uvicorn.Server(config)
-    await server.serve()
+    try:
+        await server.serve()
+    finally:
+        backfill.cancel()
+        retention.stop()
+        if media_server:
+            media_server.stop()
+        job_manager.store.flush()
 
 async def main():
     """Main application entry point"""
@@ -632,7 +926,7 @@ async def main():
     
     # Check API keys
     if not GEMINI_API_KEY:
-        logger.error("❌ GEMINI_API_KEY not found in environment variables")
+        logger.error("❌ GEMINI_API_KEY (or GEMINI_API_KEYS) not found in environment variables")
         logger.info("Get your API key from: https://aistudio.google.com/")
         return
         
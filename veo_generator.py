@@ -0,0 +1,319 @@
+"""
+Veo Generators
+The plumbing shared by the Veo generators and the Veo 2 generator, importable without starting a server:
+gemini.py serves Veo 2 on its own, the Veo 3 server runs it as a router backend on its job store, catalog and storage
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional
+
+from google.genai import types
+
+from download_stage import DownloadStage, DownloadTask
+from downloads import DownloadResult, RangedDownloader, file_expiration
+from faststart import make_faststart
+from job_store import JobStore
+from key_pool import ApiKeyPool
+from poller import OperationPoller
+from previews import PreviewGenerator
+from resilience import Resilience
+from scheduler import GenerationScheduler
+from storage import VideoStorage, create_storage
+from video_catalog import VideoCatalog
+
+logger = logging.getLogger(__name__)
+
+# Threads available for blocking Gemini SDK calls, shared by all requests
+SDK_EXECUTOR_WORKERS = int(os.getenv("VEO_SDK_WORKERS", "16"))
+
+
+class VeoGenerator:
+    """
+    What every Veo generator is built from: the API key pool, the operation poller, the generation
+    scheduler, and the download stage that saves finished videos into the store, storage backend,
+    catalog and preview pool. Subclasses submit operations and hand the videos to `download_stage`.
+
+    `catalog`, `storage`, `previews` and `job_store` are the server's own when the generator runs as a
+    backend of another server (one of each per process); left out, the generator creates its own.
+    """
+
+    def __init__(self, backend: str, catalog: Optional[VideoCatalog] = None, storage: Optional[VideoStorage] = None, previews: Optional[PreviewGenerator] = None, job_store: Optional[JobStore] = None):
+        # Name of the backend in the catalog, metrics and thread names ("veo3", "veo2")
+        self.backend = backend
+        # One client per configured API key; new generations go to the key with the most quota left
+        self.key_pool = ApiKeyPool.from_env()
+        self.client = self.key_pool.client
+        self.output_dir = Path("generated_videos")
+        self.output_dir.mkdir(exist_ok=True)
+        # Blocking SDK calls (generate/poll/download) and file writes run here, off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=SDK_EXECUTOR_WORKERS, thread_name_prefix=f"{backend}-sdk")
+        # Retries with jittered backoff + circuit breaker for every generation API call of this backend
+        self.resilience = Resilience(backend)
+        # Video downloads get a breaker of their own, so a failing file host neither opens the generation
+        # circuit nor takes the backend out of the router; one attempt per call, the download stage retries
+        self.download_resilience = Resilience(f"{backend}-downloads", max_attempts=1)
+        # Single poller shared by every in-flight operation (adaptive, jittered schedule)
+        self.poller = OperationPoller(executor=self.executor, resilience=self.resilience)
+        # Rate limit / concurrency cap shared by every generate_videos call from this server
+        self.scheduler = GenerationScheduler()
+        # Index of downloaded videos (listing / status lookups without scanning generated_videos/)
+        self.catalog = catalog or VideoCatalog()
+        # Content-addressed, sharded video files (generated_videos/ab/cd/<sha256>.mp4) behind public IDs
+        self.store = self.catalog.store
+        # Where finished videos are published and linked from (local /videos or S3-compatible storage)
+        self.storage = storage or create_storage()
+        # Parallel, resumable range downloads of finished videos (verified against the Files API metadata)
+        self.downloader = RangedDownloader()
+        # Finished operations hand their videos to a download worker pool of its own; failed downloads are
+        # retried until the provider's file expires; with a job store they survive restarts
+        self.download_stage = DownloadStage(backend, self._save_video, self._download_expiry, store=job_store)
+        # Poster / preview / probe data for each downloaded video, built in worker processes
+        self.previews = previews or PreviewGenerator(self.catalog)
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking SDK / file call in the bounded executor so the event loop stays free."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _save_video(self, task: DownloadTask) -> Dict[str, Any]:
+        """Download stage worker: fetch one generated video into the store, publish and catalog it; returns its `_video_entry`."""
+        meta = task.metadata
+        key = self.key_pool.get(task.api_key)
+        # Stream the video to a staging temp file (hashed as it arrives) and rename it into place; a retry resumes the .part file
+        download = await self.download_resilience.call("files.download", self._run_blocking, self.downloader.download, key.client, task.video, self.store.staging_path(task.filename))
+        # Move the moov box to the front so browsers can start playback right away
+        download = await self._run_blocking(make_faststart, download)
+        # Then into the sharded store (generated_videos/ab/cd/<sha256>.mp4)
+        download = await self._run_blocking(self.store.ingest, download)
+        try:
+            # Published to the storage backend (no-op for local storage; S3 uploads in parallel parts)
+            storage_key = await self._run_blocking(self.storage.publish, download)
+            await asyncio.to_thread(
+                self.catalog.record, str(download.path), filename=task.filename, backend=self.backend, model=meta["model"], aspect_ratio=meta["aspect_ratio"],
+                prompt=meta["prompt"], sha256=download.sha256, size_bytes=download.size_bytes, person_generation=meta["person_generation"],
+                storage_key=storage_key
+            )
+        finally:
+            # Catalogued: retention may delete the blob again once nothing references it
+            self.store.release(download.path)
+        previews = await self.previews.process(download.path, task.filename)
+        logger.info(f"✅ Saved variation {task.variation}, video {task.video_index}: {task.filename}")
+        return self._video_entry(task, download, storage_key, previews)
+
+    def _video_entry(self, task: DownloadTask, download: DownloadResult, storage_key: Optional[str], previews: Dict[str, Any]) -> Dict[str, Any]:
+        """The saved video as the download stage records it and hands it back to the generation."""
+        return {
+            "variation": task.variation,
+            "video_index": task.video_index,
+            "filename": task.filename,
+            "local_path": str(download.path),
+            "url": self.storage.url(task.filename, storage_key),
+            "storage_key": storage_key,
+            "size_mb": download.size_mb,
+            "sha256": download.sha256,
+            "queue_wait_seconds": task.metadata.get("queue_wait_seconds", 0.0),
+            **previews
+        }
+
+    async def _download_expiry(self, task: DownloadTask) -> Optional[datetime]:
+        """When the provider deletes a video the download stage is still retrying (File.expiration_time)."""
+        return await self._run_blocking(file_expiration, self.key_pool.get(task.api_key).client, task.video)
+
+    def stats(self) -> Dict[str, Any]:
+        """Health of the generation and download pipeline, for the servers' /health endpoints."""
+        return {
+            "poller": self.poller.stats(),
+            "api_keys": self.key_pool.stats(),
+            "scheduler": self.scheduler.stats(),
+            "resilience": self.resilience.metrics(),
+            "download_resilience": self.download_resilience.metrics(),
+            "previews": self.previews.stats(),
+            "storage": self.storage.stats(),
+            "downloads": self.downloader.stats(),
+            "download_stage": self.download_stage.stats(),
+        }
+
+
+class VideoGeneratorGemini(VeoGenerator):
+    """Handles Google Gemini (Veo 2) video generation"""
+
+    def __init__(self, catalog: Optional[VideoCatalog] = None, storage: Optional[VideoStorage] = None, previews: Optional[PreviewGenerator] = None, job_store: Optional[JobStore] = None):
+        super().__init__("veo2", catalog, storage, previews, job_store)
+
+    def _video_entry(self, task: DownloadTask, download: DownloadResult, storage_key: Optional[str], previews: Dict[str, Any]) -> Dict[str, Any]:
+        return {"filename": task.filename, "local_path": str(download.path), "storage_key": storage_key, "previews": previews}
+
+    def generate_video(self, prompt: str, aspect_ratio: str = "16:9", person_generation: str = "dont_allow", **kwargs) -> Dict[str, Any]:
+        """
+        Blocking wrapper around generate_video_async for scripts and other sync callers.
+        Must not be called from inside a running event loop.
+        """
+        return asyncio.run(self.generate_video_async(prompt, aspect_ratio, person_generation, **kwargs))
+
+    async def generate_video_async(self, prompt: str, aspect_ratio: str = "16:9", person_generation: str = "dont_allow", progress: Optional[Callable[..., None]] = None, resume: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Generate video using Google Gemini (Veo 2) API.
+        Waiting yields to the event loop; blocking SDK calls run in the generator's executor.
+        
+        Args:
+            prompt: Text description for video generation
+            aspect_ratio: "16:9" (landscape) or "9:16" (portrait)
+            person_generation: "dont_allow" or "allow_adult"
+            progress: Optional callback `progress(variation, state, **info)` for job tracking
+            resume: State recorded by a previous run (job.variations); an already submitted
+                operation is polled again instead of starting a new generation
+            **kwargs: Additional parameters (for compatibility)
+        """
+        report = progress or (lambda *args, **kwargs: None)
+        previous = resume[0] if resume else {}
+        try:
+            logger.info(f"Generating video with Gemini Veo 2:")
+            logger.info(f"  Prompt: '{prompt}'")
+            logger.info(f"  Aspect ratio: {aspect_ratio}")
+            logger.info(f"  Person generation: {person_generation}")
+            
+            started_at = time.monotonic()
+            if previous.get("state") == "completed" and previous.get("videos"):
+                return {
+                    "success": True,
+                    "video_urls": previous["videos"],
+                    "local_paths": previous.get("local_paths", []),
+                    "video_ids": previous.get("video_ids", []),
+                    "storage_keys": previous.get("storage_keys", []),
+                    "previews": previous.get("previews", []),
+                    "prompt": prompt,
+                    "aspect_ratio": aspect_ratio,
+                    "person_generation": person_generation,
+                    "timestamp": datetime.now().isoformat()
+                }
+
+            resuming = bool(previous.get("operation")) and previous.get("state") != "failed"
+            # Queue for a rate-limit token and an operation slot (held until the operation has finished);
+            # a resumed operation is already running remotely and only needs the slot
+            async with self.scheduler.slot(submit=not resuming) as queue_wait:
+                queue_wait = round(queue_wait, 2)
+                if resuming:
+                    # Operation was already submitted before a restart: keep polling it instead of paying again
+                    operation = types.GenerateVideosOperation(name=previous["operation"])
+                    key = self.key_pool.get(previous.get("api_key"))
+                    logger.info(f"Resuming video generation. Operation ID: {operation.name}")
+                else:
+                    # Start video generation
+                    operation, key = await self.key_pool.generate_videos(
+                        functools.partial(self.resilience.submit, "generate_videos", self._run_blocking),
+                        model="veo-2.0-generate-001",
+                        prompt=prompt,
+                        config=types.GenerateVideosConfig(
+                            person_generation=person_generation,
+                            aspect_ratio=aspect_ratio,
+                        ),
+                    )
+
+                    logger.info(f"Video generation started. Operation ID: {operation.name}")
+                    report(1, "generating", operation=operation.name, model="veo-2.0-generate-001", queue_wait_seconds=queue_wait, api_key=key.key_id)
+            
+                # Hand the operation to the shared poller and wait (max ~10 minutes)
+                operation = await self.poller.wait(
+                    operation,
+                    key.client,
+                    timeout=600,
+                    on_poll=lambda op, polls: report(1, "generating", polls=polls)
+                )
+
+                if not operation.done:
+                    logger.error("Video generation timed out after 10 minutes")
+                    report(1, "failed", error="Timed out after 10 minutes")
+                    return {
+                        "success": False,
+                        "error": "Video generation timed out after 10 minutes",
+                        "prompt": prompt,
+                        "timestamp": datetime.now().isoformat()
+                    }
+
+                # Check for errors
+                if operation.error:
+                    logger.error(f"Video generation failed: {operation.error}")
+                    report(1, "failed", error=str(operation.error))
+                    return {
+                        "success": False,
+                        "error": str(operation.error),
+                        "prompt": prompt,
+                        "timestamp": datetime.now().isoformat()
+                    }
+
+                # Hand the generated videos to the download stage; they are saved (and retried) from there
+                tasks = []
+                for n, generated_video in enumerate(operation.response.generated_videos):
+                    # Public ID of the video; the bytes live at their content address in the store
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    filename = f"gemini_video_{timestamp}_{n}_{uuid.uuid4().hex[:6]}.mp4"
+                    tasks.append(DownloadTask(
+                        f"{operation.name}#{n+1}", "veo2", operation.name, n + 1, generated_video.video, filename,
+                        api_key=key.key_id,
+                        metadata={"model": "veo-2.0-generate-001", "prompt": prompt, "aspect_ratio": aspect_ratio, "person_generation": person_generation}
+                    ))
+                downloads = [await self.download_stage.submit(task) for task in tasks]
+                report(1, "downloading", downloads=[task.download_id for task in tasks])
+
+            # Wait for the downloads outside the operation slot, so the next generation can start
+            output_paths = []
+            video_ids = []
+            storage_keys = []
+            video_urls = []
+            previews = []
+            errors = []
+            # Shielded: a cancelled job must not cancel downloads the stage would otherwise keep retrying
+            for saved in await asyncio.gather(*(asyncio.shield(download) for download in downloads), return_exceptions=True):
+                if isinstance(saved, BaseException):
+                    logger.error(f"Error downloading video: {saved}")
+                    errors.append(str(saved))
+                    continue
+                output_paths.append(saved["local_path"])
+                video_ids.append(saved["filename"])
+                storage_keys.append(saved["storage_key"])
+                video_urls.append(self.storage.url(saved["filename"], saved["storage_key"]))
+                previews.append(saved["previews"])
+
+            if not output_paths:
+                error = errors[0] if errors else "Failed to download any generated videos"
+                report(1, "failed", error=error)
+                return {
+                    "success": False,
+                    "error": error,
+                    "prompt": prompt,
+                    "timestamp": datetime.now().isoformat()
+                }
+
+            report(1, "completed", videos=video_urls, local_paths=output_paths, video_ids=video_ids, storage_keys=storage_keys, previews=previews)
+            return {
+                "success": True,
+                "video_urls": video_urls,
+                "local_paths": output_paths,
+                "video_ids": video_ids,
+                "storage_keys": storage_keys,
+                "previews": previews,
+                "prompt": prompt,
+                "aspect_ratio": aspect_ratio,
+                "person_generation": person_generation,
+                "generation_time_minutes": round((time.monotonic() - started_at) / 60, 2),
+                "queue_wait_seconds": queue_wait,
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Error generating video with Gemini: {e}")
+            report(1, "failed", error=str(e))
+            return {
+                "success": False,
+                "error": str(e),
+                "prompt": prompt,
+                "timestamp": datetime.now().isoformat()
+            }
@@ -0,0 +1,193 @@
+"""
+Generation Cache
+Maps a normalized (prompt, aspect ratio, person generation) request and the backend/model that produced it
+to videos already in generated_videos/
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, Iterable, List, Optional, Sequence
+
+from job_store import DB_PATH, connect
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("VIDEO_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_BUDGET_BYTES = int(float(os.getenv("VIDEO_CACHE_BUDGET_GB", "5")) * 1024 ** 3)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generation_cache (
+    cache_key TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    aspect_ratio TEXT NOT NULL,
+    person_generation TEXT NOT NULL,
+    model TEXT NOT NULL,
+    backend TEXT NOT NULL DEFAULT '',
+    videos TEXT NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generation_cache_lru ON generation_cache(last_access);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case and whitespace differences should not cause a cache miss."""
+    return " ".join(prompt.split()).casefold()
+
+
+def make_cache_key(prompt: str, aspect_ratio: str, person_generation: str, model: str, backend: str = "") -> str:
+    payload = json.dumps([normalize_prompt(prompt), aspect_ratio, person_generation, model, backend])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Persistent request -> videos cache with a disk budget.
+
+    Entries point at files in generated_videos/. When the cached videos exceed `budget_bytes`, the least
+    recently used entries are dropped and their videos handed to `remove_videos` (plain deletion by
+    default; the servers route it through the retention manager so pins and the catalog are respected).
+    All methods block on SQLite / the filesystem; call them through asyncio.to_thread from the event loop.
+    """
+
+    def __init__(self, path: str = DB_PATH, budget_bytes: int = CACHE_BUDGET_BYTES, enabled: bool = CACHE_ENABLED):
+        self.enabled = enabled
+        self.budget_bytes = budget_bytes
+        self._conn = connect(path)
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+        self.remove_videos: Callable[[List[Dict[str, Any]]], Any] = _unlink_videos
+        self.hits = 0
+        self.misses = 0
+
+    def _migrate(self) -> None:
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(generation_cache)")}
+        if "backend" not in existing:
+            self._conn.execute("ALTER TABLE generation_cache ADD COLUMN backend TEXT NOT NULL DEFAULT ''")
+            self._conn.commit()
+
+    def lookup(self, cache_keys: Sequence[str], n_videos: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        Return the first of `cache_keys` (one per backend/model that could serve the request) with `n_videos`
+        cached videos, as {"backend", "model", "videos"}, or None on a miss.
+        """
+        with self._lock:
+            for cache_key in cache_keys:
+                row = self._conn.execute(
+                    "SELECT backend, model, videos FROM generation_cache WHERE cache_key = ?", (cache_key,)
+                ).fetchone()
+                videos = json.loads(row["videos"]) if row else []
+                if len(videos) < n_videos:
+                    continue
+
+                selected = videos[:n_videos]
+                if not all(os.path.exists(video["local_path"]) for video in selected):
+                    # Files were removed behind our back: forget the entry
+                    self._conn.execute("DELETE FROM generation_cache WHERE cache_key = ?", (cache_key,))
+                    self._conn.commit()
+                    continue
+
+                self._conn.execute(
+                    "UPDATE generation_cache SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key)
+                )
+                self._conn.commit()
+                self.hits += 1
+                return {"backend": row["backend"], "model": row["model"], "videos": selected}
+            self.misses += 1
+            return None
+
+    def store(self, cache_key: str, prompt: str, aspect_ratio: str, person_generation: str, model: str, backend: str, videos: List[Dict[str, Any]]) -> None:
+        """Remember the videos produced for a request (keeps the larger set if the key exists), then enforce the budget."""
+        if not videos:
+            return
+        total_bytes = sum(_file_size(video["local_path"]) for video in videos)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT videos FROM generation_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row and len(json.loads(row["videos"])) >= len(videos):
+                return
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO generation_cache
+                    (cache_key, prompt, aspect_ratio, person_generation, model, backend, videos, total_bytes, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cache_key, prompt, aspect_ratio, person_generation, model, backend, json.dumps(videos), total_bytes, now, now)
+            )
+            self._conn.commit()
+        self.evict_to_budget()
+
+    def evict_to_budget(self) -> int:
+        """Drop least recently used entries (and delete their files) until the cache fits the budget."""
+        evicted = 0
+        doomed: List[Dict[str, Any]] = []
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(total_bytes), 0) FROM generation_cache").fetchone()[0]
+            if total <= self.budget_bytes:
+                return 0
+            for row in self._conn.execute(
+                "SELECT cache_key, videos, total_bytes FROM generation_cache ORDER BY last_access"
+            ).fetchall():
+                if total <= self.budget_bytes:
+                    break
+                doomed += json.loads(row["videos"])
+                self._conn.execute("DELETE FROM generation_cache WHERE cache_key = ?", (row["cache_key"],))
+                total -= row["total_bytes"]
+                evicted += 1
+            self._conn.commit()
+        if doomed:
+            self.remove_videos(doomed)
+        if evicted:
+            logger.info(f"🧹 Evicted {evicted} cache entries to stay within {self.budget_bytes / 1024 ** 3:.1f} GB")
+        return evicted
+
+    def forget(self, local_paths: Iterable[str]) -> int:
+        """Drop the entries that reference any of these files (they are being deleted). Returns how many."""
+        doomed = set(local_paths)
+        with self._lock:
+            keys = [
+                row["cache_key"]
+                for row in self._conn.execute("SELECT cache_key, videos FROM generation_cache").fetchall()
+                if any(video["local_path"] in doomed for video in json.loads(row["videos"]))
+            ]
+            self._conn.executemany("DELETE FROM generation_cache WHERE cache_key = ?", [(key,) for key in keys])
+            self._conn.commit()
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total_bytes), 0) FROM generation_cache"
+            ).fetchone()
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "size_mb": round(total / (1024 * 1024), 2),
+            "budget_mb": round(self.budget_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _unlink_videos(videos: List[Dict[str, Any]]) -> None:
+    for video in videos:
+        try:
+            os.unlink(video["local_path"])
+        except FileNotFoundError:
+            pass
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
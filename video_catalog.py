@@ -0,0 +1,574 @@
+"""
+Video Catalog
+SQLite index of the videos in generated_videos/ and their generation metadata, with full-text prompt search
+"""
+
+import base64
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+from image_cache import file_sha256
+from job_store import DB_PATH, connect
+from video_store import BLOB_NAME, VideoStore
+
+logger = logging.getLogger(__name__)
+
+VIDEO_DIR = "generated_videos"
+# Periodic directory reconciliation (0 = only once at startup)
+RECONCILE_INTERVAL = float(os.getenv("VIDEO_CATALOG_RECONCILE_SECONDS", "0"))
+# Move videos from the old flat layout into the sharded store after the startup reconciliation
+MIGRATE_FLAT_LAYOUT = os.getenv("VIDEO_STORE_MIGRATE", "true").lower() in ("1", "true", "yes")
+# Files younger than this are left to the generator that is still cataloguing them
+RECONCILE_GRACE_SECONDS = float(os.getenv("VIDEO_CATALOG_RECONCILE_GRACE_SECONDS", "600"))
+MAX_PAGE_SIZE = 100
+
+# Words that describe every row ("find the ocean clips we made") or a time range (use since/until
+# for that) and would only make searches miss
+SEARCH_STOP_WORDS = {
+    "a", "an", "and", "the", "of", "with", "in", "on", "for", "we", "i", "made", "make", "created",
+    "find", "show", "me", "my", "our", "some", "that", "video", "videos", "clip", "clips", "footage",
+    "last", "this", "past", "recent", "recently", "today", "yesterday", "ago", "day", "days", "week",
+    "weeks", "month", "months",
+}
+
+# Filename prefix -> backend that writes it (for files found on disk rather than recorded at download)
+FILENAME_BACKENDS = {
+    "veo3_": "veo3",
+    "gemini_": "veo2",
+    "stability_": "stability",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    filename TEXT PRIMARY KEY,
+    local_path TEXT NOT NULL,
+    backend TEXT,
+    model TEXT,
+    aspect_ratio TEXT,
+    prompt TEXT,
+    size_bytes INTEGER NOT NULL,
+    sha256 TEXT,
+    created_at REAL NOT NULL,
+    person_generation TEXT,
+    style TEXT,
+    tool TEXT,
+    job_id TEXT,
+    generation_seconds REAL,
+    duration_seconds REAL,
+    width INTEGER,
+    height INTEGER,
+    codec TEXT,
+    fps REAL,
+    has_audio INTEGER,
+    poster TEXT,
+    preview TEXT,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    last_accessed REAL,
+    storage_key TEXT
+);
+CREATE INDEX IF NOT EXISTS videos_recent ON videos(created_at, filename);
+CREATE INDEX IF NOT EXISTS videos_backend ON videos(backend, created_at);
+CREATE INDEX IF NOT EXISTS videos_model ON videos(model, created_at);
+CREATE INDEX IF NOT EXISTS videos_aspect ON videos(aspect_ratio, created_at);
+"""
+
+# Created after the migration so older databases have the columns first
+INDEXES = """
+CREATE INDEX IF NOT EXISTS videos_lru ON videos(pinned, COALESCE(last_accessed, created_at));
+CREATE INDEX IF NOT EXISTS videos_path ON videos(local_path);
+"""
+
+# Columns added after the first catalog release (ALTER TABLE'd into older databases)
+COLUMNS = {
+    "person_generation": "TEXT",
+    "style": "TEXT",
+    "tool": "TEXT",
+    "job_id": "TEXT",
+    "generation_seconds": "REAL",
+    "duration_seconds": "REAL",
+    "width": "INTEGER",
+    "height": "INTEGER",
+    "codec": "TEXT",
+    "fps": "REAL",
+    "has_audio": "INTEGER",
+    "poster": "TEXT",
+    "preview": "TEXT",
+    "pinned": "INTEGER NOT NULL DEFAULT 0",
+    "last_accessed": "REAL",
+    "storage_key": "TEXT",
+}
+ANNOTATABLE = ("backend", "model", "aspect_ratio", "prompt", "sha256") + tuple(
+    column for column in COLUMNS if column not in ("pinned", "last_accessed", "storage_key")
+)
+
+# External-content FTS5 index over prompts and styles, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+    prompt, style, content='videos', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+    INSERT INTO videos_fts(rowid, prompt, style) VALUES (new.rowid, new.prompt, new.style);
+END;
+CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+    INSERT INTO videos_fts(videos_fts, rowid, prompt, style) VALUES ('delete', old.rowid, old.prompt, old.style);
+END;
+CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF prompt, style ON videos BEGIN
+    INSERT INTO videos_fts(videos_fts, rowid, prompt, style) VALUES ('delete', old.rowid, old.prompt, old.style);
+    INSERT INTO videos_fts(rowid, prompt, style) VALUES (new.rowid, new.prompt, new.style);
+END;
+"""
+
+
+def encode_cursor(created_at: float, filename: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}|{filename}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    created_at, filename = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    return float(created_at), filename
+
+
+def parse_date(value: Optional[str]) -> Optional[float]:
+    """ISO date or datetime string -> unix timestamp (None passes through)."""
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def backend_for_filename(filename: str) -> Optional[str]:
+    return next((backend for prefix, backend in FILENAME_BACKENDS.items() if filename.startswith(prefix)), None)
+
+
+def search_terms(query: str) -> List[str]:
+    """Free text -> lowercase search words (punctuation and filler words dropped)."""
+    words = re.findall(r"\w+", query.casefold())
+    return [word for word in words if word not in SEARCH_STOP_WORDS] or words
+
+
+def fts_query(terms: List[str]) -> str:
+    """All terms must match; each is quoted (no FTS syntax injection) and prefix-matched."""
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class VideoCatalog:
+    """
+    Index of generated videos and their metadata, newest first.
+
+    Generators call `record` when a download completes and the servers `annotate` finished jobs with
+    request-level metadata (style, tool, job, timings); the preview stage adds probe data and the
+    poster/preview filenames. `list` pages through the index with an opaque
+    keyset cursor (cost proportional to the page, not the number of files) and filters by model or
+    backend, aspect ratio, style and creation date; `search` ranks videos by full-text match on their
+    prompt and style (SQLite FTS5, falling back to LIKE where FTS5 isn't compiled in). `reconcile`
+    brings the index back in line with the store (files copied in or deleted by hand) and runs in a
+    background thread via `start_watcher`.
+
+    `filename` is a video's public ID and `local_path` where its bytes are: a content-addressed blob
+    of the VideoStore (shared by videos with identical bytes) or, for older videos, a file in the flat
+    directory until `migrate_flat_layout` moves it. `storage_key` is set for videos published to remote
+    storage (see storage.py).
+    Methods block on SQLite; call them through asyncio.to_thread from the event loop.
+    """
+
+    def __init__(self, path: str = DB_PATH, video_dir: str = VIDEO_DIR):
+        self.video_dir = Path(video_dir)
+        self.store = VideoStore(video_dir)
+        self._conn = connect(path)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        # Set once the first reconciliation has finished (startup work that needs every file indexed waits on it)
+        self.reconciled = threading.Event()
+        self.last_reconciled: Optional[str] = None
+        self._migrate()
+        self.full_text = self._create_fts()
+
+    def _migrate(self) -> None:
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(videos)")}
+        for column, kind in COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE videos ADD COLUMN {column} {kind}")
+        self._conn.commit()
+        self._conn.executescript(INDEXES)
+
+    def _create_fts(self) -> bool:
+        try:
+            created = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'videos_fts'"
+            ).fetchone() is None
+            self._conn.executescript(FTS_SCHEMA)
+            if created:
+                # Index the rows that existed before full-text search did
+                self._conn.execute("INSERT INTO videos_fts(videos_fts) VALUES ('rebuild')")
+                self._conn.commit()
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ SQLite FTS5 unavailable ({e}): prompt search falls back to LIKE")
+            return False
+
+    def add(self, local_path: str, filename: Optional[str] = None, backend: Optional[str] = None, model: Optional[str] = None, aspect_ratio: Optional[str] = None, prompt: Optional[str] = None, sha256: Optional[str] = None, size_bytes: Optional[int] = None, created_at: Optional[float] = None, person_generation: Optional[str] = None, storage_key: Optional[str] = None) -> None:
+        path = Path(local_path)
+        if size_bytes is None or created_at is None:
+            stat = path.stat()
+            size_bytes = stat.st_size if size_bytes is None else size_bytes
+            created_at = stat.st_mtime if created_at is None else created_at
+        with self._lock:
+            # An upsert (not INSERT OR REPLACE) so the FTS update trigger fires for re-added files
+            self._conn.execute(
+                """
+                INSERT INTO videos
+                    (filename, local_path, backend, model, aspect_ratio, prompt, size_bytes, sha256, created_at, person_generation, storage_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    local_path = excluded.local_path, backend = excluded.backend, model = excluded.model,
+                    aspect_ratio = excluded.aspect_ratio, prompt = excluded.prompt, size_bytes = excluded.size_bytes,
+                    sha256 = excluded.sha256, created_at = excluded.created_at, person_generation = excluded.person_generation,
+                    storage_key = excluded.storage_key
+                """,
+                (filename or path.name, str(path), backend or backend_for_filename(filename or path.name), model, aspect_ratio, prompt, size_bytes, sha256, created_at, person_generation, storage_key)
+            )
+            self._conn.commit()
+
+    def record(self, local_path: str, **metadata) -> None:
+        """`add` for a just-downloaded video: a catalog failure is logged (reconcile picks the file up later), not raised."""
+        try:
+            self.add(local_path, **metadata)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not catalog {local_path}: {e}")
+
+    def annotate(self, filenames: List[str], **fields) -> None:
+        """Attach request-level metadata (style, tool, job_id, generation_seconds, ...) to videos; errors are logged."""
+        fields = {column: value for column, value in fields.items() if column in ANNOTATABLE and value is not None}
+        if not filenames or not fields:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    f"UPDATE videos SET {assignments} WHERE filename = ?",
+                    [(*fields.values(), filename) for filename in filenames]
+                )
+                self._conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not annotate {len(filenames)} catalog entries: {e}")
+
+    def references(self, local_path: str) -> int:
+        """How many videos are stored in this file (content-addressed blobs can be shared)."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos WHERE local_path = ?", (str(local_path),)).fetchone()[0]
+
+    def relocate(self, filename: str, local_path: str, sha256: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE videos SET local_path = ?, sha256 = ? WHERE filename = ?", (str(local_path), sha256, filename)
+            )
+            self._conn.commit()
+
+    def remove(self, filename: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM videos WHERE filename = ?", (filename,))
+            self._conn.commit()
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """The catalog entry for a filename, or None (also drops entries whose file is gone)."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM videos WHERE filename = ?", (filename,)).fetchone()
+        if row is None:
+            return None
+        if not os.path.exists(row["local_path"]):
+            self.remove(filename)
+            return None
+        return dict(row)
+
+    def resolve(self, reference: str) -> Optional[Dict[str, Any]]:
+        """
+        The catalog entry for a video ID, a /videos or object-storage URL, or a file path (None if unknown).
+        URLs and paths that name a content-addressed file resolve to the newest video stored in it.
+        """
+        name = Path(unquote(urlsplit(reference).path) if "://" in reference else reference).name
+        entry = self.get(name)
+        if entry is not None or not BLOB_NAME.match(name):
+            return entry
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename FROM videos WHERE local_path = ? ORDER BY created_at DESC LIMIT 1",
+                (str(self.store.path_for(Path(name).stem)),)
+            ).fetchone()
+        return self.get(row["filename"]) if row else None
+
+    @staticmethod
+    def _filters(model: Optional[str] = None, aspect_ratio: Optional[str] = None, style: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None) -> Tuple[List[str], List[Any]]:
+        """SQL conditions on the `v` (videos) alias."""
+        where, args = [], []
+        if model:
+            where.append("(v.model = ? OR v.backend = ?)")
+            args += [model, model]
+        if aspect_ratio:
+            where.append("v.aspect_ratio = ?")
+            args.append(aspect_ratio)
+        if style:
+            where.append("v.style = ? COLLATE NOCASE")
+            args.append(style)
+        if since:
+            where.append("v.created_at >= ?")
+            args.append(parse_date(since))
+        if until:
+            where.append("v.created_at < ?")
+            args.append(parse_date(until))
+        return where, args
+
+    def list(self, limit: int = 10, cursor: Optional[str] = None, model: Optional[str] = None, aspect_ratio: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None, style: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of videos, newest first, and the cursor of the next page (None on the last page).
+        `model` matches either the model name or the backend (e.g. "veo3"); `since`/`until` are ISO dates.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where, args = self._filters(model=model, aspect_ratio=aspect_ratio, style=style, since=since, until=until)
+
+        videos: List[Dict[str, Any]] = []
+        position = decode_cursor(cursor) if cursor else None
+        while True:
+            page_where = list(where)
+            page_args = list(args)
+            if position:
+                page_where.append("(v.created_at < ? OR (v.created_at = ? AND v.filename < ?))")
+                page_args += [position[0], position[0], position[1]]
+            sql = "SELECT v.* FROM videos v"
+            if page_where:
+                sql += " WHERE " + " AND ".join(page_where)
+            sql += " ORDER BY v.created_at DESC, v.filename DESC LIMIT ?"
+            with self._lock:
+                rows = self._conn.execute(sql, page_args + [limit - len(videos) + 1]).fetchall()
+
+            more = len(rows) > limit - len(videos)
+            rows = rows[:limit - len(videos)]
+            for row in rows:
+                # Files deleted behind the catalog's back are dropped as they are met
+                if os.path.exists(row["local_path"]):
+                    videos.append(dict(row))
+                else:
+                    self.remove(row["filename"])
+            if rows:
+                position = (rows[-1]["created_at"], rows[-1]["filename"])
+            if not more:
+                return videos, None
+            if len(videos) == limit:
+                return videos, encode_cursor(*position)
+
+    def search(self, query: str, limit: int = 10, model: Optional[str] = None, aspect_ratio: Optional[str] = None, style: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Videos whose prompt/style match every word of `query` (prefix, stemmed), best match first
+        (BM25, then newest), combined with the same filters as `list`.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        terms = search_terms(query)
+        where, args = self._filters(model=model, aspect_ratio=aspect_ratio, style=style, since=since, until=until)
+        if not terms:
+            return self.list(limit, model=model, aspect_ratio=aspect_ratio, style=style, since=since, until=until)[0]
+        if self.full_text:
+            sql = "SELECT v.*, bm25(videos_fts) AS score FROM videos_fts JOIN videos v ON v.rowid = videos_fts.rowid WHERE videos_fts MATCH ?"
+            args = [fts_query(terms)] + args
+            order = "score, v.created_at DESC"
+        else:
+            sql = "SELECT v.*, 0.0 AS score FROM videos v WHERE " + " AND ".join(
+                "(v.prompt LIKE ? OR v.style LIKE ?)" for _ in terms
+            )
+            args = [pattern for term in terms for pattern in (f"%{term}%", f"%{term}%")] + args
+            order = "v.created_at DESC"
+        if where:
+            sql += " AND " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, args + [limit]).fetchall()
+        videos = []
+        for row in rows:
+            if os.path.exists(row["local_path"]):
+                videos.append(dict(row))
+            else:
+                self.remove(row["filename"])
+        return videos
+
+    def set_pinned(self, filename: str, pinned: bool = True) -> bool:
+        """Pin (exempt from retention) or unpin a video. False if it isn't catalogued."""
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE videos SET pinned = ? WHERE filename = ?", (int(pinned), filename)
+            ).rowcount
+            self._conn.commit()
+        return bool(updated)
+
+    def touch(self, accessed: Dict[str, float]) -> None:
+        """Record when videos were last served ({filename: unix time}), for least-recently-used eviction."""
+        if not accessed:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE videos SET last_accessed = MAX(COALESCE(last_accessed, 0), ?) WHERE filename = ?",
+                [(when, filename) for filename, when in accessed.items()]
+            )
+            self._conn.commit()
+
+    def total_bytes(self) -> int:
+        """Bytes on disk (videos sharing a content-addressed file are counted once)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(size_bytes), 0) FROM (SELECT MAX(size_bytes) AS size_bytes FROM videos GROUP BY local_path)"
+            ).fetchone()[0]
+
+    def expired(self, created_before: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """Unpinned videos created before `created_before`, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM videos WHERE pinned = 0 AND created_at < ? ORDER BY created_at LIMIT ?",
+                (created_before, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def eviction_candidates(self, created_before: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """Unpinned videos created before `created_before`, least recently served (or created) first."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT * FROM videos WHERE pinned = 0 AND created_at < ?
+                ORDER BY COALESCE(last_accessed, created_at), filename LIMIT ?
+                """,
+                (created_before, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def compact(self) -> None:
+        """Merge the full-text index segments and truncate the WAL (after evictions)."""
+        with self._lock:
+            if self.full_text:
+                self._conn.execute("INSERT INTO videos_fts(videos_fts) VALUES ('optimize')")
+                self._conn.commit()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("PRAGMA optimize")
+
+    def preview_files(self) -> Set[str]:
+        """Poster and preview filenames referenced by catalogued videos."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT poster, preview FROM videos WHERE poster IS NOT NULL OR preview IS NOT NULL"
+            ).fetchall()
+        return {name for row in rows for name in row if name}
+
+    def missing_previews(self, limit: int = 50, posters: bool = False) -> List[Dict[str, Any]]:
+        """Newest videos without probe data (or, with `posters`, without a poster/preview either)."""
+        condition = "duration_seconds IS NULL" + (" OR poster IS NULL OR preview IS NULL" if posters else "")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT filename, local_path FROM videos WHERE {condition} ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def reconcile(self, grace_seconds: float = RECONCILE_GRACE_SECONDS) -> Dict[str, int]:
+        """
+        Index files missing from the catalog and forget entries whose file is gone. Files modified in the
+        last `grace_seconds`, or just ingested, are skipped: their download is still being catalogued.
+        """
+        cutoff = time.time() - grace_seconds
+        if not self.video_dir.exists():
+            self.reconciled.set()
+            return {"added": 0, "removed": 0}
+        on_disk: Dict[str, os.DirEntry] = {}
+        with os.scandir(self.video_dir) as entries:
+            for entry in entries:
+                # Flat-layout videos; skips in-progress downloads (.name.uuid.part) and the store's directories
+                if entry.is_file() and entry.name.endswith(".mp4") and not entry.name.startswith("."):
+                    on_disk[entry.path] = entry
+        for entry in self.store.blobs():
+            on_disk[entry.path] = entry
+        with self._lock:
+            indexed: Dict[str, List[str]] = {}
+            for row in self._conn.execute("SELECT filename, local_path FROM videos"):
+                indexed.setdefault(row["local_path"], []).append(row["filename"])
+            added = [
+                path for path in on_disk
+                if path not in indexed and not self.store.claimed(path) and on_disk[path].stat().st_mtime < cutoff
+            ]
+            removed = [filename for path, filenames in indexed.items() if path not in on_disk for filename in filenames]
+            for path in added:
+                entry = on_disk[path]
+                stat = entry.stat()
+                # A blob nobody references (its catalog row was lost) is listed under its hash
+                sha256 = entry.name[:-4] if self.store.is_blob(path) else None
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO videos (filename, local_path, backend, size_bytes, sha256, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (entry.name, path, backend_for_filename(entry.name), stat.st_size, sha256, stat.st_mtime)
+                )
+            self._conn.executemany("DELETE FROM videos WHERE filename = ?", [(name,) for name in removed])
+            self._conn.commit()
+        self.last_reconciled = datetime.now().isoformat()
+        self.reconciled.set()
+        if added or removed:
+            logger.info(f"🗂️ Video catalog reconciled: {len(added)} added, {len(removed)} removed")
+        return {"added": len(added), "removed": len(removed)}
+
+    def migrate_flat_layout(self) -> int:
+        """
+        Move videos still in the flat directory into the sharded store, keeping their IDs (and URLs).
+        Each file is linked to its content address, repointed, then unlinked, so it is never missing.
+        Returns how many were moved.
+        """
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute("SELECT filename, local_path, sha256, size_bytes FROM videos")]
+        moved = 0
+        for row in rows:
+            path = Path(row["local_path"])
+            if path.parent != self.video_dir or not path.exists():
+                continue
+            try:
+                sha256 = row["sha256"] if row["sha256"] and path.stat().st_size == row["size_bytes"] else file_sha256(path)
+                target = self.store.adopt(path, sha256)
+                self.relocate(row["filename"], str(target), sha256)
+                path.unlink()
+                moved += 1
+            except OSError as e:
+                logger.warning(f"⚠️ Could not move {path} into the video store: {e}")
+        if moved:
+            logger.info(f"🗂️ Moved {moved} videos from the flat directory into the sharded store")
+        return moved
+
+    def start_watcher(self, interval: float = RECONCILE_INTERVAL) -> None:
+        """Reconcile (and migrate the flat layout) once in the background now, then every `interval` seconds if it is > 0."""
+        if self._watcher is not None:
+            return
+
+        def watch() -> None:
+            if MIGRATE_FLAT_LAYOUT:
+                try:
+                    self.reconcile()
+                    self.migrate_flat_layout()
+                except Exception as e:
+                    logger.error(f"❌ Video store migration failed: {e}")
+            while True:
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"❌ Video catalog reconciliation failed: {e}")
+                if interval <= 0:
+                    return
+                time.sleep(interval)
+
+        self._watcher = threading.Thread(target=watch, name="video-catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total, pinned = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), COALESCE(SUM(pinned), 0) FROM videos"
+            ).fetchone()
+        return {
+            "videos": count,
+            "size_mb": round(total / (1024 * 1024), 2),
+            "pinned": pinned,
+            "full_text_search": self.full_text,
+            "last_reconciled": self.last_reconciled,
+        }
@@ -0,0 +1,109 @@
+"""
+Video Store
+Content-addressed, hash-sharded layout for generated videos: generated_videos/ab/cd/<sha256>.mp4
+"""
+
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Union
+
+from downloads import DownloadResult
+from image_cache import file_sha256
+
+VIDEO_DIR = "generated_videos"
+# Downloads are written (and rewritten by faststart) here before they get their content address
+INCOMING_DIR = ".incoming"
+
+SHARD_NAME = re.compile(r"^[0-9a-f]{2}$")
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}\.mp4$")
+
+
+class VideoStore:
+    """
+    On-disk layout of generated videos.
+
+    Each video is stored once per content hash, two 256-way shard levels deep, so no directory holds
+    more than a handful of entries however many videos accumulate, and byte-identical videos share a
+    file. Videos are addressed publicly by their ID (the `filename` in URLs and tool results, e.g.
+    `veo3_variation_1_video_1_<timestamp>_<random>.mp4`); the catalog maps IDs to blob paths through its
+    `local_path` column. Files from before this layout stay where they are until `VideoCatalog`
+    migrates them.
+
+    A blob is claimed from `ingest` until the caller has catalogued it and calls `release`. Whoever
+    deletes blobs (retention) decides and unlinks while holding `lock` and skips claimed ones, so a
+    video ingested with the same bytes as one being deleted never loses its file in between.
+    """
+
+    def __init__(self, root: str = VIDEO_DIR):
+        self.root = Path(root)
+        self.incoming = self.root / INCOMING_DIR
+        self.incoming.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self._claims: Dict[str, int] = {}
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}.mp4"
+
+    def staging_path(self, video_id: str) -> Path:
+        """Where a download for `video_id` is written before `ingest`."""
+        return self.incoming / video_id
+
+    def ingest(self, download: DownloadResult) -> DownloadResult:
+        """
+        Move a finished download from staging to its content address. A video with the same bytes may
+        already be there; replacing it with an identical file is harmless. The blob stays claimed until
+        `release`; call it once the video is catalogued (or given up on). Blocking; run it in an executor.
+        """
+        sha256 = download.sha256 or file_sha256(download.path)
+        target = self.path_for(sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            os.replace(download.path, target)
+            self._claims[str(target)] = self._claims.get(str(target), 0) + 1
+        return DownloadResult(target, download.size_bytes, sha256)
+
+    def release(self, path: Union[str, Path]) -> None:
+        """Drop the claim `ingest` put on a blob."""
+        with self.lock:
+            remaining = self._claims.pop(str(path), 0) - 1
+            if remaining > 0:
+                self._claims[str(path)] = remaining
+
+    def claimed(self, path: Union[str, Path]) -> bool:
+        """Whether an ingested blob is still waiting to be catalogued. Hold `lock` to act on the answer."""
+        return str(path) in self._claims
+
+    def adopt(self, path: Union[str, Path], sha256: str) -> Path:
+        """
+        Hard-link an existing (flat layout) file to its content address and return the new path. The
+        original stays until the caller has repointed its references and removes it, so readers never
+        find the video missing in between.
+        """
+        target = self.path_for(sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, target)
+        except FileExistsError:
+            pass
+        return target
+
+    def is_blob(self, path: Union[str, Path]) -> bool:
+        path = Path(path)
+        return BLOB_NAME.match(path.name) is not None and path.parent.parent.parent == self.root
+
+    def blobs(self) -> Iterator[os.DirEntry]:
+        """Every stored video file (shard directories only; staging and flat legacy files are skipped)."""
+        if not self.root.exists():
+            return
+        with os.scandir(self.root) as level1:
+            shards1 = [entry.path for entry in level1 if entry.is_dir() and SHARD_NAME.match(entry.name)]
+        for shard1 in shards1:
+            with os.scandir(shard1) as level2:
+                shards2 = [entry.path for entry in level2 if entry.is_dir() and SHARD_NAME.match(entry.name)]
+            for shard2 in shards2:
+                with os.scandir(shard2) as files:
+                    for entry in files:
+                        if entry.is_file() and BLOB_NAME.match(entry.name):
+                            yield entry
@@ -0,0 +1,265 @@
+"""
+Video Library Tools
+The catalog-backed tools and endpoints every server exposes: video status, listing, prompt search and pinning
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+from media import MEDIA_SERVER_PORT, MediaApp, MediaFiles, MediaServer
+from previews import PREVIEW_DIR, preview_fields
+
+
+def is_true(value: str) -> bool:
+    return str(value).lower() in ("yes", "true", "1", "fresh")
+
+
+class VideoLibrary:
+    """
+    The generated videos of one server, as its tools see them: `catalog` for lookups, `storage` for
+    links and `jobs` (JobManager) so a status lookup by job_id works too. Tool methods return JSON
+    strings and run blocking catalog queries, so webhook handlers call them off the event loop
+    (see `call_tool`).
+    """
+
+    # Webhook tools answered by call_tool
+    TOOLS = ("get_video_status", "list_recent_videos", "search_videos", "pin_video")
+
+    def __init__(self, catalog, storage, jobs=None, default_model: Optional[str] = None):
+        self.catalog = catalog
+        self.storage = storage
+        self.jobs = jobs
+        # Model reported for videos that are on disk but not in the catalog
+        self.default_model = default_model
+
+    def catalog_video(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """A catalog row as returned by list_recent_videos / search_videos."""
+        return {
+            "filename": entry["filename"],
+            "path": str(Path(entry["local_path"]).absolute()),
+            "size_mb": round(entry["size_bytes"] / (1024 * 1024), 2),
+            "created": datetime.fromtimestamp(entry["created_at"]).isoformat(),
+            "url": self.storage.url(entry["filename"], entry["storage_key"]),
+            "model": entry["model"] or entry["backend"] or "unknown",
+            "aspect_ratio": entry["aspect_ratio"],
+            "style": entry["style"],
+            "prompt": entry["prompt"],
+            "generation_seconds": entry["generation_seconds"],
+            "pinned": bool(entry["pinned"]),
+            **preview_fields(entry)
+        }
+
+    def get_video_status(self, video_path: str) -> str:
+        """Check the status of a generation job (by job_id) or of a generated video file."""
+        try:
+            job = self.jobs.get(video_path) if self.jobs else None
+            if job:
+                return json.dumps(job.to_dict(), indent=2)
+
+            file_path = video_path.replace("file://", "") if video_path.startswith("file://") else video_path
+
+            # Videos we generated (by ID, /videos or storage URL, or path) resolve through the catalog
+            entry = self.catalog.resolve(video_path)
+            if entry:
+                status = {
+                    "video_path": video_path,
+                    "status": "available",
+                    "file_size_mb": round(entry["size_bytes"] / (1024 * 1024), 2),
+                    "exists": True,
+                    "filename": entry["filename"],
+                    "url": self.storage.url(entry["filename"], entry["storage_key"]),
+                    "model": entry["model"] or entry["backend"] or "unknown",
+                    "aspect_ratio": entry["aspect_ratio"],
+                    "created": datetime.fromtimestamp(entry["created_at"]).isoformat(),
+                    "sha256": entry["sha256"],
+                    **preview_fields(entry),
+                    "timestamp": datetime.now().isoformat()
+                }
+            elif "://" not in file_path and os.path.exists(file_path):
+                file_size = os.path.getsize(file_path)
+                status = {
+                    "video_path": video_path,
+                    "status": "available",
+                    "file_size_mb": round(file_size / (1024 * 1024), 2),
+                    "exists": True,
+                    "timestamp": datetime.now().isoformat()
+                }
+                if self.default_model:
+                    status["model"] = self.default_model
+            else:
+                status = {
+                    "video_path": video_path,
+                    "status": "not_found",
+                    "exists": False,
+                    "timestamp": datetime.now().isoformat()
+                }
+            return json.dumps(status, indent=2)
+        except Exception as e:
+            return json.dumps({
+                "video_path": video_path,
+                "status": "error",
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }, indent=2)
+
+    def list_recent_videos(self, limit: int = 10, cursor: str = "", model: str = "", aspect_ratio: str = "", since: str = "", until: str = "") -> str:
+        """
+        List generated videos, newest first, from the video catalog.
+        Pass `cursor` (next_cursor of the previous page) to page; filter by model/backend, aspect ratio and ISO date range.
+        """
+        try:
+            entries, next_cursor = self.catalog.list(
+                limit=limit, cursor=cursor or None, model=model or None, aspect_ratio=aspect_ratio or None,
+                since=since or None, until=until or None
+            )
+            videos = [self.catalog_video(entry) for entry in entries]
+            return json.dumps({
+                "videos": videos,
+                "count": len(videos),
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+                "output_directory": str(Path("generated_videos").absolute()),
+                "timestamp": datetime.now().isoformat()
+            }, indent=2)
+        except Exception as e:
+            return json.dumps({
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }, indent=2)
+
+    def pin_video(self, video_path: str, pinned: str = "yes") -> str:
+        """Pin a video (by filename, URL or path) so retention never deletes it; pinned="no" unpins it."""
+        try:
+            entry = self.catalog.resolve(video_path)
+            filename = entry["filename"] if entry else Path(video_path.replace("file://", "")).name
+            keep = is_true(pinned)
+            found = self.catalog.set_pinned(filename, keep)
+            return json.dumps({
+                "video": filename,
+                "status": "updated" if found else "not_found",
+                "pinned": keep if found else None,
+                "timestamp": datetime.now().isoformat()
+            }, indent=2)
+        except Exception as e:
+            return json.dumps({
+                "video": video_path,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }, indent=2)
+
+    def search_videos(self, query: str, limit: int = 10, model: str = "", aspect_ratio: str = "", style: str = "", since: str = "", until: str = "", days: int = 0) -> str:
+        """
+        Full-text search over the prompts (and styles) of past videos, best match first.
+        `days` limits results to the last N days unless `since` is given.
+        """
+        try:
+            if days and not since:
+                since = (datetime.now() - timedelta(days=int(days))).isoformat()
+            started = time.perf_counter()
+            entries = self.catalog.search(
+                query, limit=limit, model=model or None, aspect_ratio=aspect_ratio or None,
+                style=style or None, since=since or None, until=until or None
+            )
+            return json.dumps({
+                "query": query,
+                "videos": [self.catalog_video(entry) for entry in entries],
+                "count": len(entries),
+                "search_ms": round((time.perf_counter() - started) * 1000, 2),
+                "timestamp": datetime.now().isoformat()
+            }, indent=2)
+        except Exception as e:
+            return json.dumps({
+                "query": query,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }, indent=2)
+
+    async def call_tool(self, tool_name: str, parameters: Dict[str, Any]) -> str:
+        """Answer a webhook call of one of the TOOLS; catalog and filesystem lookups run in a worker thread so they never stall the loop."""
+        if tool_name == "get_video_status":
+            video_path = parameters.get("video_path") or parameters.get("job_id", "")
+            return await asyncio.to_thread(self.get_video_status, video_path)
+
+        if tool_name == "search_videos":
+            query = parameters.get("query", "")
+            if not query:
+                return json.dumps({"error": "No search query provided"}, indent=2)
+            return await asyncio.to_thread(
+                self.search_videos,
+                query,
+                int(parameters.get("limit", 10)),
+                parameters.get("model", ""),
+                parameters.get("aspect_ratio", ""),
+                parameters.get("style", ""),
+                parameters.get("since", ""),
+                parameters.get("until", ""),
+                int(parameters.get("days", 0) or 0)
+            )
+
+        if tool_name == "pin_video":
+            video_path = parameters.get("video_path") or parameters.get("filename", "")
+            if not video_path:
+                return json.dumps({"error": "No video provided"}, indent=2)
+            return await asyncio.to_thread(self.pin_video, video_path, parameters.get("pinned", "yes"))
+
+        if tool_name == "list_recent_videos":
+            return await asyncio.to_thread(
+                self.list_recent_videos,
+                int(parameters.get("limit", 10)),
+                parameters.get("cursor", ""),
+                parameters.get("model", ""),
+                parameters.get("aspect_ratio", ""),
+                parameters.get("since", ""),
+                parameters.get("until", "")
+            )
+
+        return json.dumps({"error": f"Unknown tool: {tool_name}"}, indent=2)
+
+    def mount(self, app, retention=None) -> Tuple[MediaFiles, Optional[MediaServer]]:
+        """
+        Serve the videos and previews from `app` and add the /jobs, /catalog and /search endpoints.
+        Returns the media files (and the dedicated sendfile server when MEDIA_SERVER_PORT is set, already started).
+        """
+        from fastapi import HTTPException
+
+        # Serve generated videos: Range/206, strong ETags from the catalog's download-time sha256,
+        # long-lived Cache-Control; MEDIA_SERVER_PORT adds a dedicated sendfile server on its own thread
+        Path("generated_videos").mkdir(exist_ok=True)
+        media_files = MediaFiles(catalog=self.catalog, storage=self.storage)
+        app.mount("/videos", MediaApp(media_files), name="videos")
+        app.mount("/previews", MediaApp(MediaFiles(PREVIEW_DIR)), name="previews")
+        if retention is not None:
+            retention.track(media_files)
+        media_server = MediaServer(media_files) if MEDIA_SERVER_PORT else None
+        if media_server:
+            media_server.start()
+
+        @app.get("/jobs")
+        async def list_jobs(limit: int = 20):
+            """List the most recent generation jobs"""
+            return {"jobs": self.jobs.list_jobs(limit), "timestamp": datetime.now().isoformat()}
+
+        @app.get("/jobs/{job_id}")
+        async def get_job(job_id: str):
+            """Job state, per-variation progress and final video URLs"""
+            job = await asyncio.to_thread(self.jobs.get, job_id)
+            if not job:
+                raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+            return job.to_dict()
+
+        @app.get("/catalog")
+        async def list_catalog(limit: int = 20, cursor: str = "", model: str = "", aspect_ratio: str = "", since: str = "", until: str = ""):
+            """Page through generated videos (newest first); pass next_cursor back as cursor"""
+            return json.loads(await asyncio.to_thread(self.list_recent_videos, limit, cursor, model, aspect_ratio, since, until))
+
+        @app.get("/search")
+        async def search_videos(q: str, limit: int = 10, model: str = "", aspect_ratio: str = "", style: str = "", since: str = "", until: str = "", days: int = 0):
+            """Full-text prompt search over past videos, e.g. /search?q=ocean&style=cinematic&days=7"""
+            return json.loads(await asyncio.to_thread(self.search_videos, q, limit, model, aspect_ratio, style, since, until, days))
+
+        return media_files, media_server